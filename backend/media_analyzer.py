@@ -1,18 +1,123 @@
+import atexit
 import os
 import subprocess
 import json
 import sys
-from typing import Dict, Optional
-from utils.format_utils import format_size, format_duration
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+from PIL import Image
+from backend import pyav_backend
+from backend.media_cache import MediaCache
+from config import config
+from utils.format_utils import format_size, format_duration, parse_seconds
+from utils.parallel import imap_unordered
+
+# 不需要 ffprobe 即可读取分辨率的图片类型
+IMAGE_TYPES = ("PNG", "JPG", "JPEG", "GIF", "WEBP", "BMP")
+# 缓存条目必须包含的字段
+DETAIL_FIELDS = ("size", "resolution", "duration", "duration_seconds", "streams")
+
 
 class MediaAnalyzer:
-    @staticmethod
-    def get_media_details(file_path: str) -> Dict[str, Optional[str]]:
+    _cache: Optional[MediaCache] = None
+    _cache_lock = threading.Lock()
+
+    @classmethod
+    def get_cache(cls) -> Optional[MediaCache]:
+        """
+        获取共享的元数据缓存，首次调用时按配置创建，进程退出时写入累计的更新。缓存被禁用时返回 None。
+        """
+        with cls._cache_lock:
+            if cls._cache is None and config.MEDIA_CACHE_ENABLED:
+                cls._cache = MediaCache()
+                atexit.register(cls._cache.close)
+            return cls._cache
+
+    @classmethod
+    def set_cache(cls, cache: Optional[MediaCache]):
+        """
+        替换共享的元数据缓存。
+        """
+        cls._cache = cache
+
+    @classmethod
+    def get_media_details(cls, file_path: str, use_cache: bool = True, full: bool = False) -> Dict[str, Optional[str]]:
+        """
+        获取媒体文件的详细信息，优先从元数据缓存读取，未命中时调用 ffprobe 并写回缓存。
+
+        参数:
+            file_path: str，媒体文件的完整路径。
+            use_cache: bool，是否使用元数据缓存。
+            full: bool，未命中缓存时是否使用完整模式探测，见 probe_media_details。
+
+        返回:
+            dict: 与 probe_media_details 相同。
+        """
+        cache = cls.get_cache() if use_cache else None
+        key = None
+        if cache is not None:
+            try:
+                key = MediaCache.make_key(file_path)
+            except OSError:
+                key = None
+            if key is not None:
+                details = cache.get(key)
+                # 旧版本写入的条目缺少新增字段，视为未命中并重新探测
+                if details is not None and all(field in details for field in DETAIL_FIELDS):
+                    details["name"] = os.path.basename(file_path)
+                    details["full_path"] = file_path
+                    return details
+
+        details = cls.probe_media_details(file_path, full=full)
+        # 只缓存成功的结果，失败的文件下次重新探测
+        if key is not None and not details.get("error"):
+            cache.put(key, details)
+        return details
+
+    @classmethod
+    def get_duration_seconds(cls, file_path: str) -> Optional[float]:
+        """
+        获取媒体时长（秒），优先使用缓存。无法获取时返回 None。
+        """
+        return cls.get_media_details(file_path).get("duration_seconds")
+
+    @classmethod
+    def get_streams(cls, file_path: str) -> Optional[List[Dict]]:
+        """
+        获取媒体文件各个流的编码信息，优先使用缓存。无法获取时返回 None。
+        """
+        return cls.get_media_details(file_path).get("streams")
+
+    @classmethod
+    def iter_media_details(cls, file_paths: Iterable[str], max_workers: int = None,
+                           cancel_event: threading.Event = None) -> Iterator[Dict[str, Optional[str]]]:
+        """
+        使用有界线程池并行分析多个文件，按完成顺序逐个产出结果。
+        ffprobe 在子进程中运行，线程只负责等待，因此可以充分并行。
+
+        参数:
+            file_paths: 需要分析的文件路径。
+            max_workers: 并发数量，默认使用配置中的 CONCURRENCY_LIMIT。
+            cancel_event: 设置后不再启动新的分析任务。
+
+        返回:
+            生成器，每次产出一个与 get_media_details 相同格式的字典。
+        """
+        return imap_unordered(cls.get_media_details, file_paths, max_workers or config.CONCURRENCY_LIMIT, cancel_event)
+
+    @classmethod
+    def probe_media_details(cls, file_path: str, full: bool = False) -> Dict[str, Optional[str]]:
         """
-        使用 ffprobe 获取媒体文件的详细信息。
+        获取媒体文件的详细信息。
+
+        默认使用轻量模式：图片直接用 Pillow 读取文件头，不启动 ffprobe；
+        视频只向 ffprobe 请求需要的字段（时长、大小，各个流的编码和宽高），输出为紧凑的 key=value 格式；
+        FFMPEG_BACKEND 启用 PyAV 时改为在进程内读取相同的字段。
+        full=True 时使用完整模式，让 ffprobe 以 JSON 输出全部格式和流信息。
 
         参数:
             file_path: str，媒体文件的完整路径。
+            full: bool，是否使用完整模式。
 
         返回:
             dict: 包含媒体文件详细信息的字典，包括以下键：
@@ -21,6 +126,8 @@ class MediaAnalyzer:
                 - size: 文件大小（格式化后的字符串）。
                 - resolution: 分辨率（如 "1920x1080"）。
                 - duration: 时长（格式化后的字符串）。
+                - duration_seconds: 时长的秒数（float），未知时为 None。
+                - streams: 流列表，每项包含 index、codec_type、codec_name；图片或未知时为 None。
                 - full_path: 文件的完整路径。
                 - error: 如果发生错误，则包含错误信息；否则为 None。
         """
@@ -30,6 +137,8 @@ class MediaAnalyzer:
             "size": "N/A",
             "resolution": "N/A",
             "duration": "N/A",
+            "duration_seconds": None,
+            "streams": None,
             "full_path": file_path,
             "error": None
         }
@@ -41,58 +150,60 @@ class MediaAnalyzer:
             except OSError:
                 pass
 
+            # 图片只读取文件头即可得到分辨率，读取失败时再交给 ffprobe
+            if not full and details["type"] in IMAGE_TYPES and cls._read_image_header(file_path, details):
+                return details
 
+            # 轻量模式下安装了 PyAV 时在进程内读取，不启动 ffprobe
+            if not full and pyav_backend.enabled():
+                try:
+                    pyav_backend.probe(file_path, details)
+                except pyav_backend.av.FFmpegError as e:
+                    details["error"] = pyav_backend.probe_error(e, details["name"])
+                    return details
+            else:
+                # 构建 ffprobe 命令
+                if full:
+                    command = [
+                        "ffprobe",
+                        "-v", "quiet",
+                        "-print_format", "json",
+                        "-show_format",
+                        "-show_streams",
+                        file_path
+                    ]
+                else:
+                    command = [
+                        "ffprobe",
+                        "-v", "error",
+                        "-show_entries", "format=duration,size:stream=index,codec_type,codec_name,width,height",
+                        "-of", "default=noprint_wrappers=1",
+                        file_path
+                    ]
 
-            # 构建 ffprobe 命令
-            command = [
-                "ffprobe",
-                "-v", "quiet",
-                "-print_format", "json",
-                "-show_format",
-                "-show_streams",
-                file_path
-            ]
+                if sys.platform == "win32":
+                    creationflags = subprocess.CREATE_NO_WINDOW
+                else:
+                    creationflags = 0
 
-            if sys.platform == "win32":
-                creationflags = subprocess.CREATE_NO_WINDOW
-            else:
-                creationflags = 0
 
+                # 执行 ffprobe 命令
+                result = subprocess.run(command, capture_output=True, text=True, check=False, encoding='utf-8',creationflags=creationflags)
 
-            # 执行 ffprobe 命令
-            result = subprocess.run(command, capture_output=True, text=True, check=False, encoding='utf-8',creationflags=creationflags)
+                if result.returncode != 0:
+                    error_msg = result.stderr or f"ffprobe exited with code {result.returncode}"
+                    if "No such file or directory" in error_msg or "Cannot open" in error_msg:
+                        details["error"] = f"File not found or cannot be opened: {details['name']}"
+                    elif "Invalid data found when processing input" in error_msg:
+                        details["error"] = f"Invalid data in file (corrupted?): {details['name']}"
+                    else:
+                        details["error"] = f"ffprobe error processing file: {details['name']}. Details: {error_msg[:150]}"
+                    return details
 
-            if result.returncode != 0:
-                error_msg = result.stderr or f"ffprobe exited with code {result.returncode}"
-                if "No such file or directory" in error_msg or "Cannot open" in error_msg:
-                    details["error"] = f"File not found or cannot be opened: {details['name']}"
-                elif "Invalid data found when processing input" in error_msg:
-                    details["error"] = f"Invalid data in file (corrupted?): {details['name']}"
+                if full:
+                    cls._parse_full_output(result.stdout, details)
                 else:
-                    details["error"] = f"ffprobe error processing file: {details['name']}. Details: {error_msg[:150]}"
-                return details
-
-            # 解析 JSON 输出
-            media_info = json.loads(result.stdout)
-
-            # 提取信息
-            format_info = media_info.get('format', {})
-            if 'duration' in format_info:
-                details["duration"] = format_duration(format_info['duration'])
-            if 'size' in format_info:
-                details["size"] = format_size(format_info['size'])
-
-            # 查找视频或图像流的分辨率
-            stream_info = media_info.get('streams', [])
-            for stream in stream_info:
-                if stream.get('codec_type') == 'video':
-                    if 'width' in stream and 'height' in stream:
-                        details["resolution"] = f"{stream['width']}x{stream['height']}"
-                        break
-                elif stream.get('codec_type') == 'image':
-                    if 'width' in stream and 'height' in stream:
-                        if details["resolution"] == "N/A":
-                            details["resolution"] = f"{stream['width']}x{stream['height']}"
+                    cls._parse_compact_output(result.stdout, details)
 
         except FileNotFoundError:
             details["error"] = "ffprobe command not found. Please install FFmpeg."
@@ -102,7 +213,86 @@ class MediaAnalyzer:
             details["error"] = f"An unexpected error occurred while processing {details['name']}: {str(e)}"
 
         # 对图片再次确认时长为 N/A
-        if details["type"] in ["PNG", "JPG", "JPEG", "GIF", "WEBP", "BMP"] and details["duration"] != "N/A":
+        if details["type"] in IMAGE_TYPES and details["duration"] != "N/A":
             details["duration"] = "N/A"
+            details["duration_seconds"] = None
 
         return details
+
+    @staticmethod
+    def _read_image_header(file_path: str, details: Dict[str, Optional[str]]) -> bool:
+        """
+        使用 Pillow 读取图片文件头获取分辨率，不解码像素数据。
+        :return: 是否读取成功
+        """
+        try:
+            with Image.open(file_path) as im:
+                details["resolution"] = f"{im.width}x{im.height}"
+            return True
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+            return False
+
+    @staticmethod
+    def _parse_compact_output(output: str, details: Dict[str, Optional[str]]):
+        """
+        解析 ffprobe default=noprint_wrappers=1 格式的 key=value 输出。
+        每个流以 index 开头，duration 和 size 只属于 format 部分。
+        """
+        values = {}
+        streams = []
+        for line in output.splitlines():
+            key, sep, value = line.partition("=")
+            key, value = key.strip(), value.strip()
+            if not sep or not value or value == "N/A":
+                continue
+            if key == "index":
+                streams.append({"index": int(value)})
+            elif key in ("codec_type", "codec_name", "width", "height") and streams:
+                streams[-1][key] = value
+            else:
+                values.setdefault(key, value)
+
+        if 'duration' in values:
+            details["duration"] = format_duration(values['duration'])
+            details["duration_seconds"] = parse_seconds(values['duration'])
+        if 'size' in values:
+            details["size"] = format_size(values['size'])
+        details["streams"] = [
+            {"index": stream["index"], "codec_type": stream.get("codec_type"), "codec_name": stream.get("codec_name")}
+            for stream in streams
+        ]
+        for stream in streams:
+            if stream.get("codec_type") == "video" and "width" in stream and "height" in stream:
+                details["resolution"] = f"{stream['width']}x{stream['height']}"
+                break
+
+    @staticmethod
+    def _parse_full_output(output: str, details: Dict[str, Optional[str]]):
+        """
+        解析 ffprobe 完整模式的 JSON 输出。
+        """
+        media_info = json.loads(output)
+
+        # 提取信息
+        format_info = media_info.get('format', {})
+        if 'duration' in format_info:
+            details["duration"] = format_duration(format_info['duration'])
+            details["duration_seconds"] = parse_seconds(format_info['duration'])
+        if 'size' in format_info:
+            details["size"] = format_size(format_info['size'])
+
+        # 查找视频或图像流的分辨率
+        stream_info = media_info.get('streams', [])
+        details["streams"] = [
+            {"index": stream.get("index"), "codec_type": stream.get("codec_type"), "codec_name": stream.get("codec_name")}
+            for stream in stream_info
+        ]
+        for stream in stream_info:
+            if stream.get('codec_type') == 'video':
+                if 'width' in stream and 'height' in stream:
+                    details["resolution"] = f"{stream['width']}x{stream['height']}"
+                    break
+            elif stream.get('codec_type') == 'image':
+                if 'width' in stream and 'height' in stream:
+                    if details["resolution"] == "N/A":
+                        details["resolution"] = f"{stream['width']}x{stream['height']}"
@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from config import config
+
+CacheKey = Tuple[str, int, int]
+
+
+class MediaCache:
+    """
+    媒体元数据缓存：内存 LRU 在前，SQLite 持久化在后。
+    键为 (绝对路径, 文件大小, mtime_ns)，文件被修改后旧条目自动失效。
+    新条目和访问时间的更新先在内存中累计，每 commit_batch 次或 flush()/close() 时在一个事务中写入。
+    可在多个线程间共享。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = None, memory_entries: int = None,
+                 commit_batch: int = None):
+        """
+        参数:
+            db_path: SQLite 数据库路径，为 None 时使用配置中的默认路径。
+            max_entries: 磁盘缓存最多保留的条目数。
+            memory_entries: 内存 LRU 的条目数。
+            commit_batch: 累计多少次写入后提交一次。
+        """
+        self.db_path = db_path or config.MEDIA_CACHE_PATH
+        self.max_entries = max_entries or config.MEDIA_CACHE_MAX_ENTRIES
+        self.memory_entries = memory_entries or config.MEDIA_CACHE_MEMORY_ENTRIES
+        self._memory: "OrderedDict[CacheKey, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disabled = False
+        self.commit_batch = commit_batch or config.MEDIA_CACHE_COMMIT_BATCH
+        self._writes_since_evict = 0
+        self._pending_rows: Dict[str, Tuple] = {}  # 路径 -> 尚未写入的整行
+        self._pending_access: Dict[str, float] = {}  # 路径 -> 尚未写入的访问时间
+
+    @staticmethod
+    def make_key(file_path: str) -> CacheKey:
+        """
+        根据文件当前状态生成缓存键。文件不存在时抛出 OSError。
+        """
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+    def _connect(self):
+        # 调用方需持有 self._lock
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS media ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "details TEXT NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS media_accessed_at ON media (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        except sqlite3.Error as e:
+            # 磁盘缓存不可用时退化为仅内存缓存
+            logging.error(f"无法打开媒体缓存 {self.db_path}: {e}")
+            self._disabled = True
+        return self._conn
+
+    def _remember(self, key: CacheKey, details: Dict):
+        self._memory[key] = details
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: CacheKey) -> Optional[Dict]:
+        """
+        查询缓存，未命中或条目已过期时返回 None。
+        """
+        with self._lock:
+            details = self._memory.get(key)
+            if details is not None:
+                self._memory.move_to_end(key)
+                return dict(details)
+
+            conn = self._connect()
+            if conn is None:
+                return None
+            path, size, mtime_ns = key
+            try:
+                row = self._pending_rows.get(path)
+                if row is not None:
+                    row = row[1:4]
+                else:
+                    row = conn.execute("SELECT size, mtime_ns, details FROM media WHERE path = ?", (path,)).fetchone()
+                if row is None or row[0] != size or row[1] != mtime_ns:
+                    return None
+                details = json.loads(row[2])
+            except (sqlite3.Error, ValueError) as e:
+                logging.error(f"读取媒体缓存失败: {e}")
+                return None
+            self._remember(key, details)
+            self._pending_access[path] = time.time()
+            self._maybe_flush_locked()
+            return dict(details)
+
+    def put(self, key: CacheKey, details: Dict):
+        """
+        写入缓存，同一路径的旧条目会被替换。
+        """
+        with self._lock:
+            self._remember(key, dict(details))
+            conn = self._connect()
+            if conn is None:
+                return
+            path, size, mtime_ns = key
+            self._pending_rows[path] = (path, size, mtime_ns, json.dumps(details, ensure_ascii=False), time.time())
+            self._pending_access.pop(path, None)
+            self._maybe_flush_locked()
+
+    def _maybe_flush_locked(self):
+        if len(self._pending_rows) + len(self._pending_access) >= self.commit_batch:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        # 调用方需持有 self._lock
+        if not self._pending_rows and not self._pending_access:
+            return
+        rows = list(self._pending_rows.values())
+        access = [(accessed_at, path) for path, accessed_at in self._pending_access.items()]
+        self._pending_rows.clear()
+        self._pending_access.clear()
+        conn = self._connect()
+        if conn is None:
+            return
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO media (path, size, mtime_ns, details, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.executemany("UPDATE media SET accessed_at = ? WHERE path = ?", access)
+            self._writes_since_evict += len(rows)
+            if self._writes_since_evict >= 256:
+                self._evict_locked()
+        except sqlite3.Error as e:
+            logging.error(f"写入媒体缓存失败: {e}")
+
+    def flush(self):
+        """
+        立即写入累计的新条目和访问时间。
+        """
+        with self._lock:
+            self._flush_locked()
+
+    def _evict_locked(self):
+        self._writes_since_evict = 0
+        conn = self._conn
+        count = conn.execute("SELECT COUNT(*) FROM media").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM media WHERE path IN (SELECT path FROM media ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+            conn.commit()
+
+    def evict(self):
+        """
+        按最近访问时间淘汰超出 max_entries 的磁盘条目。
+        """
+        with self._lock:
+            self._flush_locked()
+            if self._connect() is None:
+                return
+            try:
+                self._evict_locked()
+            except sqlite3.Error as e:
+                logging.error(f"清理媒体缓存失败: {e}")
+
+    def invalidate(self, file_path: str):
+        """
+        删除某个文件的缓存条目。
+        """
+        path = os.path.abspath(file_path)
+        with self._lock:
+            for key in [k for k in self._memory if k[0] == path]:
+                del self._memory[key]
+            self._pending_rows.pop(path, None)
+            self._pending_access.pop(path, None)
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                conn.execute("DELETE FROM media WHERE path = ?", (path,))
+                conn.commit()
+            except sqlite3.Error as e:
+                logging.error(f"删除媒体缓存条目失败: {e}")
+
+    def prune(self) -> int:
+        """
+        删除文件已不存在或已被修改的条目。
+        :return: 删除的条目数
+        """
+        with self._lock:
+            self._memory.clear()
+            self._flush_locked()
+            conn = self._connect()
+            if conn is None:
+                return 0
+            try:
+                stale = []
+                for path, size, mtime_ns in conn.execute("SELECT path, size, mtime_ns FROM media").fetchall():
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        stale.append((path,))
+                        continue
+                    if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                        stale.append((path,))
+                conn.executemany("DELETE FROM media WHERE path = ?", stale)
+                conn.commit()
+                return len(stale)
+            except sqlite3.Error as e:
+                logging.error(f"整理媒体缓存失败: {e}")
+                return 0
+
+    def clear(self):
+        """
+        清空全部缓存，之后的查询会重新调用 ffprobe 并重建缓存。
+        """
+        with self._lock:
+            self._memory.clear()
+            self._pending_rows.clear()
+            self._pending_access.clear()
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                conn.execute("DELETE FROM media")
+                conn.commit()
+                conn.execute("VACUUM")
+            except sqlite3.Error as e:
+                logging.error(f"清空媒体缓存失败: {e}")
+
+    def close(self):
+        """
+        写入累计的更新后关闭数据库连接。
+        """
+        with self._lock:
+            self._flush_locked()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
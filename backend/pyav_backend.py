@@ -0,0 +1,119 @@
+import logging
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+from config import config
+from utils.format_utils import format_duration, parse_seconds
+from utils.optional import optional_import
+
+# PyAV 是可选依赖，由 enabled() 在第一次需要时导入，未安装时探测和复制流都使用 ffmpeg 子进程。
+# 其余函数只在 enabled() 返回 True 之后调用
+av = None
+
+# FFMPEG_BACKEND 的取值：
+# auto: 安装了 PyAV 时在进程内探测和复制流，否则使用 ffmpeg 子进程
+# pyav: 同 auto，但未安装 PyAV 时记录警告
+# subprocess: 始终使用 ffprobe/ffmpeg 子进程
+BACKENDS = ("auto", "pyav", "subprocess")
+# 复制流时报告进度的最小间隔（秒）
+PROGRESS_INTERVAL = 0.25
+
+_warned = False
+
+
+def enabled() -> bool:
+    """
+    按配置 FFMPEG_BACKEND 判断是否在进程内使用 PyAV。
+    """
+    global _warned, av
+    backend = config.FFMPEG_BACKEND
+    if backend not in BACKENDS:
+        if not _warned:
+            logging.warning(f"未知的 FFMPEG_BACKEND: {backend}，可选: {', '.join(BACKENDS)}，使用 ffmpeg 子进程")
+            _warned = True
+        return False
+    if backend == "subprocess":
+        return False
+    av = optional_import("av")
+    if av is None:
+        if backend == "pyav" and not _warned:
+            logging.warning("FFMPEG_BACKEND 为 pyav，但未安装 PyAV，使用 ffmpeg 子进程")
+            _warned = True
+        return False
+    return True
+
+
+def _codec_name(stream) -> Optional[str]:
+    # 使用编码格式的名称（与 ffprobe 的 codec_name 相同），而不是具体解码器的名称（如 libdav1d）
+    try:
+        return stream.codec_context.codec.canonical_name
+    except Exception:
+        return None
+
+
+def probe(file_path: str, details: Dict[str, Optional[str]]):
+    """
+    在进程内读取容器和流信息，填写 details 中与 ffprobe 轻量模式相同的字段（时长、各个流的编码、分辨率）。
+    只读取文件头和必要的少量数据包，不解码。
+    :raises av.FFmpegError: 文件无法打开或格式无效
+    """
+    with av.open(file_path) as container:
+        if container.duration is not None:
+            seconds = container.duration / av.time_base
+            details["duration"] = format_duration(seconds)
+            details["duration_seconds"] = parse_seconds(seconds)
+        details["streams"] = [
+            {"index": stream.index, "codec_type": stream.type, "codec_name": _codec_name(stream)}
+            for stream in container.streams
+        ]
+        for stream in container.streams.video:
+            width = stream.codec_context.width
+            height = stream.codec_context.height
+            if width and height:
+                details["resolution"] = f"{width}x{height}"
+                break
+
+
+def probe_error(error: Exception, name: str) -> str:
+    """
+    把 PyAV 的异常转换为与 ffprobe 失败时相同的错误信息。
+    """
+    if isinstance(error, (av.error.FileNotFoundError, av.error.PermissionError)):
+        return f"File not found or cannot be opened: {name}"
+    if isinstance(error, av.error.InvalidDataError):
+        return f"Invalid data in file (corrupted?): {name}"
+    return f"ffprobe error processing file: {name}. Details: {str(error)[:150]}"
+
+
+def remux(input_file: str, output_file: str, stream_indexes: Sequence[int], target_format: str,
+          on_progress: Optional[Callable[[float], None]] = None):
+    """
+    在进程内把输入中指定的流逐包复制到输出文件，不解码也不编码。输出容器由 output_file 的扩展名决定。
+    数据包写入后被输出容器接管，不能再写入另一个输出，多个输出需要分别调用。
+    :param stream_indexes: 需要复制的输入流编号，按输出中的顺序排列
+    :param on_progress: 可选，on_progress(已复制到的时间位置秒数)，最多每 PROGRESS_INTERVAL 秒调用一次
+    :raises av.FFmpegError: 读取或写入失败
+    """
+    with av.open(input_file) as source, av.open(output_file, "w") as target:
+        input_streams = [source.streams[index] for index in stream_indexes]
+        mapping = {}
+        for stream in input_streams:
+            output_stream = target.add_stream_from_template(stream)
+            # AVI 按帧计时，与 ffmpeg 命令行一样使用帧率作为时间基
+            if target_format == "avi" and stream.type == "video" and stream.average_rate:
+                output_stream.time_base = 1 / stream.average_rate
+            mapping[stream.index] = output_stream
+
+        last_report = time.monotonic()
+        for packet in source.demux(input_streams):
+            # demux 在每个流结束时产出空的刷新包
+            if packet.size == 0:
+                continue
+            if on_progress is not None and packet.pts is not None and packet.time_base is not None:
+                now = time.monotonic()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    on_progress(float(packet.pts * packet.time_base))
+            packet.stream = mapping[packet.stream.index]
+            target.mux(packet)
+
@@ -0,0 +1,210 @@
+import io
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Optional
+
+from PIL import Image
+
+from backend.media_analyzer import MediaAnalyzer
+from config import config
+from core.dedup import partial_fingerprint
+
+# 视频封面取在时长的这个比例处（不超过 VIDEO_POSTER_MAX_SECONDS），避开常见的黑色片头
+VIDEO_POSTER_POSITION = 0.1
+VIDEO_POSTER_MAX_SECONDS = 10.0
+# 清理时把缓存降到上限的这个比例，避免每次写入都触发清理
+EVICT_TARGET_RATIO = 0.9
+
+
+def image_thumbnail(file_path: str, size: int) -> bytes:
+    """
+    生成图片缩略图（PNG 数据），动画图片取第一帧。
+    thumbnail() 会先调用 draft() 让 JPEG 解码器直接按 1/2、1/4、1/8 缩小解码，
+    再用 reduce() 整数倍缩小到目标尺寸的 reducing_gap 倍以内，最后才做一次精确缩放。
+    """
+    with Image.open(file_path) as im:
+        im.thumbnail((size, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if im.mode in ("LA", "PA", "P") else "RGB")
+        buffer = io.BytesIO()
+        im.save(buffer, "PNG", compress_level=1)
+        return buffer.getvalue()
+
+
+def video_thumbnail(file_path: str, size: int) -> Optional[bytes]:
+    """
+    用 ffmpeg 截取视频封面（PNG 数据）。在输入端定位并只解码关键帧，
+    一次跳转即可取到画面，不需要从文件开头逐帧解码。
+    :return: 无法取得画面时返回 None
+    """
+    duration = MediaAnalyzer.get_duration_seconds(file_path)
+    position = min(duration * VIDEO_POSTER_POSITION, VIDEO_POSTER_MAX_SECONDS) if duration else 0.0
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    command = [
+        'ffmpeg', '-v', 'error',
+        '-skip_frame', 'nokey', '-noaccurate_seek', '-ss', f"{position:.3f}",
+        '-i', file_path,
+        '-map', '0:v:0', '-frames:v', '1',
+        '-vf', f"scale={size}:{size}:force_original_aspect_ratio=decrease",
+        '-f', 'image2pipe', '-c:v', 'png', '-',
+    ]
+    try:
+        result = subprocess.run(command, stdin=subprocess.DEVNULL, capture_output=True, timeout=30,
+                                creationflags=creationflags)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logging.debug(f"截取视频封面失败 {file_path}: {e}")
+        return None
+    if result.returncode != 0 or not result.stdout:
+        logging.debug(f"截取视频封面失败 {file_path}: {result.stderr.decode('utf-8', errors='replace').strip()}")
+        return None
+    return result.stdout
+
+
+class ThumbnailCache:
+    """
+    缩略图磁盘缓存：每个缩略图一个文件，总大小超过上限时按最近访问时间（文件 mtime）淘汰。
+    可在多个线程间共享。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        :param cache_dir: 缓存目录，默认使用配置中的 THUMBNAIL_CACHE_DIR
+        :param max_bytes: 缓存总大小上限（字节），默认使用配置中的 THUMBNAIL_CACHE_MAX_BYTES
+        """
+        self.cache_dir = cache_dir or config.THUMBNAIL_CACHE_DIR
+        self.max_bytes = max_bytes or config.THUMBNAIL_CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+        # 缓存目录的当前总大小，第一次写入时扫描目录得到
+        self._total_bytes = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        读取缩略图，未命中时返回 None。命中时更新文件 mtime 作为访问时间。
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        """
+        写入缩略图。先写临时文件再替换，其他线程不会读到不完整的文件。
+        """
+        path = self._path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.error(f"写入缩略图缓存失败: {e}")
+            return
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict_locked()
+
+    def _scan_size(self) -> int:
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        total += entry.stat().st_size
+        except OSError:
+            pass
+        return total
+
+    def _evict_locked(self):
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(".png"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logging.error(f"清理缩略图缓存失败: {e}")
+            return
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TARGET_RATIO
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def clear(self):
+        """
+        删除全部缩略图。
+        """
+        with self._lock:
+            try:
+                with os.scandir(self.cache_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            os.remove(entry.path)
+            except OSError as e:
+                logging.error(f"清空缩略图缓存失败: {e}")
+            self._total_bytes = 0
+
+
+class Thumbnailer:
+    """
+    生成并缓存缩略图。缓存键为文件的快速内容指纹加修改时间（st_mtime_ns）：
+    文件被移动或重命名后修改时间不变，仍能命中；快速指纹只读取文件的开头和结尾，
+    中间的内容被修改时由修改时间的变化使缓存失效。
+    """
+
+    def __init__(self, cache: Optional[ThumbnailCache] = None, size: Optional[int] = None):
+        """
+        :param cache: 缩略图缓存，默认在配置的目录中新建
+        :param size: 缩略图最长边（像素），默认使用配置中的 THUMBNAIL_SIZE
+        """
+        self.cache = cache or ThumbnailCache()
+        self.size = size or config.THUMBNAIL_SIZE
+
+    def get(self, file_path: str) -> Optional[bytes]:
+        """
+        返回文件的缩略图（PNG 数据），无法生成时返回 None。
+        """
+        try:
+            key = f"{partial_fingerprint(file_path)}_{os.stat(file_path).st_mtime_ns}_{self.size}"
+        except OSError as e:
+            logging.debug(f"读取文件失败 {file_path}: {e}")
+            return None
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+
+        try:
+            if os.path.splitext(file_path)[1].lower() in config.VIDEO_EXTENSIONS:
+                data = video_thumbnail(file_path, self.size)
+            else:
+                data = image_thumbnail(file_path, self.size)
+        except Exception as e:
+            logging.debug(f"生成缩略图失败 {file_path}: {e}")
+            return None
+        if data:
+            self.cache.put(key, data)
+        return data
@@ -0,0 +1,148 @@
+"""
+无界面的批量转换命令行入口，不导入 Qt，适合在服务器或定时任务中运行。
+
+用法示例:
+    python cli.py -f gif -o out/ stickers/*.webp
+    python cli.py -f mp4 -o out/ -j 4 -r videos/
+    python cli.py -f png,webp,gif -o out/ stickers/   # 每个输入只解码一次，生成三种格式
+
+每个文件的结果以一行 JSON 输出到标准输出。
+"""
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import sys
+import time
+
+from config import config
+from core.app import App
+from core.dedup import ContentIndex
+from core.job_journal import JobJournal
+from core.metrics import AggregateSink, JsonLinesSink, Metrics, default_metrics
+from core.presets import PRESETS
+from core.validation import check_output_folder
+from utils.file_scanner import scan_files
+
+
+def detect_type(target_format):
+    """
+    根据目标格式推断转换器类型。多个格式以逗号分隔，必须属于同一类型。
+    """
+    try:
+        formats = App.parse_formats(target_format)
+    except ValueError:
+        return None
+    if all(fmt in config.IMAGE_TARGET_FORMATS for fmt in formats):
+        return "image"
+    if all(fmt in config.VIDEO_TARGET_FORMATS for fmt in formats):
+        return "video"
+    return None
+
+
+def expand_inputs(patterns, converter_type, recursive=False):
+    """
+    展开命令行中的文件、通配符和目录，目录中只收集对应类型扩展名的文件。
+    以生成器方式产出，转换可以在扫描结束前开始。
+    """
+    extensions = config.IMAGE_EXTENSIONS if converter_type == "image" else config.VIDEO_EXTENSIONS
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        yield from scan_files(paths, extensions, recursive=recursive)
+
+
+def print_progress(input_file, fraction, eta):
+    print(json.dumps({
+        "progress": input_file,
+        "fraction": round(fraction, 4),
+        "eta": None if eta is None else round(eta, 1),
+    }, ensure_ascii=False), file=sys.stderr, flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ezyconv", description="EzyConv 批量格式转换（命令行）")
+    parser.add_argument("inputs", nargs="+", help="输入文件、通配符或目录")
+    parser.add_argument("-f", "--format", required=True, help="目标格式，如 gif、png、webp、mp4、avi；多个格式以逗号分隔，如 png,webp")
+    parser.add_argument("-o", "--output", required=True, help="输出文件夹")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="固定的并发任务数，默认根据任务开销和系统负载自动调整")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归扫描目录中的子目录")
+    parser.add_argument("--resume", action="store_true", help="使用任务记录跳过此前已完成且仍然有效的转换，并记录新完成的转换")
+    parser.add_argument("--skip-newer", action="store_true", help="同名输出文件已存在且不早于输入文件时跳过")
+    parser.add_argument("--dedup", action="store_true", help="内容相同的输入只转换一次，并在不同批次间复用输出")
+    parser.add_argument("-p", "--preset", choices=tuple(PRESETS), default=None,
+                        help=f"编码预设，在速度和输出大小之间取舍，默认 {config.ENCODER_PRESET}；只复制流的视频不受影响")
+    parser.add_argument("-t", "--type", choices=("image", "video"), default=None, help="转换器类型，默认根据目标格式推断")
+    parser.add_argument("--progress", action="store_true", help="在标准错误输出视频文件的实时进度（JSON 行）")
+    parser.add_argument("--metrics", metavar="FILE", default=None, help="把每个输出的阶段耗时、字节数、退出码等以 JSON 行追加到文件")
+    parser.add_argument("--stats", action="store_true", help="结束时在标准错误输出按格式组合汇总的耗时分布")
+    parser.add_argument("-v", "--verbose", action="store_true", help="在标准错误输出调试日志")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL,
+                        format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+
+    converter_type = args.type or detect_type(args.format)
+    if converter_type is None:
+        print(f"不支持的目标格式: {args.format}", file=sys.stderr)
+        return 2
+    if args.jobs is not None and args.jobs < 1:
+        print("--jobs 必须大于 0", file=sys.stderr)
+        return 2
+    error = check_output_folder(args.output)
+    if error is not None:
+        print(error, file=sys.stderr)
+        return 2
+
+    journal = JobJournal() if args.resume else None
+    content_index = ContentIndex() if args.dedup else None
+    metrics = Metrics([JsonLinesSink(args.metrics)]) if args.metrics else default_metrics()
+    aggregate = None
+    if args.stats:
+        aggregate = AggregateSink()
+        metrics = metrics or Metrics()
+        metrics.add_sink(aggregate)
+    try:
+        app = App(args.output, args.format, converter_type, max_workers=args.jobs,
+                  journal=journal, skip_newer=args.skip_newer, dedup=args.dedup, content_index=content_index,
+                  progress_callback=print_progress if args.progress else None, metrics=metrics, preset=args.preset)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    counts = {"success": 0, "failed": 0, "cancelled": 0, "skipped": 0}
+    start_time = time.time()
+    try:
+        for result in app.iter_convert(expand_inputs(args.inputs, converter_type, args.recursive)):
+            counts[result.status] += 1
+            record = {
+                "input": result.input_file,
+                "output": result.output_file,
+                "status": result.status,
+            }
+            if result.error:
+                record["error"] = result.error
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+    except KeyboardInterrupt:
+        app.cancel()
+        return 130
+    finally:
+        app.shutdown()
+        if journal is not None:
+            journal.close()
+        if content_index is not None:
+            content_index.close()
+        if metrics is not None:
+            metrics.close()
+
+    print(json.dumps({"summary": counts, "elapsed": round(time.time() - start_time, 3)}), file=sys.stderr)
+    if aggregate is not None:
+        print(aggregate.format_summary(), file=sys.stderr)
+    return 0 if counts["failed"] == 0 and counts["cancelled"] == 0 else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
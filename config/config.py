@@ -2,3 +2,74 @@ import os
 # 定义并发限制大小
 CONCURRENCY_LIMIT = os.cpu_count() or 4  # 默认限制为 CPU 核心数或 4
 
+# 自适应调度：按任务开销分配并发额度，并根据 CPU、I/O 等待和内存占用动态调整（需要 psutil，未安装时固定为 CONCURRENCY_LIMIT）
+SCHEDULER_ADAPTIVE = True
+SCHEDULER_MAX_CONCURRENCY = CONCURRENCY_LIMIT * 2  # 额度上限，I/O 型任务较多时可以超过核心数
+SCHEDULER_LOOKAHEAD = 256  # 为按大小排序而预读的输入数量
+SCHEDULER_MEMORY_FRACTION = 0.5  # 同时运行的任务预估峰值内存之和不超过可用内存的比例
+
+# 单个图片任务的内存预算：多种目标格式共用一次解码时，全部解码帧需放得下，否则每种格式分别逐帧处理
+IMAGE_JOB_MEMORY_BUDGET = 512 * 1024 * 1024
+
+# 动画 GIF 编码引擎："auto"（有 NumPy 时用 fast，否则在可行时用 ffmpeg）、
+# "fast"（全局调色板 + 差异矩形，需要 NumPy）、"ffmpeg"（palettegen/paletteuse）、"pillow"（逐帧单独量化）
+GIF_ENCODER = "auto"
+
+# 默认的编码预设："fast"（速度优先）、"balanced"（均衡）、"small"（体积优先），见 core/presets.py；
+# 决定转码时的 x264 -preset/-crf、mpeg4 -q:v 和 Pillow 的 WebP quality/method、PNG 压缩级别和滤波器、GIF optimize
+ENCODER_PRESET = "balanced"
+
+# PNG 编码引擎："auto"（有 NumPy，且多核或预设固定使用一种滤波器时用 fast，否则用 pillow）、
+# "fast"（NumPy 逐行滤波，大图片按条带在多个线程中分别压缩，需要 NumPy）、"pillow"（Pillow 单线程编码），见 core/png_encoder.py
+PNG_ENCODER = "auto"
+# fast 引擎的压缩库："auto"（安装了 isal 且压缩级别不超过 2 时使用 ISA-L）、"zlib"、"isal"（未安装时使用 zlib）
+PNG_DEFLATE = "auto"
+PNG_PARALLEL_MIN_BYTES = 4 * 1024 * 1024  # 解码后不小于此大小的图片才分条带并行压缩
+PNG_PARALLEL_STRIP_BYTES = 1024 * 1024  # 每个条带解码后的大小，越小并行度越高，压缩率损失越大
+PNG_PARALLEL_THREADS = 0  # 每个进程的压缩线程数，0 为 CPU 核心数
+
+# 视频探测和只复制流的转换使用的后端："auto"（安装了 PyAV 时在进程内完成，不启动 ffprobe/ffmpeg）、
+# "pyav"（同 auto，未安装时记录警告）、"subprocess"（始终使用子进程）；需要转码时总是使用 ffmpeg 子进程
+FFMPEG_BACKEND = os.environ.get("EZYCONV_FFMPEG_BACKEND") or "auto"
+
+# 小视频批量转换：多个小文件合并到同一个 ffmpeg 进程中转换（每个输入一组 -i 和输出），摊薄进程启动开销
+VIDEO_BATCH_ENABLED = True
+VIDEO_BATCH_MAX_FILE_BYTES = 8 * 1024 * 1024  # 不超过此大小的输入才参与批量转换
+VIDEO_BATCH_MAX_INPUTS = 16  # 每个 ffmpeg 进程最多的输入数
+VIDEO_BATCH_MAX_BYTES = 64 * 1024 * 1024  # 每个 ffmpeg 进程输入文件的总大小上限
+
+# 转换前的检查：输入可读且文件头有效、目标格式受支持、输出文件夹可写、磁盘空间足够，未通过的文件不会被调度
+PREFLIGHT_ENABLED = True
+PREFLIGHT_RESERVE_BYTES = 256 * 1024 * 1024  # 按预估输出大小计算后，输出磁盘至少保留的空闲空间
+
+# 支持的输入扩展名和目标格式
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".flv")
+IMAGE_TARGET_FORMATS = ("PNG", "GIF", "WEBP")
+VIDEO_TARGET_FORMATS = ("MP4", "AVI")
+
+# 本地数据目录（缓存、任务记录等）
+DATA_DIR = os.environ.get("EZYCONV_DATA_DIR") or os.path.join(os.path.expanduser("~"), ".ezyconv")
+
+# 媒体元数据缓存
+MEDIA_CACHE_ENABLED = True
+MEDIA_CACHE_PATH = os.path.join(DATA_DIR, "media_cache.sqlite3")
+MEDIA_CACHE_MAX_ENTRIES = 200000  # 磁盘缓存最多保留的条目数，超出后按最近访问时间淘汰
+MEDIA_CACHE_MEMORY_ENTRIES = 4096  # 内存 LRU 的条目数
+MEDIA_CACHE_COMMIT_BATCH = 64  # 新条目和访问时间的更新累计到此数量时一次提交，其余在 close() 或退出时提交
+
+# 任务记录（用于续传和跳过已完成的转换）
+JOB_JOURNAL_PATH = os.path.join(DATA_DIR, "job_journal.sqlite3")
+
+# 转换指标：设置后每个输出的阶段耗时、字节数、退出码等以 JSON 行追加到此文件，为 None 时不收集
+METRICS_LOG_PATH = os.environ.get("EZYCONV_METRICS_LOG") or None
+
+# 内容指纹索引（去重）
+CONTENT_INDEX_PATH = os.path.join(DATA_DIR, "content_index.sqlite3")
+
+# 文件列表缩略图
+THUMBNAIL_SIZE = 64  # 缩略图最长边（像素）
+THUMBNAIL_CACHE_DIR = os.path.join(DATA_DIR, "thumbnails")
+THUMBNAIL_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 磁盘缓存总大小上限，超出后按最近访问时间淘汰
+THUMBNAIL_MEMORY_ENTRIES = 512  # 界面中保留的已加载缩略图数量
+THUMBNAIL_WORKERS = 2  # 后台生成缩略图的线程数
@@ -1,81 +1,663 @@
+import functools
 import logging
+import multiprocessing
 import queue
+import threading
 import time
 import os
+from collections import deque
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures.thread import BrokenThreadPool
 
+from config import config
 from core.converter_factory import ConverterFactory
+from core.dedup import ContentIndex, Deduplicator, materialize
+from core.job_journal import JobJournal
+from core.metrics import JobTrace, Metrics
+from core.output_files import OutputAllocator, commit_output, discard_output, temp_output_path
+from core.presets import BASELINE_PRESET, get_preset
+from core.scheduler import AdaptiveScheduler
+from core.validation import Preflight
+
+
+class ConversionResult(NamedTuple):
+    """
+    单个文件的转换结果。
+    status 取值: "success"、"failed"、"cancelled"、"skipped"。
+    metrics 为该输出所在任务的计时和属性（JobTrace.to_dict() 的结果），一个任务生成多个输出时 spans 按输出数分摊；
+    不属于任何任务（跳过、未通过检查）时为 None。
+    """
+    input_file: str
+    output_file: Optional[str]
+    status: str
+    message: str
+    error: Optional[str] = None
+    metrics: Optional[dict] = None
+
+
+def _create_on_temp_outputs(input_file, outputs, converter_type, **options):
+    """
+    创建写入临时文件的转换器。
+    :return: (转换器, 与 outputs 顺序一致的 [(临时文件, 目标格式), ...])
+    """
+    temp_outputs = [(temp_output_path(path), target_format) for path, target_format in outputs]
+    (temp_file, target_format), *extra_outputs = temp_outputs
+    if extra_outputs:
+        options["extra_outputs"] = extra_outputs
+    converter = ConverterFactory.create_converter(input_file=input_file, output_file=temp_file, target_format=target_format, converter_type=converter_type, **options)
+    return converter, temp_outputs
+
+
+def _convert(converter):
+    """
+    执行一次转换。转换器中未处理的异常按转换失败处理：所有输出都记为失败，随后由 _commit_outputs 删除临时文件，
+    不会因为异常跳过清理而留下写了一半的临时文件。
+    :return: 是否成功
+    """
+    try:
+        return converter.convert()
+    except Exception as e:
+        logging.exception(f"转换 {converter.input_file} 时发生异常")
+        converter.error = f"{type(e).__name__}: {e}"
+        converter.output_errors = {}
+        return False
+
+
+def _commit_outputs(converter, success, outputs, temp_outputs):
+    """
+    成功的输出从临时文件重命名为目标文件，失败的删除临时文件。
+    :return: ([(是否成功, 失败原因), ...], 转换器的 JobTrace)
+    """
+    errors = {} if success else getattr(converter, "output_errors", None) or {path: converter.error for path, _ in temp_outputs}
+    trace = getattr(converter, "trace", None) or JobTrace()
+
+    results = []
+    with trace.span("write"):
+        for (output_file, _), (temp_file, _) in zip(outputs, temp_outputs):
+            error = errors.get(temp_file)
+            if error is None:
+                try:
+                    commit_output(temp_file, output_file)
+                except OSError as e:
+                    error = f"无法写入输出文件: {e}"
+            if error is not None:
+                discard_output(temp_file)
+            results.append((error is None, error))
+    return results, trace
+
+
+def run_converter_outputs(input_file, outputs, converter_type, **options):
+    """
+    读取一次输入文件，生成多个目标格式的输出。
+    转换器写入同一文件夹中的临时文件，成功的输出再原子地重命名为目标文件，失败时删除临时文件，
+    不会留下写了一半的输出。
+    :param outputs: (输出文件, 目标格式) 列表
+    :return: (与 outputs 顺序一致的 [(是否成功, 失败原因), ...], 任务计时 JobTrace.to_dict())，
+        计时中的 started_at 为开始执行的时间戳，用于计算排队时间
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    converter, temp_outputs = _create_on_temp_outputs(input_file, outputs, converter_type, **options)
+    success = _convert(converter)
+    results, trace = _commit_outputs(converter, success, outputs, temp_outputs)
+    trace.add("total", time.perf_counter() - start)
+    trace.set("started_at", started_at)
+    return results, trace.to_dict()
+
+
+def _convert_batch(converter_class, converters):
+    """
+    批量转换失败时只把结果未确定的转换器对半拆分重试，直到定位到出错的输入单独转换，其余输入仍然批量转换；
+    已经得到结果的转换器不会重新转换。
+    :return: 与 converters 顺序一致的是否成功列表
+    """
+    if len(converters) == 1:
+        return [_convert(converters[0])]
+    try:
+        results = converter_class.convert_batch(converters)
+    except Exception:
+        # 与批量转换失败相同，无法确定各个输入的结果，拆分后重试
+        logging.exception(f"批量转换 {len(converters)} 个文件时发生异常")
+        results = [None] * len(converters)
+    retry = [index for index, result in enumerate(results) if result is None]
+    if not retry:
+        return results
+    logging.debug(f"批量转换 {len(retry)} 个文件失败，拆分后重试")
+    for index in retry:
+        converters[index].trace.set("batch_retried", True)
+    pending = [converters[index] for index in retry]
+    if len(pending) == 1:
+        retried = [_convert(pending[0])]
+    else:
+        middle = len(pending) // 2
+        retried = _convert_batch(converter_class, pending[:middle]) + _convert_batch(converter_class, pending[middle:])
+    for index, result in zip(retry, retried):
+        results[index] = result
+    return results
+
+
+def run_converter_batch(jobs, converter_type, **options):
+    """
+    在同一个转换器进程中转换多个小文件（转换器类需支持 convert_batch），摊薄每个文件单独启动的开销。
+    批量转换失败时无法区分是哪个输入出错，拆分为更小的批次重试，每个任务仍然得到各自的结果。
+    :param jobs: [(输入文件, [(输出文件, 目标格式), ...]), ...]
+    :param options: 传给每个转换器的参数（如 preset）
+    :return: 与 jobs 顺序一致的 [(结果列表, 任务计时), ...]，每项的格式与 run_converter_outputs 的返回值相同；
+        批量转换的耗时按任务数平均分摊到每个任务的计时中
+    """
+    started_at = time.time()
+    start = time.perf_counter()
+    converter_class = ConverterFactory.get_converter_class(converter_type)
+    prepared = [_create_on_temp_outputs(input_file, outputs, converter_type, **options) for input_file, outputs in jobs]
+    successes = _convert_batch(converter_class, [converter for converter, _ in prepared])
+    shared = (time.perf_counter() - start) / len(jobs)
+
+    job_results = []
+    for (_, outputs), (converter, temp_outputs), success in zip(jobs, prepared, successes):
+        job_start = time.perf_counter()
+        results, trace = _commit_outputs(converter, success, outputs, temp_outputs)
+        trace.add("total", shared + time.perf_counter() - job_start)
+        trace.set("started_at", started_at)
+        job_results.append((results, trace.to_dict()))
+    return job_results
 
 
 class App:
     # 定义并发限制大小
     CONCURRENCY_LIMIT = os.cpu_count() or 4  # 默认限制为 CPU 核心数或 4
 
-    def __init__(self, output_folder, combo,type,progress_queue: queue.Queue):
+    def __init__(self, output_folder, combo, type, progress_queue: queue.Queue = None, max_workers: int = None,
+                 journal: JobJournal = None, skip_newer: bool = False,
+                 dedup: bool = False, content_index: ContentIndex = None, progress_callback=None,
+                 metrics: Metrics = None, preset: str = None):
+        """
+        :param output_folder: 输出文件夹
+        :param combo: 目标格式，如 "GIF"；也可以是逗号分隔的字符串或格式序列（如 "PNG,WEBP"），
+            每个输入只读取和解码一次，生成所有目标格式
+        :param type: 转换器类型，"image" 或 "video"
+        :param progress_queue: 可选，接收每个文件结果消息的队列
+        :param max_workers: 固定的并发数；默认由 AdaptiveScheduler 按任务开销和系统负载动态调整
+        :param journal: 可选的任务记录，已记录且仍然有效的转换会被跳过，新完成的转换会被记录
+        :param skip_newer: 为 True 时，如果同名输出文件已存在且不早于输入文件，则跳过该文件
+        :param dedup: 为 True 时按内容指纹去重，内容相同的输入只转换一次，其余通过硬链接/reflink/复制得到输出
+        :param content_index: 可选的持久化内容索引，与 dedup 一起使用时跨批次复用相同内容的输出
+        :param progress_callback: 可选，progress_callback(input_file, fraction, eta_seconds)，
+            支持进度的转换器（视频）在转换过程中从工作线程调用
+        :param metrics: 可选，每个输出结束时把阶段耗时、字节数、退出码等记录发给它的 sink
+        :param preset: 编码预设名称（"fast"、"balanced"、"small"，见 core.presets），决定转码和图片编码的速度与输出大小，
+            默认使用配置中的 ENCODER_PRESET
+        :raises ValueError: 转换器类型未知，目标格式不受该类型的转换器支持，或预设不存在
+        """
         self.output_folder = output_folder
         self.combo = combo
+        self.formats = self.parse_formats(combo)
         self.type = type
+        error = ConverterFactory.get_converter_class(type).check_target_formats(self.formats)
+        if error is not None:
+            raise ValueError(error)
+        self.preset = get_preset(preset).name
         self.progress_queue = progress_queue
-        self.executor = ThreadPoolExecutor(max_workers=self.CONCURRENCY_LIMIT)
+        self.max_workers = max_workers
+        self.journal = journal
+        self.skip_newer = skip_newer
+        self.dedup = dedup
+        self.content_index = content_index
+        self.progress_callback = progress_callback
+        self.metrics = metrics
+        self._allocator = OutputAllocator()
+        self._executors = {}
+        self._cancel_event = threading.Event()
+        self._futures = {}
+        # iter_convert 在自己的线程中增删 _futures，cancel 可能从其他线程调用
+        self._futures_lock = threading.Lock()
 
     @staticmethod
-    def get_unique_filename(output_path):
+    def parse_formats(combo):
         """
-        生成一个唯一的文件名，避免覆盖已有文件。
-        :param output_path: 初步生成的文件路径
-        :return: 唯一的文件路径
+        把目标格式参数整理为去重后的大写格式元组。
+        :param combo: "GIF"、"PNG,WEBP" 或 ["PNG", "WEBP"]
         """
-        base, extension = os.path.splitext(output_path)
-        counter = 1
+        if isinstance(combo, str):
+            combo = combo.split(",")
+        formats = []
+        for target_format in combo:
+            target_format = target_format.strip().upper()
+            if target_format and target_format not in formats:
+                formats.append(target_format)
+        if not formats:
+            raise ValueError("至少需要一个目标格式")
+        return tuple(formats)
 
-        # 如果文件已经存在，增加编号直到文件名唯一
-        while os.path.exists(output_path):
-            output_path = f"{base}_{counter}{extension}"
-            counter += 1
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
 
-        # 统一为正向斜杠
-        path_obj = Path(output_path)
-        uniform_path = path_obj.as_posix()  # 转换为正斜杠
+    def cancel(self):
+        """
+        请求取消转换：尚未开始的任务直接取消，正在执行的任务完成后不再启动新任务。
+        可以从任意线程调用。
+        """
+        self._cancel_event.set()
+        with self._futures_lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
 
-        # 或者统一为反斜杠
-        # uniform_path = str(path_obj)  # 转换为系统
+    def get_executor(self, converter_type, max_workers=None):
+        """
+        按转换器类型获取执行器：CPU 密集的 Pillow 转换使用进程池以绕开 GIL，
+        调用 ffmpeg 子进程的视频转换使用线程池。执行器在多次转换之间复用。
+        :param converter_type: 转换器类型，"image" 或 "video"
+        :param max_workers: 工作线程/进程数，默认 max_workers 或 CONCURRENCY_LIMIT
+        :return: concurrent.futures 执行器
+        """
+        max_workers = max_workers or self.max_workers or self.CONCURRENCY_LIMIT
+        kind = ConverterFactory.get_converter_class(converter_type).EXECUTOR_KIND
+        executor = self._executors.get(kind)
+        if executor is None:
+            if kind == "process":
+                # 使用 spawn 启动工作进程，避免在多线程的 GUI 进程中 fork 导致死锁
+                executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                executor = ThreadPoolExecutor(max_workers=max_workers)
+            self._executors[kind] = executor
+        return executor
 
-        return uniform_path
+    def discard_executor(self, executor):
+        """
+        丢弃不再可用的执行器（工作进程异常退出后进程池会整体失效），下次 get_executor 时重新创建。
+        """
+        for kind, cached in list(self._executors.items()):
+            if cached is executor:
+                del self._executors[kind]
+        executor.shutdown(wait=False, cancel_futures=True)
 
-    def _start(self,input_file):
+    def _format_key(self, target_format):
+        """
+        任务记录和内容索引中使用的格式名。不同预设生成的输出不同，BASELINE_PRESET 之外的预设加上后缀加以区分。
+        """
+        return target_format if self.preset == BASELINE_PRESET else f"{target_format}@{self.preset}"
 
+    def _output_file(self, input_file, target_format):
         base_name = os.path.basename(input_file)
-        output_file = os.path.join(self.output_folder, os.path.splitext(base_name)[0] + f'.{self.combo.lower()}')
-        # 检查文件是否已存在，并生成唯一文件名
-        output_file = self.get_unique_filename(output_file)
+        output_file = os.path.join(self.output_folder, os.path.splitext(base_name)[0] + f'.{target_format.lower()}')
+        # 在本批次的分配记录中查重并生成唯一文件名，同名输入并行转换时不会得到相同的输出文件
+        return self._allocator.reserve_unique(output_file)
 
-        converter = ConverterFactory.create_converter(input_file=input_file, output_file=output_file,target_format=self.combo.lower(), converter_type=self.type)
+    def _plan_output(self, input_file, target_format):
+        """
+        决定输入文件在某个目标格式下的输出路径，以及是否已有最新的输出可以跳过转换。
+        启用任务记录或 skip_newer 时，过期的旧输出会被原地覆盖，而不是再生成带编号的新文件。
+        :return: (输出文件路径, 是否跳过)
+        """
+        base_name = os.path.basename(input_file)
+        natural_output = os.path.join(self.output_folder, os.path.splitext(base_name)[0] + f'.{target_format.lower()}')
+        if self.journal is not None:
+            output_file = self.journal.lookup(input_file, self._format_key(target_format), self.output_folder)
+            if output_file is not None:
+                return Path(output_file).as_posix(), True
+            output_file = self.journal.recorded_output(input_file, self._format_key(target_format), self.output_folder)
+            if output_file is not None and self._allocator.reserve(output_file):
+                return Path(output_file).as_posix(), False
+        if self.skip_newer:
+            try:
+                output_mtime_ns = os.stat(natural_output).st_mtime_ns
+            except OSError:
+                output_mtime_ns = None
+            if output_mtime_ns is not None:
+                try:
+                    up_to_date = output_mtime_ns >= os.stat(input_file).st_mtime_ns
+                except OSError:
+                    up_to_date = False
+                # 本批次中另一个同名输入已经使用了这个输出时，改为生成新文件
+                if up_to_date or self._allocator.reserve(natural_output):
+                    return Path(natural_output).as_posix(), up_to_date
+        return self._output_file(input_file, target_format), False
 
-        if converter.convert():
-            self.progress_queue.put(f"成功: {input_file} -> {output_file}")
-        else:
-            self.progress_queue.put(f"失败: {input_file} -> {output_file}")
+    def _on_success(self, input_file, output_file, target_format, deduplicator=None):
+        if self.journal is not None:
+            self.journal.record(input_file, self._format_key(target_format), self.output_folder, output_file)
+        if deduplicator is not None:
+            deduplicator.record(input_file, output_file, self._format_key(target_format))
 
+    def _reuse(self, input_file, source_output, output_file, target_format):
+        """
+        用内容相同的文件已有的输出生成当前文件的输出，不再重复转换。
+        :param source_output: 已有的输出文件，为 None 表示内容相同的文件未能转换成功
+        """
+        if source_output is None:
+            return ConversionResult(input_file, output_file, "failed", f"失败: {input_file} 内容相同的文件未能转换成功")
+        trace = JobTrace()
+        try:
+            with trace.span("write"):
+                method = materialize(source_output, output_file)
+        except OSError as e:
+            logging.error(f"复用输出失败 {source_output} -> {output_file}: {e}")
+            return ConversionResult(input_file, output_file, "failed", f"失败: {input_file} -> {output_file} 复用输出失败: {e}", str(e), trace.to_dict())
+        self._on_success(input_file, output_file, target_format)
+        trace.set("reused", method)
+        return ConversionResult(input_file, output_file, "success", f"成功: {input_file} -> {output_file} (内容重复，{method} 复用 {source_output})", None, trace.to_dict())
 
-    def convert(self, input_files):
+    @staticmethod
+    def _batch_file_size(input_file):
         """
-        使用线程池执行多个文件转换任务
-        :param input_files: 需要转换的输入文件列表
+        :return: 可以参与批量转换的小文件的大小，文件超过 VIDEO_BATCH_MAX_FILE_BYTES 或无法读取时为 None
         """
-        start_time_total = time.time()
-        logging.debug(f"程序开始运行 at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time_total))}, 并发限制: {self.CONCURRENCY_LIMIT}")
-        # 提交任务到线程池
-        futures = []
+        try:
+            size = os.path.getsize(input_file)
+        except OSError:
+            return None
+        return size if size <= config.VIDEO_BATCH_MAX_FILE_BYTES else None
+
+    @staticmethod
+    def _admitted(input_files, preflight, rejected):
+        """
+        只产出通过检查的输入，其余的放入 rejected。整批共同的检查失败时所有输入都被拒绝。
+        """
+        batch_error = preflight.check_batch()
+        if batch_error is not None:
+            logging.error(f"转换前检查失败: {batch_error}")
         for input_file in input_files:
-            future = self.executor.submit(self._start, input_file)
-            futures.append(future)
+            error = batch_error or preflight.check(input_file)
+            if error is None:
+                yield input_file
+            else:
+                logging.debug(f"跳过未通过检查的输入 {input_file}: {error}")
+                rejected.append((input_file, error))
+
+    @staticmethod
+    def _output_trace(trace, outputs_in_job):
+        """
+        一个任务一次读取生成多个输出时，解码、编码等耗时由这些输出共同承担，每个输出的计时按输出数平均分摊，
+        与批量转换分摊 ffmpeg 进程的耗时相同；排队时间是每个输出都经历的等待，不分摊。
+        """
+        trace["outputs_in_job"] = outputs_in_job
+        if outputs_in_job == 1:
+            return trace
+        spans = {name: seconds if name == "queue_wait" else seconds / outputs_in_job for name, seconds in trace["spans"].items()}
+        return {**trace, "spans": spans}
+
+    def _metrics_record(self, result):
+        """
+        把一个结果整理为指标记录：格式组合、状态、字节数和所在任务的计时与属性。
+        一个任务生成多个输出时，输入字节数和计时一样按输出数分摊，按目标格式汇总时同一个输入不会被重复计入。
+        """
+        record = {
+            "timestamp": time.time(),
+            "input": result.input_file,
+            "output": result.output_file,
+            "converter_type": self.type,
+            "source_format": os.path.splitext(result.input_file)[1].lstrip(".").lower() or None,
+            "target_format": os.path.splitext(result.output_file)[1].lstrip(".").lower() if result.output_file else None,
+            "status": result.status,
+            "error": result.error,
+            "bytes_in": None,
+            "bytes_out": None,
+            "spans": {},
+        }
+        try:
+            record["bytes_in"] = os.path.getsize(result.input_file) // ((result.metrics or {}).get("outputs_in_job") or 1)
+            if result.status == "success":
+                record["bytes_out"] = os.path.getsize(result.output_file)
+        except OSError:
+            pass
+        if result.metrics:
+            record.update({key: value for key, value in result.metrics.items() if key != "started_at"})
+        return record
+
+    def _emit(self, result):
+        if self.progress_queue is not None:
+            self.progress_queue.put(result.message)
+        if self.metrics is not None:
+            self.metrics.emit(self._metrics_record(result))
+        return result
+
+    def iter_convert(self, input_files):
+        """
+        以流式方式提交转换任务，并在每个任务完成时立即产出结果。
+        input_files 可以是生成器（例如目录扫描）。AdaptiveScheduler 预读一部分输入，按预估耗时从大到小开始转换，
+        同时运行的任务总开销不超过随系统负载调整的额度，内存占用与文件总数无关。
+        有多个目标格式时，每个输入只提交一个任务，一次读取生成所有格式，每个输出各产出一个结果。
+        调度之前每个输入先经过 Preflight 检查（只读取文件头），未通过的输入直接产出失败结果，不占用执行器；
+        磁盘空间在跳过和复用之后只为确定要转换的输出检查，转换结束时释放预留。
+        转换器支持批量转换时（视频），连续的小文件按 VIDEO_BATCH_* 的限制合并为一个任务，在同一个 ffmpeg 进程中转换，
+        每个文件仍然产出各自的结果；合并的文件不报告单个文件的进度。
+        结果消息同时写入 progress_queue（如果提供），调用方可以边转换边展示进度。
+        :param input_files: 需要转换的输入文件，可迭代对象
+        :return: ConversionResult 的生成器，按完成顺序产出
+        """
+        start_time_total = time.time()
+        scheduler = AdaptiveScheduler(self.type, self.formats, self.max_workers)
+        logging.debug(f"程序开始运行 at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time_total))}, "
+                      f"并发额度: {scheduler.capacity:g}{' (自适应)' if scheduler.adaptive else ''}")
+        executor = self.get_executor(self.type, scheduler.max_jobs)
+        converter_class = ConverterFactory.get_converter_class(self.type)
+        rejected = deque()  # 未通过检查的 (输入文件, 失败原因)，在主循环中产出结果
+        preflight = None
+        if config.PREFLIGHT_ENABLED:
+            preflight = Preflight(converter_class, self.formats, self.output_folder)
+            input_files = self._admitted(input_files, preflight, rejected)
+        ordered_jobs = scheduler.order(input_files)
+        next_job = None  # 已取出但额度不足、尚未开始的 (输入文件, 开销)
+        exhausted = False
+        future_to_job = {}
+        future_executors = {}  # 提交每个任务的执行器，同一个执行器失效时只替换一次
+        with self._futures_lock:
+            self._futures = future_to_job
+        report_progress = self.progress_callback is not None and converter_class.SUPPORTS_PROGRESS
+        deduplicator = Deduplicator([self._format_key(target_format) for target_format in self.formats], self.content_index) if self.dedup else None
+        duplicates = {}  # (正在转换的代表文件, 目标格式) -> 等待其结果的 (输入文件, 输出文件)
+        finished = {}  # (已结束的代表文件, 目标格式) -> 输出文件，失败时为 None
+        pending = set()  # 已提交但尚未结束的 (输入文件, 目标格式)
+        batchable = converter_class.SUPPORTS_BATCH and config.VIDEO_BATCH_ENABLED and config.VIDEO_BATCH_MAX_INPUTS > 1
+        batch = []  # 等待合并提交的小文件 (输入文件, group, 开销, 文件大小)
 
-        # 等待所有任务完成
-        for future in as_completed(futures):
-            if exception := future.exception():
-                logging.error(f"任务执行时发生异常: {exception}")
+        def submit_to_executor(fn, *args, **kwargs):
+            """
+            提交到执行器。工作进程被系统终止或在编解码器中崩溃后进程池整体失效，之后的提交会抛出 BrokenProcessPool：
+            丢弃失效的执行器，换一个新的重试一次；仍然失败时返回带有该异常的 Future，任务按失败产出结果，其余输入继续转换。
+            """
+            nonlocal executor
+            try:
+                return executor.submit(fn, *args, **kwargs)
+            except (BrokenProcessPool, BrokenThreadPool, RuntimeError) as e:
+                logging.error(f"执行器已失效，重新创建: {e}")
+                self.discard_executor(executor)
+                executor = self.get_executor(self.type, scheduler.max_jobs)
+                try:
+                    return executor.submit(fn, *args, **kwargs)
+                except (BrokenProcessPool, BrokenThreadPool, RuntimeError) as e:
+                    future = Future()
+                    future.set_exception(e)
+                    return future
 
+        def submit(jobs, costs, options):
+            """
+            :param jobs: [(输入文件, group), ...]，多于一个时合并在同一个转换器进程中执行
+            :param costs: 每个 job 的开销，已由调用方在决定执行时计入 scheduler，任务结束时逐个释放
+            """
+            if len(jobs) == 1:
+                input_file, group = jobs[0]
+                job_outputs = [(output_file, target_format.lower()) for target_format, output_file in group]
+                future = submit_to_executor(run_converter_outputs, input_file, job_outputs, self.type, **options)
+            else:
+                batch_jobs = [
+                    (input_file, [(output_file, target_format.lower()) for target_format, output_file in group])
+                    for input_file, group in jobs
+                ]
+                future = submit_to_executor(run_converter_batch, batch_jobs, self.type, **options)
+            with self._futures_lock:
+                future_to_job[future] = (jobs, costs, time.time())
+            future_executors[future] = executor
+            # 批次在取消之后才提交时，尽量不再执行
+            if self._cancel_event.is_set():
+                future.cancel()
+
+        def submit_batch():
+            # 批次中的每个文件加入批次时已经各自计入额度，后续文件按实际占用判断能否加入，批次的总权重不会超过额度
+            submit([(input_file, group) for input_file, group, _, _ in batch], [cost for _, _, cost, _ in batch],
+                   {"preset": self.preset})
+            batch.clear()
+
+        while True:
+            # 补充任务直到额度用满
+            scheduler.sample()
+            while not exhausted and not self._cancel_event.is_set():
+                if next_job is None:
+                    next_job = next(ordered_jobs, None)
+                    if next_job is None:
+                        exhausted = True
+                        break
+                input_file, cost = next_job
+                if not scheduler.can_admit(cost):
+                    break
+                next_job = None
+                outputs = []  # 需要转换的 (目标格式, 输出文件)
+                for target_format in self.formats:
+                    output_file, skip = self._plan_output(input_file, target_format)
+                    if skip:
+                        yield self._emit(ConversionResult(input_file, output_file, "skipped", f"跳过: {input_file} -> {output_file} 已是最新"))
+                    else:
+                        outputs.append((target_format, output_file))
+                if outputs and deduplicator is not None:
+                    kind, reference = deduplicator.check(input_file)
+                    remaining = []
+                    for target_format, output_file in outputs:
+                        stored_key = self._format_key(target_format).lower()
+                        if kind == "stored" and stored_key in reference:
+                            result = self._reuse(input_file, reference[stored_key], output_file, target_format)
+                            finished[(input_file, target_format)] = output_file if result.status == "success" else None
+                            yield self._emit(result)
+                        elif kind == "batch" and (reference, target_format) in finished:
+                            yield self._emit(self._reuse(input_file, finished[(reference, target_format)], output_file, target_format))
+                        elif kind == "batch" and (reference, target_format) in pending:
+                            duplicates.setdefault((reference, target_format), []).append((input_file, output_file))
+                        else:
+                            remaining.append((target_format, output_file))
+                    outputs = remaining
+                if outputs and preflight is not None:
+                    # 跳过和复用的输出不写入新文件，只为确定要转换的输出预留磁盘空间
+                    remaining = []
+                    for target_format, output_file in outputs:
+                        error = preflight.reserve(input_file, target_format)
+                        if error is None:
+                            remaining.append((target_format, output_file))
+                        else:
+                            yield self._emit(ConversionResult(input_file, output_file, "failed", f"失败: {input_file} 未通过转换前检查: {error}", error))
+                    outputs = remaining
+                if not outputs:
+                    continue
+                options = {"preset": self.preset}
+                if report_progress:
+                    options["progress_callback"] = functools.partial(self.progress_callback, input_file)
+                # 不支持多输出的转换器按格式分别提交
+                groups = [outputs] if converter_class.SUPPORTS_MULTI_OUTPUT else [[output] for output in outputs]
+                for group in groups:
+                    pending.update((input_file, target_format) for target_format, _ in group)
+                size = self._batch_file_size(input_file) if batchable and len(groups) == 1 else None
+                if size is not None:
+                    if batch and sum(batch_size for *_, batch_size in batch) + size > config.VIDEO_BATCH_MAX_BYTES:
+                        submit_batch()
+                    scheduler.start(cost)
+                    batch.append((input_file, groups[0], cost, size))
+                    if len(batch) >= config.VIDEO_BATCH_MAX_INPUTS:
+                        submit_batch()
+                    continue
+                for group in groups:
+                    scheduler.start(cost)
+                    submit([(input_file, group)], [cost], options)
+            # 批次未满时，额度用满或输入取完后也立即提交，不等待后续输入
+            if batch:
+                submit_batch()
+
+            while rejected:
+                input_file, error = rejected.popleft()
+                for target_format in self.formats:
+                    yield self._emit(ConversionResult(input_file, None, "failed", f"失败: {input_file} 未通过转换前检查: {error}", error))
+
+            if not future_to_job:
+                break
+
+            # 按完成顺序产出结果；自适应调度时定期醒来重新采样负载，额度增加后可以立即补充任务
+            timeout = scheduler.SAMPLE_INTERVAL if scheduler.adaptive else None
+            done, _ = wait(list(future_to_job), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                with self._futures_lock:
+                    jobs, costs, submitted_at = future_to_job.pop(future)
+                for cost in costs:
+                    scheduler.finish(cost)
+                failed_executor = future_executors.pop(future)
+                if (
+                    failed_executor is executor
+                    and not future.cancelled()
+                    and isinstance(future.exception(), (BrokenProcessPool, BrokenThreadPool))
+                ):
+                    # 同一个失效的执行器上的其他任务也会以同样的异常结束，只在第一次时替换；
+                    # 之后不再提交新任务时也不把失效的执行器留给下一次转换
+                    self.discard_executor(executor)
+                    executor = self.get_executor(self.type, scheduler.max_jobs)
+                if future.cancelled() or future.exception():
+                    job_outcomes = [None] * len(jobs)
+                else:
+                    job_outcomes = [future.result()] if len(jobs) == 1 else future.result()
+                for (input_file, group), job_outcome in zip(jobs, job_outcomes):
+                    results = []
+                    if future.cancelled():
+                        trace = self._output_trace({"spans": {}}, len(group))
+                        for target_format, output_file in group:
+                            results.append(ConversionResult(input_file, output_file, "cancelled", f"取消: {input_file}", None, trace))
+                    elif exception := future.exception():
+                        logging.error(f"任务执行时发生异常: {exception}")
+                        trace = self._output_trace({"spans": {}}, len(group))
+                        for target_format, output_file in group:
+                            results.append(ConversionResult(input_file, output_file, "failed", f"失败: {input_file} 发生异常: {exception}", str(exception), trace))
+                    else:
+                        outcomes, trace = job_outcome
+                        trace["spans"]["queue_wait"] = max(0.0, trace["started_at"] - submitted_at)
+                        trace = self._output_trace(trace, len(group))
+                        for (target_format, output_file), (success, error) in zip(group, outcomes):
+                            if success:
+                                results.append(ConversionResult(input_file, output_file, "success", f"成功: {input_file} -> {output_file}", None, trace))
+                                self._on_success(input_file, output_file, target_format, deduplicator)
+                            else:
+                                reason = f" 原因: {error}" if error else ""
+                                results.append(ConversionResult(input_file, output_file, "failed", f"失败: {input_file} -> {output_file}{reason}", error, trace))
+
+                    for (target_format, output_file), result in zip(group, results):
+                        yield self._emit(result)
+
+                        key = (input_file, target_format)
+                        pending.discard(key)
+                        if preflight is not None:
+                            preflight.release(input_file, target_format)
+                        if deduplicator is not None:
+                            finished[key] = output_file if result.status == "success" else None
+                            for duplicate_input, duplicate_output in duplicates.pop(key, ()):
+                                if result.status == "cancelled":
+                                    yield self._emit(ConversionResult(duplicate_input, duplicate_output, "cancelled", f"取消: {duplicate_input}"))
+                                else:
+                                    yield self._emit(self._reuse(duplicate_input, finished[key], duplicate_output, target_format))
+
+        ordered_jobs.close()
         end_time_total = time.time()
         total_duration = end_time_total - start_time_total
-        logging.debug(f"所有文件转换完成 (thread) at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end_time_total))}, 总耗时: {total_duration:.2f} 秒")
\ No newline at end of file
+        logging.debug(f"所有文件转换完成 at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(end_time_total))}, 总耗时: {total_duration:.2f} 秒")
+
+    def convert(self, input_files):
+        """
+        并发执行多个文件转换任务，阻塞直到全部完成。
+        :param input_files: 需要转换的输入文件列表
+        """
+        for _ in self.iter_convert(input_files):
+            pass
+
+    def shutdown(self, wait=True):
+        """
+        关闭所有已创建的执行器。
+        """
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+        self._executors.clear()
@@ -1,20 +1,105 @@
+import os
 from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional
+
+from core.metrics import JobTrace
+from core.validation import check_input
 
 # 抽象产品
 class Converter(ABC):
+    # 执行器类型："thread" 适合等待子进程的 I/O 型任务，"process" 适合持有 GIL 的 CPU 密集型任务
+    EXECUTOR_KIND = "thread"
+    # 是否支持 progress_callback 参数报告单个文件的转换进度
+    SUPPORTS_PROGRESS = False
+    # 是否支持 extra_outputs 参数，一次读取输入生成多种目标格式
+    SUPPORTS_MULTI_OUTPUT = False
+    # 是否支持 convert_batch，一个进程转换多个输入
+    SUPPORTS_BATCH = False
+    # 能处理的输入容器（validation.sniff_format 的结果）和支持的目标格式（大写），由子类设置
+    SOURCE_CONTAINERS = frozenset()
+    TARGET_FORMATS = ()
+    # 转换失败时的原因，由子类设置
+    error = None
 
-    def __init__(self, input_file, output_folder, target_format):
-        pass
+    def __init__(self, input_file, output_file, target_format):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.target_format = target_format
+        self.outputs = [(output_file, target_format)]
+        # 各阶段耗时和属性（退出码、stderr 末尾等），由子类在转换过程中填写
+        self.trace = JobTrace()
 
+    @classmethod
+    def check_target_formats(cls, target_formats: Iterable[str]) -> Optional[str]:
+        """
+        :return: 有不支持的目标格式时返回失败原因，否则为 None
+        """
+        unsupported = [target_format for target_format in target_formats if target_format.upper() not in cls.TARGET_FORMATS]
+        if unsupported:
+            return f"不支持的目标格式: {', '.join(unsupported)}，可选: {', '.join(cls.TARGET_FORMATS)}"
+        return None
 
-    def validation(self):
-        pass
+    @classmethod
+    def batch_validation(cls, target_formats: Iterable[str]) -> Optional[str]:
+        """
+        整批转换共同的检查，在调度任何任务之前执行一次。子类可以追加编码器、外部程序等检查。
+        :return: 失败原因，通过时为 None
+        """
+        return cls.check_target_formats(target_formats)
+
+    @classmethod
+    def input_validation(cls, input_file: str, target_formats: Iterable[str]) -> Optional[str]:
+        """
+        单个输入的检查：输入文件可读且文件头属于支持的格式，只读取文件头，不解码。子类可以追加与输入内容有关的检查。
+        :return: 失败原因，通过时为 None
+        """
+        return check_input(input_file, cls.SOURCE_CONTAINERS)
+
+    def validation(self) -> Optional[str]:
+        """
+        单个文件转换前的快速检查：整批共同的检查（batch_validation）和这个输入的检查（input_validation）。
+        :return: 失败原因，通过时为 None
+        """
+        target_formats = [target_format for _, target_format in self.outputs]
+        return self.batch_validation(target_formats) or self.input_validation(self.input_file, target_formats)
 
 
     @abstractmethod
     def convert(self):
         pass
 
+    @classmethod
+    def convert_batch(cls, converters) -> List[Optional[bool]]:
+        """
+        一次转换多个输入，由 SUPPORTS_BATCH 为 True 的子类实现。
+        :return: 与 converters 顺序一致的结果：True 成功，False 失败；None 表示所在的批次失败、无法确定是哪个输入出错，
+            调用方应把这些转换器拆分后重试或逐个调用 convert()
+        """
+        raise NotImplementedError
+
 
 class MediaConverter:
-    pass
\ No newline at end of file
+    """
+    不依赖图形界面的单文件转换入口，目标格式由输出文件的扩展名决定。
+    preset 为编码预设名称（见 core.presets），默认使用配置中的 ENCODER_PRESET，不存在时抛出 ValueError。
+    """
+
+    def convert_image(self, input_file, output_file, preset=None) -> bool:
+        return self._convert(input_file, output_file, "image", preset)
+
+    def convert_video(self, input_file, output_file, preset=None) -> bool:
+        return self._convert(input_file, output_file, "video", preset)
+
+    @staticmethod
+    def _convert(input_file, output_file, converter_type, preset=None) -> bool:
+        # 延迟导入，避免与具体转换器模块循环导入
+        from core.converter_factory import ConverterFactory
+
+        target_format = os.path.splitext(output_file)[1].lstrip('.').lower()
+        converter = ConverterFactory.create_converter(input_file, output_file, target_format, converter_type, preset=preset)
+        if converter.validation() is not None:
+            return False
+        # 延迟导入，避免循环导入；通过临时文件写出，失败时不留下不完整的输出
+        from core.app import run_converter_outputs
+        results, _ = run_converter_outputs(input_file, [(output_file, target_format)], converter_type, preset=preset)
+        return results[0][0]
@@ -1,15 +1,23 @@
 # 简单工厂
+from backend import pyav_backend
 from core.converter import Converter
 from core.converter_image import ConverterImage
+from core.converter_pyav import ConverterVideoPyAV
 from core.converter_video import ConverterVideo
 
 
 class ConverterFactory:
     @staticmethod
-    def create_converter(input_file, output_file, target_format, converter_type) -> Converter:
+    def get_converter_class(converter_type) -> type:
         if converter_type == "image":
-            return ConverterImage(input_file, output_file, target_format)
+            return ConverterImage
         elif converter_type == "video":
-            return ConverterVideo(input_file, output_file, target_format)
+            # 按配置 FFMPEG_BACKEND 选择：只复制流时在进程内通过 PyAV 完成，否则调用 ffmpeg 子进程
+            return ConverterVideoPyAV if pyav_backend.enabled() else ConverterVideo
         else:
-            raise ValueError(f"Unknown converter type: {converter_type}")
\ No newline at end of file
+            raise ValueError(f"Unknown converter type: {converter_type}")
+
+    @staticmethod
+    def create_converter(input_file, output_file, target_format, converter_type, **options) -> Converter:
+        converter_class = ConverterFactory.get_converter_class(converter_type)
+        return converter_class(input_file, output_file, target_format, **options)
@@ -1,26 +1,94 @@
-from PIL import Image
+from PIL import Image, features
 import logging
 
+from config import config
 from core.converter import Converter
+from core.frame_pipeline import ImageGeometry, can_decode_once, decode_frames, save_decoded, save_streaming
+from core.gif_encoder import encode_with_ffmpeg, resolve_engine
+from core.png_encoder import resolve_engine as resolve_png_engine
+from core.presets import get_preset
+from core.validation import IMAGE_CONTAINERS
 
 
 class ConverterImage(Converter):
+    # Pillow 的 GIF 量化和 WebP 编码大部分时间持有 GIL，使用进程池才能利用多核
+    EXECUTOR_KIND = "process"
+    SUPPORTS_MULTI_OUTPUT = True
+    SOURCE_CONTAINERS = IMAGE_CONTAINERS
+    TARGET_FORMATS = config.IMAGE_TARGET_FORMATS
+
     def convert_file(self, file_path, output_path):
         pass
 
-    def __init__(self, input_file, output_file, target_format):
+    def __init__(self, input_file, output_file, target_format, extra_outputs=(), memory_budget=None, gif_encoder=None,
+                 preset=None, png_encoder=None):
+        """
+        :param extra_outputs: 可选，额外输出的 (输出文件, 目标格式) 列表，内存预算允许时输入只解码一次后保存为所有格式
+        :param memory_budget: 单个任务的内存预算（字节），默认使用配置中的 IMAGE_JOB_MEMORY_BUDGET
+        :param gif_encoder: 动画 GIF 的编码引擎，"auto"、"fast"、"ffmpeg" 或 "pillow"，默认使用配置中的 GIF_ENCODER
+        :param preset: 编码预设名称（见 core.presets），决定 WebP、PNG、GIF 的保存参数，默认使用配置中的 ENCODER_PRESET
+        :param png_encoder: PNG 的编码引擎，"auto"、"fast" 或 "pillow"，默认使用配置中的 PNG_ENCODER
+        """
         super().__init__(input_file, output_file, target_format)
         self.input_file = input_file
         self.output_file = output_file
         self.target_format = target_format
+        self.outputs = [(output_file, target_format), *extra_outputs]
+        self.memory_budget = memory_budget or config.IMAGE_JOB_MEMORY_BUDGET
+        self.gif_engine = resolve_engine(gif_encoder or config.GIF_ENCODER, input_file)
+        self.preset = get_preset(preset)
+        self.png_engine = resolve_png_engine(png_encoder or config.PNG_ENCODER, self.preset.png_filter)
+        # 输出文件 -> 失败原因，只包含失败的输出
+        self.output_errors = {}
+
+    @classmethod
+    def batch_validation(cls, target_formats):
+        error = super().batch_validation(target_formats)
+        if error is None and any(target_format.upper() == "WEBP" for target_format in target_formats) and not features.check("webp"):
+            error = "当前 Pillow 未编译 WebP 支持，无法输出 WEBP"
+        return error
+
+    def _fail(self, output_file, error):
+        self.output_errors[output_file] = error
+        self.error = error
+        logging.error(f"失败 : {self.input_file} -> {output_file} 发生异常 : {error}")
 
     def convert(self):
         try:
-            im = Image.open(self.input_file)
-            im.save(self.output_file, self.target_format.lower(), save_all=True)
-            logging.debug(f"成功 : {self.input_file} -> {self.output_file}")
-            return True
+            with self.trace.span("probe"):
+                im = Image.open(self.input_file)
+                geometry = ImageGeometry(im.width, im.height, getattr(im, "n_frames", 1))
+                loop = im.info.get("loop")
+                has_alpha = im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info
+            decoded = None
+            with self.trace.span("decode"):
+                if geometry.frames > 1 and can_decode_once(geometry, len(self.outputs), self.memory_budget):
+                    # 多个目标格式且全部帧放得下时只解码一次，再分别编码
+                    decoded = decode_frames(im)
+                elif geometry.frames == 1:
+                    im.load()
         except Exception as e:
-            logging.error(f"失败 : {self.input_file} 发生异常 : {e}")
+            for output_file, _ in self.outputs:
+                self._fail(output_file, str(e))
             return False
 
+        for output_file, target_format in self.outputs:
+            try:
+                error = None
+                save_options = self.preset.pillow_options(target_format)
+                with self.trace.span("encode"):
+                    if target_format.lower() == "gif" and self.gif_engine == "ffmpeg" and geometry.frames > 1:
+                        error = encode_with_ffmpeg(self.input_file, output_file, loop)
+                    elif decoded is not None:
+                        save_decoded(*decoded, output_file, target_format, loop, has_alpha, self.gif_engine, save_options,
+                                     self.png_engine)
+                    else:
+                        # 逐帧解码、逐帧编码，内存占用只与单帧大小有关；多个格式时每种格式重新读取输入
+                        save_streaming(im, output_file, target_format, self.gif_engine, save_options, self.png_engine)
+                if error is not None:
+                    self._fail(output_file, error)
+                    continue
+                logging.debug(f"成功 : {self.input_file} -> {output_file}")
+            except Exception as e:
+                self._fail(output_file, str(e))
+        return not self.output_errors
@@ -0,0 +1,120 @@
+import logging
+import shutil
+import time
+from typing import List, Optional
+
+from backend import pyav_backend
+from core.converter_video import ConverterVideo
+from core.video_planner import COPY_BITSTREAM_FILTERS, plan_streams
+
+
+def _remux_indexes(streams, target_format: str) -> Optional[List[int]]:
+    """
+    :return: 输出只需要复制流时，需要复制的输入流编号；需要转码、码流过滤器，或流信息未知时返回 None
+    """
+    target_format = target_format.lower()
+    plans = plan_streams(streams, target_format)
+    if plans is None:
+        return None
+    indexes = []
+    for plan in plans:
+        if plan.action == "transcode" or (target_format, plan.codec_name) in COPY_BITSTREAM_FILTERS:
+            return None
+        if plan.action == "copy":
+            indexes.append(plan.index)
+    return indexes or None
+
+
+class ConverterVideoPyAV(ConverterVideo):
+    """
+    只需要复制流的输出在进程内通过 PyAV 逐包复制，不启动 ffmpeg 子进程；
+    需要转码或码流过滤器的输入仍然交给 ffmpeg 子进程（ConverterVideo 的实现）。
+    由 ConverterFactory 在 FFMPEG_BACKEND 启用 PyAV 时使用。
+    """
+
+    @classmethod
+    def batch_validation(cls, target_formats):
+        # 只复制流的输入不需要 ffmpeg，是否需要取决于每个输入的流，由 input_validation 检查
+        return super(ConverterVideo, cls).batch_validation(target_formats)
+
+    @classmethod
+    def input_validation(cls, input_file, target_formats):
+        error = super().input_validation(input_file, target_formats)
+        if error is None and shutil.which("ffmpeg") is None:
+            # 延迟导入，避免转换器模块在加载时依赖媒体分析
+            from backend.media_analyzer import MediaAnalyzer
+            streams = MediaAnalyzer.get_streams(input_file)
+            if any(_remux_indexes(streams, target_format) is None for target_format in target_formats):
+                error = "需要转码或码流过滤器，但未找到 ffmpeg，请安装 FFmpeg 并添加到系统 PATH"
+        return error
+
+    def remux_streams(self):
+        """
+        :return: 与 self.outputs 顺序一致的、每个输出需要复制的输入流编号列表；
+            任一输出需要转码、码流过滤器，或流信息未知时返回 None
+        """
+        self._ensure_streams()
+        remux_streams = []
+        for _, target_format in self.outputs:
+            indexes = _remux_indexes(self.streams, target_format)
+            if indexes is None:
+                return None
+            remux_streams.append(indexes)
+        return remux_streams
+
+    def convert(self):
+        with self.trace.span("probe"):
+            remux_streams = self.remux_streams()
+        if remux_streams is None:
+            return super().convert()
+
+        # 批量转换失败后会对同一个转换器重试，清除上一次的结果
+        self.output_errors = {}
+        self.error = None
+        if self.progress_callback is not None and self.duration is None:
+            # 延迟导入，只有需要进度时才依赖媒体分析
+            from backend.media_analyzer import MediaAnalyzer
+            with self.trace.span("probe"):
+                self.duration = MediaAnalyzer.get_duration_seconds(self.input_file)
+
+        self.trace.set("backend", "pyav")
+        start_time = time.monotonic()
+        with self.trace.span("encode"):
+            for output_index, ((output_file, target_format), indexes) in enumerate(zip(self.outputs, remux_streams)):
+                on_progress = None
+                if self.progress_callback is not None and self.duration:
+                    # 多个输出依次复制，进度按输出数平均分段
+                    def on_progress(position, output_index=output_index):
+                        overall = (output_index * self.duration + position) / len(self.outputs)
+                        self._report_progress(int(overall * 1_000_000), None, start_time)
+                try:
+                    pyav_backend.remux(self.input_file, output_file, indexes, target_format.lower(), on_progress)
+                    logging.debug(f"成功 (PyAV) : {self.input_file} -> {output_file}")
+                except (pyav_backend.av.FFmpegError, OSError, ValueError) as e:
+                    self.output_errors[output_file] = str(e)
+                    logging.debug(f"失败 (PyAV) : {self.input_file} -> {output_file}: {e}")
+
+        if self.output_errors:
+            self.error = next(iter(self.output_errors.values()))
+            return False
+        return True
+
+    @classmethod
+    def convert_batch(cls, converters):
+        # 只复制流的输入在进程内逐个转换，没有进程启动开销需要摊薄，各自的结果是确定的；
+        # 其余输入仍然合并到一个 ffmpeg 进程中，只有这部分在失败时需要拆分重试
+        results = [None] * len(converters)
+        rest = []
+        for index, converter in enumerate(converters):
+            with converter.trace.span("probe"):
+                remuxable = converter.remux_streams() is not None
+            if remuxable:
+                results[index] = converter.convert()
+            else:
+                rest.append(index)
+        if len(rest) == 1:
+            results[rest[0]] = converters[rest[0]].convert()
+        elif rest:
+            for index, result in zip(rest, super().convert_batch([converters[index] for index in rest])):
+                results[index] = result
+        return results
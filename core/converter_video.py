@@ -1,50 +1,239 @@
 import logging
+import shutil
 import subprocess
 import sys
+import threading
+import time
+from collections import deque
 
+from config import config
 from core.converter import Converter
+from core.metrics import JobTrace
+from core.presets import get_preset
+from core.validation import VIDEO_CONTAINERS
+from core.video_planner import build_output_args, describe_plan, plan_streams
 
 class ConverterVideo(Converter):
+    SUPPORTS_PROGRESS = True
+    SUPPORTS_MULTI_OUTPUT = True
+    SUPPORTS_BATCH = True
+    # 保留的 ffmpeg stderr 行数，用于失败时报告原因
+    STDERR_TAIL_LINES = 40
+    SOURCE_CONTAINERS = VIDEO_CONTAINERS
+    TARGET_FORMATS = config.VIDEO_TARGET_FORMATS
 
-
-    def __init__(self, input_file, output_file, target_format):
+    def __init__(self, input_file, output_file, target_format, duration=None, progress_callback=None,
+                 streams=None, extra_outputs=(), preset=None):
+        """
+        :param duration: 输入文件时长（秒），用于计算进度；为 None 且需要进度时通过 MediaAnalyzer 获取
+        :param progress_callback: 可选，progress_callback(fraction, eta_seconds)，在转换过程中被反复调用，
+            fraction 为 0~1 的完成比例，eta_seconds 为预计剩余秒数（未知时为 None）
+        :param streams: 输入文件的流列表（MediaAnalyzer.get_streams 的结果），用于决定每个流复制还是转码；
+            为 None 时通过 MediaAnalyzer 获取
+        :param extra_outputs: 可选，额外输出的 (输出文件, 目标格式) 列表，由同一次 ffmpeg 调用生成，输入只读取和解码一次
+        :param preset: 需要转码时使用的编码预设名称（见 core.presets），默认使用配置中的 ENCODER_PRESET
+        """
         super().__init__(input_file, output_file, target_format)
         self.input_file = input_file
         self.output_file = output_file
         self.target_format = target_format
+        self.duration = duration
+        self.progress_callback = progress_callback
+        self.streams = streams
+        self.outputs = [(output_file, target_format), *extra_outputs]
+        self.preset = get_preset(preset)
+        # 输出文件 -> 失败原因，只包含失败的输出
+        self.output_errors = {}
+        self.stderr_tail = deque(maxlen=self.STDERR_TAIL_LINES)
+        self.returncode = None
+        self.error = None
 
+    @classmethod
+    def batch_validation(cls, target_formats):
+        error = super().batch_validation(target_formats)
+        if error is None and shutil.which("ffmpeg") is None:
+            error = "未找到 ffmpeg，请安装 FFmpeg 并添加到系统 PATH"
+        return error
 
-    def convert(self):
+    @staticmethod
+    def _read_stderr(stream, tail):
+        # 只保留最后几行，避免大文件转换时把全部日志缓存在内存中
+        for line in iter(stream.readline, b''):
+            tail.append(line.decode('utf-8', errors='replace').rstrip())
+        stream.close()
+
+    def _report_progress(self, out_time_us, speed, start_time):
+        if not self.duration or out_time_us is None:
+            return
+        position = out_time_us / 1_000_000
+        fraction = min(max(position / self.duration, 0.0), 1.0)
+        remaining = max(self.duration - position, 0.0)
+        if speed:
+            eta = remaining / speed
+        elif position > 0:
+            eta = remaining * (time.monotonic() - start_time) / position
+        else:
+            eta = None
+        self.progress_callback(fraction, eta)
+
+    def _ensure_streams(self):
+        if self.streams is None:
+            # 延迟导入，避免转换器模块在加载时依赖媒体分析
+            from backend.media_analyzer import MediaAnalyzer
+            self.streams = MediaAnalyzer.get_streams(self.input_file)
+        return self.streams
 
+    def _output_args(self, input_index=0):
+        args = []
+        for output_file, target_format in self.outputs:
+            plans = plan_streams(self.streams, target_format)
+            logging.debug(f"流处理方案 {self.input_file} -> {output_file}: {describe_plan(plans)}")
+            args += [*build_output_args(plans, target_format, input_index, self.preset), output_file]
+        return args
+
+    def build_command(self):
+        """
+        根据输入流的编码生成 ffmpeg 命令：目标容器支持的流直接复制，其余流转码，无法保存的流丢弃。
+        多个输出时每个输出使用各自的方案，写在同一条命令中。
+        """
+        self._ensure_streams()
+        # stderr 只输出错误，失败原因（stderr_tail 的最后几行）不会被版本信息和流信息淹没；进度从 -progress 读取
         command = [
             'ffmpeg',
+            '-hide_banner',
+            '-v', 'error',
+            '-y',
+            '-nostats',
+            '-progress', 'pipe:1',
             '-i', self.input_file,
-            '-c:v', 'copy',
-            '-c:a', 'copy',
-            self.output_file
         ]
+        return command + self._output_args()
 
+    @classmethod
+    def _run_ffmpeg(cls, command, trace, stderr_tail, on_progress=None):
+        """
+        启动 ffmpeg 并等待结束，spawn 和 encode 计入 trace，stderr 的最后几行保存在 stderr_tail 中。
+        :param on_progress: 可选，on_progress(out_time_us, speed, start_time)，每解析完一个 -progress 块调用一次
+        :return: 退出码
+        """
         if sys.platform == "win32":
             creationflags = subprocess.CREATE_NO_WINDOW
         else:
             creationflags = 0
 
-        try:
+        with trace.span("spawn"):
             process = subprocess.Popen(
                 command,
+                stdin=subprocess.DEVNULL,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 creationflags=creationflags
             )
-            stdout, stderr = process.communicate()
-            if process.returncode == 0:
-                logging.debug(f"成功 : {self.input_file} -> {self.output_file}")
+        encode_start = time.perf_counter()
+        stderr_thread = threading.Thread(target=cls._read_stderr, args=(process.stderr, stderr_tail), daemon=True)
+        stderr_thread.start()
+
+        # 逐行解析 -progress 输出的 key=value，每个块以 progress=continue/end 结束
+        start_time = time.monotonic()
+        out_time_us = None
+        speed = None
+        for raw_line in iter(process.stdout.readline, b''):
+            key, _, value = raw_line.decode('utf-8', errors='replace').strip().partition('=')
+            if key == 'out_time_us':
+                try:
+                    out_time_us = int(value)
+                except ValueError:
+                    pass
+            elif key == 'speed':
+                try:
+                    speed = float(value.rstrip('x')) or None
+                except ValueError:
+                    speed = None
+            elif key == 'progress' and on_progress is not None:
+                on_progress(out_time_us, speed, start_time)
+        process.stdout.close()
+        returncode = process.wait()
+        stderr_thread.join()
+        trace.add("encode", time.perf_counter() - encode_start)
+        return returncode
+
+    def convert(self):
+        # 批量转换失败后会对同一个转换器重试，清除上一次的结果
+        self.output_errors = {}
+        self.error = None
+
+        with self.trace.span("probe"):
+            command = self.build_command()
+
+        if self.progress_callback is not None and self.duration is None:
+            # 延迟导入，只有需要进度时才依赖媒体分析
+            from backend.media_analyzer import MediaAnalyzer
+            with self.trace.span("probe"):
+                self.duration = MediaAnalyzer.get_duration_seconds(self.input_file)
+
+        try:
+            on_progress = self._report_progress if self.progress_callback is not None else None
+            self.returncode = self._run_ffmpeg(command, self.trace, self.stderr_tail, on_progress)
+            self.trace.set("exit_code", self.returncode)
+
+            if self.returncode == 0:
+                for output_file, _ in self.outputs:
+                    logging.debug(f"成功 : {self.input_file} -> {output_file}")
                 return True
             else:
-                logging.debug(f"失败 : {self.input_file}")
+                # ffmpeg 任一输出出错时整条命令失败，所有输出都视为失败
+                self.error = "\n".join(list(self.stderr_tail)[-5:]) or f"ffmpeg exited with code {self.returncode}"
+                # 成功时 stderr 只有版本和流信息，只在失败时记录
+                self.trace.set("stderr_tail", list(self.stderr_tail))
+                self.output_errors = {output_file: self.error for output_file, _ in self.outputs}
+                logging.debug(f"失败 : {self.input_file}\n" + "\n".join(self.stderr_tail))
                 return False
         except Exception as e:
+            self.error = str(e)
+            self.output_errors = {output_file: self.error for output_file, _ in self.outputs}
             logging.error(f"失败 : {self.input_file} 发生异常: {e}")
             return False
 
+    @classmethod
+    def convert_batch(cls, converters):
+        """
+        用一条 ffmpeg 命令转换多个输入：每个输入一个 -i，各自的输出紧跟在所有输入之后，
+        只启动一次进程，摊薄小文件转换中启动 ffmpeg 和加载编码器的固定开销。不报告进度。
+        ffmpeg 只返回一个退出码，失败时无法知道是哪个输入出错，所有转换器的结果都为 None。
+        :param converters: ConverterVideo 列表
+        :return: 与 converters 顺序一致的结果（见 Converter.convert_batch）；成功时每个转换器的 trace 中
+            记录按输入数平均分摊的 spawn/encode 耗时
+        """
+        undetermined = [None] * len(converters)
+        command = ['ffmpeg', '-hide_banner', '-v', 'error', '-y', '-nostats']
+        output_args = []
+        for input_index, converter in enumerate(converters):
+            with converter.trace.span("probe"):
+                converter._ensure_streams()
+            # 流信息未知时无法为每个输入指定 -map，ffmpeg 会在所有输入中自动选择流
+            if any(plan_streams(converter.streams, target_format) is None for _, target_format in converter.outputs):
+                logging.debug(f"无法批量转换 {converter.input_file}: 未知流信息")
+                return undetermined
+            command += ['-i', converter.input_file]
+            output_args += converter._output_args(input_index)
+
+        trace = JobTrace()
+        stderr_tail = deque(maxlen=cls.STDERR_TAIL_LINES)
+        try:
+            returncode = cls._run_ffmpeg(command + output_args, trace, stderr_tail)
+        except Exception as e:
+            logging.error(f"批量转换 {len(converters)} 个文件时发生异常: {e}")
+            return undetermined
+        if returncode != 0:
+            logging.debug(f"批量转换 {len(converters)} 个文件失败，退出码 {returncode}\n" + "\n".join(stderr_tail))
+            return undetermined
 
+        for converter in converters:
+            converter.returncode = returncode
+            for name, seconds in trace.spans.items():
+                converter.trace.add(name, seconds / len(converters))
+            converter.trace.set("exit_code", returncode)
+            converter.trace.set("batch_size", len(converters))
+            for output_file, _ in converter.outputs:
+                logging.debug(f"成功 : {converter.input_file} -> {output_file}")
+        return [True] * len(converters)
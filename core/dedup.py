@@ -0,0 +1,253 @@
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from config import config
+from core.output_files import commit_output, discard_output, temp_output_path
+
+# 快速指纹读取文件开头和结尾的字节数
+PARTIAL_HASH_BYTES = 64 * 1024
+# 完整指纹的读取块大小
+FULL_HASH_CHUNK = 1024 * 1024
+# Linux 上 ioctl(FICLONE) 的请求码，用于在支持的文件系统（btrfs、xfs 等）上创建写时复制副本
+FICLONE = 0x40049409
+
+
+def partial_fingerprint(file_path: str) -> str:
+    """
+    快速指纹：文件大小 + 开头和结尾各 PARTIAL_HASH_BYTES 字节的哈希。
+    不同的快速指纹一定意味着内容不同，相同时需要再比较完整指纹。
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(file_path, "rb") as f:
+        digest.update(f.read(PARTIAL_HASH_BYTES))
+        if size > PARTIAL_HASH_BYTES * 2:
+            f.seek(-PARTIAL_HASH_BYTES, os.SEEK_END)
+            digest.update(f.read(PARTIAL_HASH_BYTES))
+    return digest.hexdigest()
+
+
+def full_fingerprint(file_path: str) -> str:
+    """
+    完整指纹：整个文件内容的哈希。
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(file_path, "rb") as f:
+        while chunk := f.read(FULL_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def materialize(source: str, destination: str) -> str:
+    """
+    把已有的输出文件复制为新的输出，依次尝试硬链接、写时复制（reflink）和普通复制。
+    先在临时文件上完成，再原子地替换为 destination。
+    :return: 实际使用的方式，"hardlink"、"reflink" 或 "copy"
+    """
+    temp_file = temp_output_path(destination)
+    try:
+        method = _materialize_to(source, temp_file)
+        commit_output(temp_file, destination)
+    except OSError:
+        discard_output(temp_file)
+        raise
+    return method
+
+
+def _materialize_to(source: str, destination: str) -> str:
+    # destination 为尚不存在的临时文件
+    try:
+        os.link(source, destination)
+        return "hardlink"
+    except OSError:
+        pass
+
+    if sys.platform.startswith("linux"):
+        try:
+            import fcntl
+            with open(source, "rb") as src, open(destination, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            shutil.copystat(source, destination)
+            return "reflink"
+        except (OSError, ImportError):
+            discard_output(destination)
+
+    shutil.copyfile(source, destination)
+    return "copy"
+
+
+class ContentIndex:
+    """
+    持久化的内容指纹索引：记录 (完整指纹, 目标格式) 对应的输出文件，
+    不同批次、不同日期出现的相同内容只需转换一次。可在多个线程间共享。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or config.CONTENT_INDEX_PATH
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        # 调用方需持有 self._lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS content ("
+                "full_hash TEXT NOT NULL, target_format TEXT NOT NULL, partial_hash TEXT NOT NULL, "
+                "output_path TEXT NOT NULL, output_size INTEGER NOT NULL, output_mtime_ns INTEGER NOT NULL, "
+                "PRIMARY KEY (full_hash, target_format))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS content_partial ON content (partial_hash, target_format)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def has_partial(self, partial_hash: str, target_format: str) -> bool:
+        """
+        是否记录过快速指纹相同的内容。返回 False 时无需计算完整指纹。
+        """
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    "SELECT 1 FROM content WHERE partial_hash = ? AND target_format = ? LIMIT 1",
+                    (partial_hash, target_format.lower())
+                ).fetchone()
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"读取内容索引失败: {e}")
+                return False
+        return row is not None
+
+    def lookup(self, full_hash: str, target_format: str) -> Optional[str]:
+        """
+        查询该内容此前的输出文件，输出文件已被删除或修改时返回 None。
+        """
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    "SELECT output_path, output_size, output_mtime_ns FROM content WHERE full_hash = ? AND target_format = ?",
+                    (full_hash, target_format.lower())
+                ).fetchone()
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"读取内容索引失败: {e}")
+                return None
+        if row is None:
+            return None
+        output_path, output_size, output_mtime_ns = row
+        try:
+            stat = os.stat(output_path)
+        except OSError:
+            return None
+        if stat.st_size != output_size or stat.st_mtime_ns != output_mtime_ns:
+            return None
+        return output_path
+
+    def store(self, full_hash: str, partial_hash: str, target_format: str, output_file: str):
+        """
+        记录某内容转换为目标格式后的输出文件。
+        """
+        try:
+            stat = os.stat(output_file)
+        except OSError as e:
+            logging.error(f"无法记录内容索引 {output_file}: {e}")
+            return
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO content (full_hash, target_format, partial_hash, output_path, output_size, output_mtime_ns) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (full_hash, target_format.lower(), partial_hash, os.path.abspath(output_file), stat.st_size, stat.st_mtime_ns)
+                )
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"写入内容索引失败: {e}")
+
+    def clear(self):
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM content")
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"清空内容索引失败: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class Deduplicator:
+    """
+    一个批次的去重状态。先用快速指纹分组，只有快速指纹相同时才计算完整指纹；
+    给出 ContentIndex 时还会查询和记录跨批次的结果。
+    """
+
+    def __init__(self, target_format: Union[str, Iterable[str]], index: Optional[ContentIndex] = None):
+        """
+        :param target_format: 目标格式，一次生成多种格式时为格式序列，指纹只计算一次
+        """
+        formats = [target_format] if isinstance(target_format, str) else list(target_format)
+        self.target_formats = tuple(target_format.lower() for target_format in formats)
+        self.target_format = self.target_formats[0]
+        self.index = index
+        self._partial: Dict[str, str] = {}  # 文件路径 -> 快速指纹
+        self._full: Dict[str, str] = {}  # 文件路径 -> 完整指纹
+        self._by_partial: Dict[str, List[str]] = {}  # 快速指纹 -> 本批次中内容互不相同的代表文件
+
+    def _full_hash(self, file_path: str) -> str:
+        full_hash = self._full.get(file_path)
+        if full_hash is None:
+            full_hash = self._full[file_path] = full_fingerprint(file_path)
+        return full_hash
+
+    def check(self, input_file: str) -> Tuple[Optional[str], Union[str, Dict[str, str], None]]:
+        """
+        检查输入文件的内容此前是否出现过。
+        :return: ("batch", 本批次中内容相同的代表文件)、
+            ("stored", {目标格式: 之前批次的输出文件}，只包含找到输出的格式) 或 (None, None)
+        """
+        try:
+            partial_hash = self._partial[input_file] = partial_fingerprint(input_file)
+            representatives = self._by_partial.setdefault(partial_hash, [])
+            if representatives:
+                full_hash = self._full_hash(input_file)
+                for representative in representatives:
+                    if self._full_hash(representative) == full_hash:
+                        return "batch", representative
+            representatives.append(input_file)
+
+            if self.index is not None:
+                stored = {}
+                for target_format in self.target_formats:
+                    if self.index.has_partial(partial_hash, target_format):
+                        output_file = self.index.lookup(self._full_hash(input_file), target_format)
+                        if output_file is not None:
+                            stored[target_format] = output_file
+                if stored:
+                    return "stored", stored
+        except OSError as e:
+            logging.error(f"计算内容指纹失败 {input_file}: {e}")
+        return None, None
+
+    def record(self, input_file: str, output_file: str, target_format: Optional[str] = None):
+        """
+        记录一次成功的转换，供之后的批次复用。
+        :param target_format: 输出的格式，默认为第一个目标格式
+        """
+        if self.index is None or input_file not in self._partial:
+            return
+        try:
+            self.index.store(self._full_hash(input_file), self._partial[input_file], target_format or self.target_format, output_file)
+        except OSError as e:
+            logging.error(f"计算内容指纹失败 {input_file}: {e}")
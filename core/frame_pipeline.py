@@ -0,0 +1,326 @@
+"""
+动画图片的流式帧处理：用 ImageSequence 逐帧解码，逐帧编码写入输出文件，
+内存占用只与单帧大小有关，与帧数无关。
+
+Pillow 自带的 GIF 和 APNG 多帧保存会先把全部帧收集到列表中再写出，
+这里的写入器每次只把一帧交给 Pillow 编码，再把编码结果拼接到输出文件。
+WebP 的多帧保存本身就是逐帧交给编码器的，直接使用 Pillow。
+"""
+import io
+import struct
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageSequence
+
+from core.gif_encoder import FastGifWriter, build_palette, sample_frames, sample_indices
+from core.png_encoder import SIGNATURE, iter_chunks, pack_chunk, save_png
+
+# 解码后每个像素占用的字节数（按 RGBA 估算）
+BYTES_PER_PIXEL = 4
+# 流式处理时同时存在的帧缓冲数量：解码帧、转换后的帧和编码器内部的副本
+STREAM_BUFFER_FRAMES = 3
+# 帧没有时长信息时使用的默认时长（毫秒）
+DEFAULT_FRAME_DURATION = 100
+
+
+class ImageGeometry(NamedTuple):
+    width: int
+    height: int
+    frames: int
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.width * self.height * BYTES_PER_PIXEL
+
+    @property
+    def decoded_bytes(self) -> int:
+        """
+        全部帧解码后占用的内存。
+        """
+        return self.frame_bytes * self.frames
+
+    @property
+    def streaming_bytes(self) -> int:
+        """
+        逐帧处理时的峰值内存。
+        """
+        return self.frame_bytes * STREAM_BUFFER_FRAMES
+
+
+def read_geometry(file_path: str) -> Optional[ImageGeometry]:
+    """
+    只读取文件头获取尺寸和帧数，不解码像素。无法识别时返回 None。
+    """
+    try:
+        with Image.open(file_path) as im:
+            return ImageGeometry(im.width, im.height, getattr(im, "n_frames", 1))
+    except Exception:
+        return None
+
+
+def can_decode_once(geometry: ImageGeometry, output_count: int, memory_budget: int) -> bool:
+    """
+    多个目标格式时，解码后的全部帧能否放进单个任务的内存预算，可以时只解码一次，
+    否则每种格式分别流式解码。
+    """
+    return output_count > 1 and geometry.decoded_bytes + geometry.streaming_bytes <= memory_budget
+
+
+def estimate_peak_memory(geometry: ImageGeometry, output_count: int, memory_budget: int) -> int:
+    """
+    估算图片任务的峰值内存（字节）。
+    """
+    if geometry.frames > 1 and can_decode_once(geometry, output_count, memory_budget):
+        return geometry.decoded_bytes + geometry.streaming_bytes
+    return geometry.streaming_bytes
+
+
+def iter_frames(im: Image.Image) -> Iterator[Tuple[Image.Image, int]]:
+    """
+    逐帧产出 (帧, 时长毫秒)。产出的帧对象会在下一次迭代时被复用，需要保留时调用方应复制。
+    """
+    for frame in ImageSequence.Iterator(im):
+        # 部分格式（如 WebP）在解码当前帧时才写入时长
+        frame.load()
+        yield frame, frame.info.get("duration", im.info.get("duration", DEFAULT_FRAME_DURATION))
+
+
+class GifStreamWriter:
+    """
+    逐帧写入 GIF。每帧单独用 Pillow 保存为单帧 GIF（单独量化），
+    第一帧保留文件头，之后的帧把全局调色板改写为局部调色板后拼接。
+    """
+
+    def __init__(self, fp, loop: Optional[int] = 0, save_options: Optional[Dict] = None):
+        """
+        :param loop: 循环次数，0 为无限循环，None 为只播放一次
+        :param save_options: 每帧保存时传给 Pillow 的额外参数（如 optimize）
+        """
+        self.fp = fp
+        self.loop = loop
+        self.save_options = save_options or {}
+        self.frame_count = 0
+
+    @staticmethod
+    def _frame_block(data: bytes) -> bytes:
+        """
+        从单帧 GIF 中取出图形控制扩展和图像数据，把文件的全局调色板改写为该帧的局部调色板。
+        """
+        flags = data[10]
+        table_end = 13 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+        color_table = data[13:table_end]
+        blocks = []
+        position = table_end
+        # 保留图形控制扩展（时长、透明色、处置方式），跳过循环次数、注释等文件级扩展
+        while data[position] == 0x21:
+            start = position
+            position += 2
+            while data[position]:
+                position += data[position] + 1
+            position += 1
+            if data[start + 1] == 0xF9:
+                blocks.append(data[start:position])
+        # 图像描述符共 10 字节，最后一个字节是标志位
+        packed = data[position + 9]
+        if color_table and not packed & 0x80:
+            blocks.append(data[position:position + 9] + bytes([packed | 0x80 | (flags & 7)]) + color_table)
+        else:
+            blocks.append(data[position:position + 10])
+        # 去掉文件结尾的 ';'
+        blocks.append(data[position + 10:-1])
+        return b"".join(blocks)
+
+    def add(self, frame: Image.Image, duration: int):
+        has_alpha = frame.mode in ("RGBA", "LA", "PA") or "transparency" in frame.info
+        params = {
+            "duration": duration,
+            # 输出的是完整帧，有透明区域时需要在下一帧前清除，避免透出上一帧
+            "disposal": 2 if has_alpha else 1,
+        }
+        if self.frame_count == 0 and self.loop is not None:
+            params["loop"] = self.loop
+        buffer = io.BytesIO()
+        frame.save(buffer, "GIF", **self.save_options, **params)
+        data = buffer.getvalue()
+        if self.frame_count == 0:
+            # 第一帧使用完整的文件头，文件结尾的 ';' 在 close 时统一写入
+            self.fp.write(data[:-1])
+        else:
+            self.fp.write(self._frame_block(data))
+        self.frame_count += 1
+
+    def close(self):
+        self.fp.write(b";")
+
+
+class ApngStreamWriter:
+    """
+    逐帧写入 APNG。每帧单独编码为 PNG（png_encoder.save_png），取出其中的 IDAT 数据，
+    第一帧作为 IDAT 写入，之后的帧改写为 fdAT。
+    之后的帧只编码与上一帧不同的矩形区域，只保留上一帧一份副本。
+    """
+
+    def __init__(self, fp, mode: str, frame_count: int, loop: Optional[int] = 0, save_options: Optional[Dict] = None,
+                 png_engine: str = "pillow"):
+        """
+        :param mode: 所有帧统一转换到的模式，"RGBA" 或 "RGB"
+        :param frame_count: 预计帧数，写入 acTL，结束时按实际帧数修正
+        :param loop: 循环次数，0 为无限循环，None 为只播放一次
+        :param save_options: 每帧编码为 PNG 时传给 save_png 的参数（如 compress_level）
+        :param png_engine: 已解析的 PNG 引擎（png_encoder.resolve_engine 的结果）
+        """
+        self.fp = fp
+        self.save_options = save_options or {}
+        self.png_engine = png_engine
+        self.mode = mode
+        self.expected_frames = frame_count
+        self.num_plays = 1 if loop is None else loop
+        self.frame_count = 0
+        self.sequence = 0
+        self._actl_offset = None
+        self._previous = None
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes):
+        self.fp.write(pack_chunk(chunk_type, data))
+
+    def add(self, frame: Image.Image, duration: int):
+        if frame.mode != self.mode:
+            frame = frame.convert(self.mode)
+        else:
+            frame = frame.copy()
+        region = frame
+        bbox = (0, 0) + frame.size
+        if self._previous is not None:
+            bbox = ImageChops.difference(frame, self._previous).getbbox(alpha_only=False)
+            if bbox is None:
+                # 与上一帧相同，只需要延长上一帧的时长，但 fcTL 已经写出，这里用 1x1 的区域代替
+                bbox = (0, 0, 1, 1)
+            region = frame.crop(bbox)
+        self._previous = frame
+        buffer = io.BytesIO()
+        save_png(region, buffer, self.png_engine, **self.save_options)
+        chunks = list(iter_chunks(buffer.getvalue()))
+
+        if self.frame_count == 0:
+            self.fp.write(SIGNATURE)
+            for chunk_type, data in chunks:
+                if chunk_type == b"IDAT":
+                    break
+                if chunk_type == b"IHDR":
+                    self._write_chunk(chunk_type, data)
+                    self._actl_offset = self.fp.tell()
+                    self._write_chunk(b"acTL", struct.pack(">II", self.expected_frames, self.num_plays))
+                elif chunk_type != b"IEND":
+                    self._write_chunk(chunk_type, data)
+
+        self._write_chunk(b"fcTL", struct.pack(
+            ">IIIIIHHBB", self.sequence, region.width, region.height, bbox[0], bbox[1],
+            min(int(duration), 0xFFFF), 1000, 0, 0))
+        self.sequence += 1
+        for chunk_type, data in chunks:
+            if chunk_type != b"IDAT":
+                continue
+            if self.frame_count == 0:
+                self._write_chunk(b"IDAT", data)
+            else:
+                self._write_chunk(b"fdAT", struct.pack(">I", self.sequence) + data)
+                self.sequence += 1
+        self.frame_count += 1
+
+    def close(self):
+        self._write_chunk(b"IEND", b"")
+        if self.frame_count != self.expected_frames and self._actl_offset is not None:
+            end = self.fp.tell()
+            self.fp.seek(self._actl_offset)
+            self._write_chunk(b"acTL", struct.pack(">II", self.frame_count, self.num_plays))
+            self.fp.seek(end)
+
+
+def _has_alpha(im: Image.Image) -> bool:
+    return im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info
+
+
+def write_frames(frames: Iterable[Tuple[Image.Image, int]], output_file: str, target_format: str,
+                 frame_count: int, loop: Optional[int] = 0, has_alpha: bool = True,
+                 gif_engine: str = "pillow", palette_frames: Optional[List[Image.Image]] = None,
+                 save_options: Optional[Dict] = None, png_engine: str = "pillow"):
+    """
+    把 (帧, 时长) 序列逐帧写入 GIF 或 APNG 文件。
+    :param gif_engine: GIF 使用的写入器，"fast" 时需要 palette_frames 计算全局调色板，其他值使用 GifStreamWriter
+    :param palette_frames: 用于计算全局调色板的抽样帧
+    :param save_options: 编码参数（EncoderPreset.pillow_options 的结果），GIF 的 fast 引擎自行编码，不使用
+    :param png_engine: APNG 每帧使用的 PNG 引擎（png_encoder.resolve_engine 的结果）
+    """
+    target_format = target_format.lower()
+    with open(output_file, "wb") as fp:
+        if target_format == "gif" and gif_engine == "fast":
+            writer = None
+        elif target_format == "gif":
+            writer = GifStreamWriter(fp, loop, save_options)
+        elif target_format == "png":
+            writer = ApngStreamWriter(fp, "RGBA" if has_alpha else "RGB", frame_count, loop, save_options, png_engine)
+        else:
+            raise ValueError(f"不支持流式写入的格式: {target_format}")
+        for frame, duration in frames:
+            if writer is None:
+                writer = FastGifWriter(fp, build_palette(palette_frames or [frame]), frame.size, loop)
+            writer.add(frame, duration)
+        if writer is not None:
+            writer.close()
+
+
+STREAMING_FORMATS = ("gif", "png")
+
+
+def save_streaming(im: Image.Image, output_file: str, target_format: str, gif_engine: str = "pillow",
+                   save_options: Optional[Dict] = None, png_engine: str = "pillow"):
+    """
+    从已打开的源图片逐帧解码、逐帧编码保存。单帧 PNG 使用 png_encoder 保存，其余单帧图片和 WebP 等格式直接使用 Pillow 保存。
+    :param gif_engine: 已解析的 GIF 引擎（gif_encoder.resolve_engine 的结果），"fast" 时先抽样若干帧计算全局调色板
+    :param save_options: 编码参数（EncoderPreset.pillow_options 的结果）
+    :param png_engine: 已解析的 PNG 引擎（png_encoder.resolve_engine 的结果）
+    """
+    target_format = target_format.lower()
+    save_options = save_options or {}
+    frame_count = getattr(im, "n_frames", 1)
+    if frame_count <= 1 and target_format == "png":
+        save_png(im, output_file, png_engine, **save_options)
+        return
+    if frame_count <= 1 or target_format not in STREAMING_FORMATS:
+        im.save(output_file, target_format, save_all=True, **save_options)
+        return
+    palette_frames = sample_frames(im) if target_format == "gif" and gif_engine == "fast" else None
+    write_frames(iter_frames(im), output_file, target_format, frame_count, im.info.get("loop"), _has_alpha(im),
+                 gif_engine, palette_frames, save_options, png_engine)
+
+
+def decode_frames(im: Image.Image) -> Tuple[list, list]:
+    """
+    解码并复制全部帧，返回 (帧列表, 时长列表)。只应在 can_decode_once 为 True 时使用。
+    """
+    frames = []
+    durations = []
+    for frame, duration in iter_frames(im):
+        frames.append(frame.copy())
+        durations.append(duration)
+    return frames, durations
+
+
+def save_decoded(frames: list, durations: list, output_file: str, target_format: str,
+                 loop: Optional[int] = 0, has_alpha: bool = True, gif_engine: str = "pillow",
+                 save_options: Optional[Dict] = None, png_engine: str = "pillow"):
+    """
+    把已解码的帧保存为目标格式。
+    :param save_options: 编码参数（EncoderPreset.pillow_options 的结果）
+    :param png_engine: APNG 每帧使用的 PNG 引擎（png_encoder.resolve_engine 的结果）
+    """
+    target_format = target_format.lower()
+    if target_format in STREAMING_FORMATS:
+        palette_frames = [frames[index] for index in sample_indices(len(frames))]
+        write_frames(zip(frames, durations), output_file, target_format, len(frames), loop, has_alpha,
+                     gif_engine, palette_frames, save_options, png_engine)
+        return
+    options = {**(save_options or {}), "save_all": True, "append_images": frames[1:], "duration": durations}
+    if loop is not None:
+        options["loop"] = loop
+    frames[0].save(output_file, target_format, **options)
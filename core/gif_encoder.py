@@ -0,0 +1,316 @@
+"""
+快速 GIF 编码。
+
+"fast" 引擎：从抽样帧计算一个全局调色板，用查找表把每帧像素映射到调色板（NumPy 向量化），
+之后的帧只写出与屏幕上当前内容不同的矩形，矩形内未变化的像素写成透明色以便压缩，
+并延迟一帧写出，以便在需要清除透明区域时回填上一帧的处置方式，相同的帧直接合并时长。
+
+"ffmpeg" 引擎：把整个转换交给 ffmpeg 的 palettegen/paletteuse 滤镜。
+
+"pillow" 引擎：frame_pipeline.GifStreamWriter，每帧单独量化。
+"""
+import io
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import sys
+from typing import List, Optional
+
+from PIL import Image
+
+from utils.optional import optional_import
+
+# NumPy 是可选依赖，由 _load_numpy() 在第一次需要时导入，未安装时不使用 fast 引擎
+np = None
+
+GIF_ENGINES = ("auto", "fast", "ffmpeg", "pillow")
+# 用于计算全局调色板的最多抽样帧数和抽样像素数
+PALETTE_SAMPLE_FRAMES = 16
+PALETTE_SAMPLE_PIXELS = 256 * 1024
+# 调色板最后一个位置保留为透明色
+TRANSPARENT_INDEX = 255
+# 透明度低于此值的像素视为完全透明
+ALPHA_THRESHOLD = 128
+# 查找表每个通道的位数，6 位时表大小为 2^18
+LUT_BITS = 6
+# ffmpeg 可以解码为多帧的输入，动画 WebP 不在其中
+FFMPEG_DECODABLE_EXTENSIONS = (".gif", ".png", ".jpg", ".jpeg", ".bmp")
+
+
+def _load_numpy():
+    global np
+    np = optional_import("numpy")
+    return np
+
+
+def resolve_engine(engine: str, input_file: str) -> str:
+    """
+    把 "auto" 解析为实际使用的引擎：有 NumPy 时用 fast，否则在 ffmpeg 可用且能解码输入时用 ffmpeg，都不满足时用 pillow。
+    明确指定的引擎在条件不满足时同样退回 pillow。
+    """
+    ffmpeg_usable = (shutil.which("ffmpeg") is not None
+                     and os.path.splitext(input_file)[1].lower() in FFMPEG_DECODABLE_EXTENSIONS)
+    if engine == "auto":
+        if _load_numpy() is not None:
+            return "fast"
+        return "ffmpeg" if ffmpeg_usable else "pillow"
+    if engine == "fast" and _load_numpy() is None:
+        return "pillow"
+    if engine == "ffmpeg" and not ffmpeg_usable:
+        return "pillow"
+    return engine
+
+
+def build_palette(frames: List[Image.Image]) -> List[int]:
+    """
+    从抽样帧的不透明像素计算 255 色的全局调色板，返回 768 个整数（第 256 个颜色为透明色占位）。
+    """
+    _load_numpy()
+    samples = []
+    per_frame = max(1, PALETTE_SAMPLE_PIXELS // max(1, len(frames)))
+    for frame in frames:
+        rgba = np.asarray(frame.convert("RGBA")).reshape(-1, 4)
+        opaque = rgba[rgba[:, 3] >= ALPHA_THRESHOLD, :3]
+        if len(opaque) > per_frame:
+            opaque = opaque[np.linspace(0, len(opaque) - 1, per_frame).astype(np.intp)]
+        samples.append(opaque)
+    pixels = np.concatenate(samples) if samples else np.zeros((0, 3), np.uint8)
+    if len(pixels) == 0:
+        pixels = np.zeros((1, 3), np.uint8)
+    sample_image = Image.fromarray(np.ascontiguousarray(pixels.reshape(1, -1, 3)), "RGB")
+    quantized = sample_image.quantize(colors=TRANSPARENT_INDEX, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    palette = quantized.getpalette()[:TRANSPARENT_INDEX * 3]
+    palette += [0] * (768 - len(palette))
+    return palette
+
+
+class PaletteMapper:
+    """
+    把 RGB 像素映射到全局调色板中最接近的颜色。
+    查找表以每通道 LUT_BITS 位的颜色为键，只在第一次遇到某个颜色时计算最近的调色板颜色，
+    动画中颜色通常有限，大部分帧只需要一次向量化的查表。
+    """
+
+    def __init__(self, palette: List[int]):
+        self.colors = np.asarray(palette, np.int32).reshape(256, 3)[:TRANSPARENT_INDEX]
+        self.lut = np.full(1 << (3 * LUT_BITS), -1, np.int16)
+
+    def _fill(self, keys):
+        shift = 8 - LUT_BITS
+        mask = (1 << LUT_BITS) - 1
+        # 取每个区间的中心作为代表颜色
+        centers = np.stack([(keys >> (2 * LUT_BITS)) & mask, (keys >> LUT_BITS) & mask, keys & mask], axis=1)
+        centers = (centers.astype(np.int32) << shift) + (1 << (shift - 1))
+        # 分块计算，避免生成过大的距离矩阵
+        chunk = 4096
+        for start in range(0, len(keys), chunk):
+            block = centers[start:start + chunk]
+            distances = ((block[:, None, :] - self.colors[None, :, :]) ** 2).sum(axis=2)
+            self.lut[keys[start:start + chunk]] = distances.argmin(axis=1)
+
+    def map(self, rgba):
+        """
+        :param rgba: H x W x 4 的 uint8 数组
+        :return: H x W 的调色板下标，透明像素为 TRANSPARENT_INDEX
+        """
+        shift = 8 - LUT_BITS
+        mask = (1 << LUT_BITS) - 1
+        # 按 RGBA 字节顺序把每个像素看作一个 32 位整数，一次移位得到各通道的高位
+        pixels = np.ascontiguousarray(rgba).view("<u4")[..., 0]
+        key = (((pixels >> shift) & mask) << (2 * LUT_BITS)
+               | ((pixels >> (8 + shift)) & mask) << LUT_BITS
+               | ((pixels >> (16 + shift)) & mask)).astype(np.intp)
+        indices = self.lut[key]
+        missing = indices < 0
+        if missing.any():
+            self._fill(np.unique(key[missing]))
+            indices = self.lut[key]
+        indices = indices.astype(np.uint8)
+        indices[rgba[..., 3] < ALPHA_THRESHOLD] = TRANSPARENT_INDEX
+        return indices
+
+
+def _lzw_data(indices) -> bytes:
+    """
+    用 Pillow 对调色板下标做 LZW 编码，返回从最小码长到块结束符的图像数据。
+    """
+    height, width = indices.shape
+    image = Image.frombytes("P", (width, height), indices.tobytes())
+    image.putpalette([value for i in range(256) for value in (i, i, i)])
+    buffer = io.BytesIO()
+    # optimize=False 保证 Pillow 不会重新排列调色板下标；
+    # Pillow 默认对不小于 16 像素的图片隔行编码，而 FastGifWriter 写出的图像描述符标记为非隔行
+    image.save(buffer, "GIF", optimize=False, interlace=False)
+    data = buffer.getvalue()
+    flags = data[10]
+    position = 13 + (3 << ((flags & 7) + 1) if flags & 0x80 else 0)
+    while data[position] == 0x21:
+        position += 2
+        while data[position]:
+            position += data[position] + 1
+        position += 1
+    packed = data[position + 9]
+    position += 10
+    if packed & 0x80:
+        position += 3 << ((packed & 7) + 1)
+    return data[position:-1]
+
+
+class FastGifWriter:
+    """
+    使用全局调色板和差异矩形逐帧写入 GIF。需要 NumPy。
+    """
+
+    def __init__(self, fp, palette: List[int], size, loop: Optional[int] = 0):
+        _load_numpy()
+        self.fp = fp
+        self.palette = palette
+        self.mapper = PaletteMapper(palette)
+        self.width, self.height = size
+        self.loop = loop
+        self.frame_count = 0
+        # 屏幕上当前显示的内容（调色板下标），初始为透明
+        self.canvas = np.full((self.height, self.width), TRANSPARENT_INDEX, np.uint8)
+        # 尚未写出的上一帧: [矩形 (x0, y0, x1, y1), 下标数据, 时长毫秒, 处置方式]
+        self._pending = None
+        # 上一个输入帧的像素和量化结果，只有变化的区域需要重新量化
+        self._previous_rgba = None
+        self._previous_indices = None
+        self._write_header()
+
+    def _write_header(self):
+        self.fp.write(b"GIF89a" + struct.pack("<HH", self.width, self.height)
+                      + bytes([0xF7, TRANSPARENT_INDEX, 0]) + bytes(self.palette))
+        if self.loop is not None:
+            self.fp.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", self.loop) + b"\x00")
+
+    def _quantize(self, frame: Image.Image):
+        rgba = np.ascontiguousarray(np.asarray(frame.convert("RGBA")))
+        pixels = rgba.view("<u4")[..., 0]
+        if self._previous_rgba is None or self._previous_rgba.shape != pixels.shape:
+            indices = self.mapper.map(rgba)
+        else:
+            bbox = self._bbox(pixels != self._previous_rgba)
+            indices = self._previous_indices.copy()
+            if bbox is not None:
+                x0, y0, x1, y1 = bbox
+                indices[y0:y1, x0:x1] = self.mapper.map(rgba[y0:y1, x0:x1])
+        self._previous_rgba = pixels
+        self._previous_indices = indices
+        return indices
+
+    @staticmethod
+    def _bbox(mask):
+        rows = np.flatnonzero(mask.any(axis=1))
+        if len(rows) == 0:
+            return None
+        columns = np.flatnonzero(mask.any(axis=0))
+        return int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1
+
+    def _flush(self):
+        if self._pending is None:
+            return
+        (x0, y0, x1, y1), data, duration, disposal = self._pending
+        delay = max(0, min(int(round(duration / 10)), 0xFFFF))
+        self.fp.write(b"!\xf9\x04" + bytes([(disposal << 2) | 1]) + struct.pack("<H", delay)
+                      + bytes([TRANSPARENT_INDEX, 0]))
+        self.fp.write(b"," + struct.pack("<HHHH", x0, y0, x1 - x0, y1 - y0) + b"\x00")
+        self.fp.write(_lzw_data(np.ascontiguousarray(data)))
+        self._pending = None
+
+    def add(self, frame: Image.Image, duration: int):
+        indices = self._quantize(frame)
+        if self._pending is None and self.frame_count == 0:
+            self._pending = [(0, 0, self.width, self.height), indices, duration, 1]
+            self.canvas = indices.copy()
+            self.frame_count += 1
+            return
+
+        # 新帧中透明、但屏幕上不透明的像素无法靠叠加清除，需要让上一帧在显示后恢复为背景（处置方式 2）
+        to_clear = self._bbox((indices == TRANSPARENT_INDEX) & (self.canvas != TRANSPARENT_INDEX))
+        if to_clear is not None:
+            (x0, y0, x1, y1) = self._pending[0]
+            cx0, cy0, cx1, cy1 = to_clear
+            if not (cx0 >= x0 and cy0 >= y0 and cx1 <= x1 and cy1 <= y1):
+                # 清除范围超出上一帧的矩形：把上一帧扩大为两者的并集，内容取自上一帧显示后的屏幕
+                x0, y0, x1, y1 = min(x0, cx0), min(y0, cy0), max(x1, cx1), max(y1, cy1)
+                self._pending[0] = (x0, y0, x1, y1)
+                self._pending[1] = self.canvas[y0:y1, x0:x1]
+            self._pending[3] = 2
+            self.canvas = self.canvas.copy()
+            self.canvas[y0:y1, x0:x1] = TRANSPARENT_INDEX
+
+        changed = indices != self.canvas
+        bbox = self._bbox(changed)
+        if bbox is None:
+            # 与屏幕内容相同，合并到上一帧的时长中
+            if self._pending[3] == 1:
+                self._pending[2] += duration
+                self.frame_count += 1
+                return
+            # 上一帧显示后会被清除，仍需写出一帧（1x1 的透明像素）占住这段时长
+            bbox = (0, 0, 1, 1)
+
+        self._flush()
+        x0, y0, x1, y1 = bbox
+        region = indices[y0:y1, x0:x1].copy()
+        # 矩形内没有变化的像素写成透明，露出下面相同的内容，压缩效果更好
+        region[~changed[y0:y1, x0:x1]] = TRANSPARENT_INDEX
+        self._pending = [bbox, region, duration, 1]
+        self.canvas = indices.copy()
+        self.frame_count += 1
+
+    def close(self):
+        self._flush()
+        self.fp.write(b";")
+
+
+def sample_indices(frame_count: int, count: int = PALETTE_SAMPLE_FRAMES) -> List[int]:
+    """
+    :return: 在 [0, frame_count) 中均匀分布的最多 count 个帧序号，包含第一帧和最后一帧
+    """
+    if frame_count <= count:
+        return list(range(frame_count))
+    if count <= 1:
+        return [0]
+    return sorted({round(i * (frame_count - 1) / (count - 1)) for i in range(count)})
+
+
+def sample_frames(im: Image.Image, count: int = PALETTE_SAMPLE_FRAMES) -> List[Image.Image]:
+    """
+    从已打开的源图片中均匀抽取最多 count 帧（复制），用于计算全局调色板。
+    """
+    frames = []
+    for index in sample_indices(getattr(im, "n_frames", 1), count):
+        im.seek(index)
+        frames.append(im.convert("RGBA"))
+    im.seek(0)
+    return frames
+
+
+def encode_with_ffmpeg(input_file: str, output_file: str, loop: Optional[int] = 0) -> Optional[str]:
+    """
+    使用 ffmpeg 的 palettegen/paletteuse 生成 GIF。
+    :return: 失败原因，成功时为 None
+    """
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', input_file,
+        '-filter_complex',
+        '[0:v]split[a][b];[a]palettegen=reserve_transparent=1:stats_mode=full[p];'
+        '[b][p]paletteuse=dither=bayer:bayer_scale=5:diff_mode=rectangle:alpha_threshold=128',
+        '-loop', str(-1 if loop is None else loop),
+        '-f', 'gif', output_file,
+    ]
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    try:
+        result = subprocess.run(command, stdin=subprocess.DEVNULL, capture_output=True, creationflags=creationflags)
+    except OSError as e:
+        return str(e)
+    if result.returncode != 0:
+        error = result.stderr.decode('utf-8', errors='replace').strip()
+        logging.debug(f"ffmpeg 生成 GIF 失败 {input_file}: {error}")
+        return error or f"ffmpeg exited with code {result.returncode}"
+    return None
@@ -0,0 +1,139 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import config
+
+
+class JobJournal:
+    """
+    持久化的转换任务记录。每完成一个转换就记录输入文件指纹（大小、mtime_ns）、目标格式和输出路径，
+    重新运行同一批任务时，输入未变且输出仍然完好的文件可以直接跳过。
+    可在多个线程间共享。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        参数:
+            db_path: SQLite 数据库路径，为 None 时使用配置中的默认路径。
+        """
+        self.db_path = db_path or config.JOB_JOURNAL_PATH
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        # 调用方需持有 self._lock
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "input_path TEXT NOT NULL, target_format TEXT NOT NULL, output_folder TEXT NOT NULL, "
+                "input_size INTEGER NOT NULL, input_mtime_ns INTEGER NOT NULL, "
+                "output_path TEXT NOT NULL, output_size INTEGER NOT NULL, output_mtime_ns INTEGER NOT NULL, "
+                "finished_at REAL NOT NULL, "
+                "PRIMARY KEY (input_path, target_format, output_folder))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _key(input_file, target_format, output_folder):
+        return os.path.abspath(input_file), target_format.lower(), os.path.abspath(output_folder)
+
+    def lookup(self, input_file: str, target_format: str, output_folder: str) -> Optional[str]:
+        """
+        查询已完成且仍然有效的转换：输入文件未被修改，输出文件仍存在且未被改动。
+        :return: 有效时返回输出文件路径，否则返回 None
+        """
+        try:
+            input_stat = os.stat(input_file)
+        except OSError:
+            return None
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    "SELECT input_size, input_mtime_ns, output_path, output_size, output_mtime_ns FROM jobs "
+                    "WHERE input_path = ? AND target_format = ? AND output_folder = ?",
+                    self._key(input_file, target_format, output_folder)
+                ).fetchone()
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"读取任务记录失败: {e}")
+                return None
+        if row is None:
+            return None
+        input_size, input_mtime_ns, output_path, output_size, output_mtime_ns = row
+        if input_stat.st_size != input_size or input_stat.st_mtime_ns != input_mtime_ns:
+            return None
+        try:
+            output_stat = os.stat(output_path)
+        except OSError:
+            return None
+        if output_stat.st_size != output_size or output_stat.st_mtime_ns != output_mtime_ns:
+            return None
+        return output_path
+
+    def recorded_output(self, input_file: str, target_format: str, output_folder: str) -> Optional[str]:
+        """
+        查询此前为该输入记录的输出路径，不检查是否仍然有效。
+        输入文件被修改后重新转换时，可以覆盖这个路径而不是再生成一个带编号的新文件。
+        """
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    "SELECT output_path FROM jobs WHERE input_path = ? AND target_format = ? AND output_folder = ?",
+                    self._key(input_file, target_format, output_folder)
+                ).fetchone()
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"读取任务记录失败: {e}")
+                return None
+        return row[0] if row else None
+
+    def record(self, input_file: str, target_format: str, output_folder: str, output_file: str):
+        """
+        记录一个已成功完成的转换。
+        """
+        try:
+            input_stat = os.stat(input_file)
+            output_stat = os.stat(output_file)
+        except OSError as e:
+            logging.error(f"无法记录任务 {input_file}: {e}")
+            return
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs (input_path, target_format, output_folder, input_size, input_mtime_ns, "
+                    "output_path, output_size, output_mtime_ns, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._key(input_file, target_format, output_folder) + (
+                        input_stat.st_size, input_stat.st_mtime_ns,
+                        os.path.abspath(output_file), output_stat.st_size, output_stat.st_mtime_ns, time.time()
+                    )
+                )
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"写入任务记录失败: {e}")
+
+    def clear(self):
+        """
+        清空全部任务记录。
+        """
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("DELETE FROM jobs")
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"清空任务记录失败: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
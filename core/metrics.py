@@ -0,0 +1,219 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import config
+
+# 任务的各个阶段（span）：
+# probe: 读取输入的格式信息（图片文件头、视频流列表）
+# queue_wait: 从提交到执行器到开始执行
+# decode: 多个目标格式共用一次解码时，解码全部帧
+# spawn: 启动 ffmpeg 子进程
+# encode: 编码并写出输出文件（Pillow 和 ffmpeg 都边编码边写入，无法分开计时）
+# write: 把写完的临时文件重命名为输出文件，或内容去重时通过链接或复制得到输出文件
+# total: 从开始执行到结束（不包括 queue_wait）
+SPAN_NAMES = ("probe", "queue_wait", "decode", "spawn", "encode", "write", "total")
+
+
+class JobTrace:
+    """
+    单个任务的计时和属性。转换器在工作线程或工作进程中填写，to_dict() 的结果可以被序列化后返回给 App。
+    同名的 span 多次出现时时间累加（例如多个目标格式分别编码）。
+    """
+
+    def __init__(self):
+        self.spans: Dict[str, float] = {}
+        self.attributes: Dict[str, object] = {}
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict:
+        return {"spans": dict(self.spans), **self.attributes}
+
+
+class Histogram:
+    """
+    按对数分桶的耗时直方图，桶边界从 1 毫秒开始每次翻倍。内存占用固定，分位数为所在桶的上界估计。
+    """
+    BOUNDS = tuple(0.001 * 2 ** i for i in range(24))  # 1ms ~ 约 2.3 小时
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                bound = self.BOUNDS[index] if index < len(self.BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+        }
+
+
+class MetricsSink:
+    """
+    指标输出的扩展点。record 为 App 为每个输出生成的字典，字段见 App._metrics_record。
+    可能从任意线程调用，实现需要自行保证线程安全。
+    """
+
+    def emit(self, record: Dict):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink(MetricsSink):
+    """
+    每条记录写成一行 JSON，追加到文件末尾。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def emit(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class AggregateSink(MetricsSink):
+    """
+    在进程内按 (源格式, 目标格式) 汇总：每个 span 一个直方图，以及各状态的数量和输入输出字节数。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups: Dict[Tuple[str, str], Dict] = {}
+
+    def emit(self, record: Dict):
+        key = (record.get("source_format") or "?", record.get("target_format") or "?")
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = {"statuses": {}, "bytes_in": 0, "bytes_out": 0, "spans": {}}
+            status = record.get("status")
+            group["statuses"][status] = group["statuses"].get(status, 0) + 1
+            group["bytes_in"] += record.get("bytes_in") or 0
+            group["bytes_out"] += record.get("bytes_out") or 0
+            for name, seconds in (record.get("spans") or {}).items():
+                histogram = group["spans"].get(name)
+                if histogram is None:
+                    histogram = group["spans"][name] = Histogram()
+                histogram.observe(seconds)
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        :return: "源格式->目标格式" -> {statuses, bytes_in, bytes_out, spans: {span: 直方图摘要}}
+        """
+        with self._lock:
+            return {
+                f"{source}->{target}": {
+                    "statuses": dict(group["statuses"]),
+                    "bytes_in": group["bytes_in"],
+                    "bytes_out": group["bytes_out"],
+                    "spans": {name: histogram.summary() for name, histogram in group["spans"].items()},
+                }
+                for (source, target), group in sorted(self._groups.items())
+            }
+
+    def format_summary(self) -> str:
+        """
+        生成便于阅读的汇总表格，每个格式组合每个 span 一行。
+        """
+        lines = []
+        for pair, group in self.summary().items():
+            statuses = ", ".join(f"{status} {count}" for status, count in group["statuses"].items())
+            lines.append(f"{pair}: {statuses}, 输入 {group['bytes_in']} 字节, 输出 {group['bytes_out']} 字节")
+            for name in SPAN_NAMES:
+                span = group["spans"].get(name)
+                if span is None:
+                    continue
+                lines.append(f"    {name:<10} n={span['count']:<6} mean={span['mean']:.3f}s "
+                             f"p50={span['p50']:.3f}s p95={span['p95']:.3f}s max={span['max']:.3f}s")
+        return "\n".join(lines)
+
+
+class Metrics:
+    """
+    把记录分发给所有 sink。某个 sink 出错时只记录日志，不影响转换。
+    """
+
+    def __init__(self, sinks: Iterable[MetricsSink] = ()):
+        self.sinks: List[MetricsSink] = list(sinks)
+
+    def add_sink(self, sink: MetricsSink):
+        self.sinks.append(sink)
+
+    def emit(self, record: Dict):
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                logging.error(f"写入指标失败 {type(sink).__name__}: {e}")
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def default_metrics() -> Optional[Metrics]:
+    """
+    根据配置创建指标输出：设置了 METRICS_LOG_PATH 时写入 JSON 行文件，否则不收集。
+    """
+    if not config.METRICS_LOG_PATH:
+        return None
+    return Metrics([JsonLinesSink(config.METRICS_LOG_PATH)])
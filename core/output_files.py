@@ -0,0 +1,96 @@
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+
+class OutputAllocator:
+    """
+    为一批转换分配输出文件名，可在多个线程间共享。
+    每个文件夹第一次分配时列出一次目录内容，之后只在内存中查重：同一批次中同名的输入
+    （a/x.png 与 b/x.png）不会得到相同的输出文件，编号冲突时也不需要逐个 stat。
+    批次之外的程序同时在输出文件夹中创建的同名文件不在保护范围内。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._taken: Dict[str, Set[str]] = {}  # 文件夹 -> 已存在或已分配的文件名（normcase）
+        self._reserved: Set[Tuple[str, str]] = set()  # 本批次已分配的 (文件夹, 文件名)
+        self._counters: Dict[Tuple[str, str], int] = {}  # (文件夹, 文件名) -> 下一个尝试的编号
+
+    def _names(self, folder: str) -> Set[str]:
+        # 调用方需持有 self._lock
+        names = self._taken.get(folder)
+        if names is None:
+            try:
+                names = {os.path.normcase(name) for name in os.listdir(folder)}
+            except OSError:
+                names = set()
+            self._taken[folder] = names
+        return names
+
+    @staticmethod
+    def _split(output_path: str) -> Tuple[str, str]:
+        folder, name = os.path.split(os.path.abspath(output_path))
+        return folder, name
+
+    def reserve_unique(self, output_path: str) -> str:
+        """
+        分配一个不与已有文件和本批次已分配文件重名的路径，重名时依次尝试 name_1.ext、name_2.ext ...
+        :return: 分配到的路径（正斜杠）
+        """
+        folder, name = self._split(output_path)
+        base, extension = os.path.splitext(name)
+        key = (folder, os.path.normcase(name))
+        with self._lock:
+            names = self._names(folder)
+            counter = self._counters.get(key, 0)
+            candidate = name if counter == 0 else f"{base}_{counter}{extension}"
+            while os.path.normcase(candidate) in names:
+                counter += 1
+                candidate = f"{base}_{counter}{extension}"
+            names.add(os.path.normcase(candidate))
+            self._reserved.add((folder, os.path.normcase(candidate)))
+            self._counters[key] = counter + 1
+        return Path(os.path.join(os.path.dirname(output_path), candidate)).as_posix()
+
+    def reserve(self, output_path: str) -> bool:
+        """
+        分配指定的路径，用于覆盖已有的旧输出（续传或 skip_newer）。
+        :return: 本批次中没有其他任务分配过此路径时返回 True
+        """
+        folder, name = self._split(output_path)
+        key = (folder, os.path.normcase(name))
+        with self._lock:
+            if key in self._reserved:
+                return False
+            self._reserved.add(key)
+            self._names(folder).add(key[1])
+        return True
+
+
+def temp_output_path(output_file: str) -> str:
+    """
+    输出文件在同一文件夹中的临时文件路径。保留原扩展名，ffmpeg 根据扩展名选择容器。
+    """
+    folder, name = os.path.split(output_file)
+    base, extension = os.path.splitext(name)
+    return os.path.join(folder, f".{base}.{uuid.uuid4().hex[:8]}.part{extension}")
+
+
+def commit_output(temp_file: str, output_file: str):
+    """
+    把写完的临时文件原子地替换为输出文件，其他程序不会看到写了一半的输出。
+    """
+    os.replace(temp_file, output_file)
+
+
+def discard_output(temp_file: str):
+    """
+    删除失败任务留下的临时文件。
+    """
+    try:
+        os.remove(temp_file)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,256 @@
+"""
+PNG 编码。
+
+"fast" 引擎：用 NumPy 计算逐行滤波（可以固定使用一种滤波器，或像 libpng 一样为每行选择绝对值之和最小的滤波器），
+再用 zlib（或可选的 ISA-L）压缩。解码后较大的图片按行切成条带，在多个线程中分别滤波和压缩：
+每个条带使用独立的压缩器，除最后一个外以 Z_SYNC_FLUSH 结束在字节边界上，依次拼接就是一个完整的 deflate 流，
+Adler-32 校验和由各条带的校验和合并得到。每个条带从空的窗口开始压缩，输出比整张图片一起压缩略大。
+NumPy 的数组运算和 zlib 的压缩都会释放 GIL，线程可以同时运行。
+
+"pillow" 引擎：直接用 Pillow 保存，单线程，滤波器由 Pillow 为每行自动选择。
+
+两种引擎的文件头和 PLTE、tRNS、iCCP 等辅助块都由 Pillow 生成。
+"""
+import io
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Tuple
+
+from PIL import Image
+
+from config import config
+from utils.optional import optional_import
+
+try:
+    from isal import isal_zlib
+except ImportError:  # ISA-L（python-isal）是可选依赖，未安装时使用 zlib
+    isal_zlib = None
+
+# NumPy 是可选依赖，由 _load_numpy() 在第一次需要时导入，未安装时不使用 fast 引擎
+np = None
+
+PNG_ENGINES = ("auto", "fast", "pillow")
+# 逐行滤波器在 PNG 中的编号；另有 "adaptive"，为每行选择滤波结果绝对值之和最小的滤波器
+FILTER_TYPES = {"none": 0, "sub": 1, "up": 2, "average": 3, "paeth": 4}
+PNG_FILTERS = (*FILTER_TYPES, "adaptive")
+DEFLATE_LIBRARIES = ("auto", "zlib", "isal")
+# fast 引擎能处理的模式及每个像素的字节数（8 位灰度和真彩色），其余模式（调色板、16 位等）交给 Pillow
+FAST_MODES = {"L": 1, "LA": 2, "RGB": 3, "RGBA": 4}
+# PNG_DEFLATE 为 auto 时，compress_level 不超过此值才使用 ISA-L：低级别时它比 zlib 快很多，输出大小相近
+ISAL_AUTO_MAX_LEVEL = 2
+
+SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_ADLER_BASE = 65521
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def iter_chunks(data: bytes) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    依次产出 PNG 文件中的 (块类型, 块数据)。
+    """
+    position = len(SIGNATURE)
+    while position < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+        yield chunk_type, data[position + 8:position + 8 + length]
+        position += length + 12
+
+
+def pack_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (struct.pack(">I", len(data)) + chunk_type + data
+            + struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+
+
+def _load_numpy():
+    global np
+    np = optional_import("numpy")
+    return np
+
+
+def resolve_engine(engine: str, png_filter: str = "adaptive") -> str:
+    """
+    把 "auto" 解析为实际使用的引擎：有 NumPy，并且可以多线程压缩或固定使用一种滤波器时用 fast，否则用 pillow
+    （单线程时 Pillow 的自适应滤波比 NumPy 快）。明确指定 fast 但未安装 NumPy 时同样退回 pillow。
+    """
+    if _load_numpy() is None:
+        return "pillow"
+    if engine == "auto":
+        return "fast" if _thread_count() > 1 or png_filter != "adaptive" else "pillow"
+    return engine
+
+
+def _thread_count() -> int:
+    return config.PNG_PARALLEL_THREADS or os.cpu_count() or 1
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # 每个进程共用一个线程池，避免每张图片创建线程
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_thread_count(), thread_name_prefix="png")
+        return _executor
+
+
+def _compressobj(compress_level: int):
+    """
+    :return: 输出不带 zlib 头尾的原始 deflate 流的压缩器，按配置 PNG_DEFLATE 选择 zlib 或 ISA-L
+    """
+    library = config.PNG_DEFLATE
+    if isal_zlib is not None and compress_level > 0 and (
+            library == "isal" or (library == "auto" and compress_level <= ISAL_AUTO_MAX_LEVEL)):
+        # ISA-L 只有 0~3 四个级别，0 的压缩率太低，不使用
+        return isal_zlib.compressobj(min(3, max(1, compress_level // 3)), zlib.DEFLATED, -zlib.MAX_WBITS)
+    return zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+
+def _adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """
+    :return: 两段数据拼接后的 Adler-32，adler2 为第二段（长度 length2）单独计算的校验和
+    """
+    sum1 = ((adler1 & 0xFFFF) + (adler2 & 0xFFFF) - 1) % _ADLER_BASE
+    sum2 = ((adler1 >> 16) + (adler2 >> 16) + length2 * ((adler1 & 0xFFFF) - 1)) % _ADLER_BASE
+    return (sum2 << 16) | sum1
+
+
+def _filter_rows(pixels, top: int, bottom: int, bpp: int, png_filter: str):
+    """
+    对 pixels 的 [top, bottom) 行做逐行滤波。滤波只依赖原始像素，条带的第一行参考的上一行取自 pixels，
+    结果与整张图片一起滤波相同。
+    :param pixels: (高度, 每行字节数) 的 uint8 数组
+    :param bpp: 每个像素的字节数
+    :return: (行数, 每行字节数 + 1) 的 uint8 数组，每行第一个字节为滤波器编号
+    """
+    rows = pixels[top:bottom]
+    count, stride = rows.shape
+    left = np.zeros_like(rows)
+    left[:, bpp:] = rows[:, :-bpp]
+    up = np.empty_like(rows)
+    up[0] = pixels[top - 1] if top else 0
+    up[1:] = rows[:-1]
+
+    def paeth():
+        up_left = np.zeros_like(rows)
+        up_left[:, bpp:] = up[:, :-bpp]
+        a, b, c = left.astype(np.int16), up.astype(np.int16), up_left.astype(np.int16)
+        pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+        return rows - np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+
+    # uint8 的减法按 256 取模，与 PNG 的定义相同
+    candidates = {
+        "none": lambda: rows,
+        "sub": lambda: rows - left,
+        "up": lambda: rows - up,
+        "average": lambda: rows - ((left.astype(np.uint16) + up) >> 1).astype(np.uint8),
+        "paeth": paeth,
+    }
+    output = np.empty((count, stride + 1), np.uint8)
+    if png_filter != "adaptive":
+        output[:, 0] = FILTER_TYPES[png_filter]
+        output[:, 1:] = candidates[png_filter]()
+        return output
+    # 依次计算各个滤波器，只保留每行目前最好的结果，不同时持有全部滤波结果
+    best_cost = None
+    for filter_type, candidate in enumerate(candidates.values()):
+        filtered = candidate()
+        # 把每个字节看作有符号数取绝对值后求和，与 libpng 的启发式相同
+        cost = np.minimum(filtered, 0 - filtered).sum(axis=1, dtype=np.int64)
+        better = np.ones(count, bool) if best_cost is None else cost < best_cost
+        best_cost = cost if best_cost is None else np.where(better, cost, best_cost)
+        output[better, 0] = filter_type
+        output[better, 1:] = filtered[better]
+    return output
+
+
+def _compress_strip(pixels, top: int, bottom: int, bpp: int, png_filter: str, compress_level: int, final: bool):
+    """
+    :return: (压缩后的数据, 滤波后数据的 Adler-32, 滤波后数据的长度)
+    """
+    filtered = _filter_rows(pixels, top, bottom, bpp, png_filter)
+    compressor = _compressobj(compress_level)
+    compressed = compressor.compress(filtered) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(filtered), filtered.nbytes
+
+
+def _encode_idat(im: Image.Image, png_filter: str, compress_level: int) -> List[bytes]:
+    """
+    :return: 依次拼接即为完整 zlib 流的若干段数据，每段写成一个 IDAT 块
+    """
+    _load_numpy()
+    pixels = np.asarray(im).reshape(im.height, -1)
+    bpp = FAST_MODES[im.mode]
+    rows = max(1, config.PNG_PARALLEL_STRIP_BYTES // pixels.shape[1])
+    strips = [(top, min(top + rows, im.height)) for top in range(0, im.height, rows)]
+    if len(strips) > 1 and _thread_count() > 1 and pixels.nbytes >= config.PNG_PARALLEL_MIN_BYTES:
+        results = list(_get_executor().map(
+            lambda strip: _compress_strip(pixels, *strip, bpp, png_filter, compress_level, strip[1] == im.height),
+            strips))
+        parts = [compressed for compressed, _, _ in results]
+        adler = 1
+        for _, strip_adler, length in results:
+            adler = _adler32_combine(adler, strip_adler, length)
+    else:
+        # 不并行时整张图片共用一个压缩器，没有条带边界的损失；逐条带滤波，中间结果的内存占用只与条带大小有关
+        compressor = _compressobj(compress_level)
+        parts = []
+        adler = 1
+        for top, bottom in strips:
+            filtered = _filter_rows(pixels, top, bottom, bpp, png_filter)
+            parts.append(compressor.compress(filtered))
+            adler = zlib.adler32(filtered, adler)
+        parts.append(compressor.flush())
+    parts = [part for part in parts if part]
+    # zlib 头与 zlib.compress 使用相同级别时一致，末尾是整个未压缩数据的 Adler-32
+    parts[0] = zlib.compress(b"", compress_level)[:2] + parts[0]
+    parts[-1] += struct.pack(">I", adler)
+    return parts
+
+
+def save_png(im: Image.Image, fp, engine: str = "pillow", compress_level: int = 6, png_filter: str = "adaptive"):
+    """
+    把单帧图片保存为 PNG。
+    :param fp: 输出文件路径或二进制文件对象
+    :param engine: 已解析的引擎（resolve_engine 的结果）；fast 引擎不支持的模式使用 Pillow
+    :param compress_level: zlib 压缩级别，0~9
+    :param png_filter: fast 引擎使用的逐行滤波器，PNG_FILTERS 之一；pillow 引擎总是自动选择
+    """
+    if engine != "fast" or im.mode not in FAST_MODES:
+        im.save(fp, "PNG", compress_level=compress_level)
+        return
+    if png_filter not in PNG_FILTERS:
+        raise ValueError(f"未知的 PNG 滤波器: {png_filter}，可选: {', '.join(PNG_FILTERS)}")
+
+    # 文件头和辅助块由 Pillow 保存只有一行的图片得到，再把 IHDR 中的高度改为实际高度
+    header = io.BytesIO()
+    im.crop((0, 0, im.width, 1)).save(header, "PNG", compress_level=0)
+    before, after = [], []
+    seen_idat = False
+    for chunk_type, data in iter_chunks(header.getvalue()):
+        if chunk_type == b"IHDR":
+            if data[8] != 8:
+                # Pillow 选择了 8 位以外的位深，fast 引擎不支持
+                im.save(fp, "PNG", compress_level=compress_level)
+                return
+            data = data[:4] + struct.pack(">I", im.height) + data[8:]
+        if chunk_type == b"IDAT":
+            seen_idat = True
+        else:
+            (after if seen_idat else before).append((chunk_type, data))
+    idat = _encode_idat(im, png_filter, compress_level)
+
+    output = open(fp, "wb") if isinstance(fp, (str, os.PathLike)) else fp
+    try:
+        output.write(SIGNATURE)
+        for chunk_type, data in before:
+            output.write(pack_chunk(chunk_type, data))
+        for data in idat:
+            output.write(pack_chunk(b"IDAT", data))
+        for chunk_type, data in after:
+            output.write(pack_chunk(chunk_type, data))
+    finally:
+        if output is not fp:
+            output.close()
@@ -0,0 +1,72 @@
+from typing import Dict, List, NamedTuple, Optional
+
+from config import config
+
+
+class EncoderPreset(NamedTuple):
+    """
+    一组与硬件无关的编码参数，在编码速度和输出大小之间取舍。只影响需要重新编码的输出，直接复制流的视频不受影响。
+    """
+    name: str
+    label: str  # 界面上显示的名称
+    x264_preset: str  # libx264 的 -preset，越慢压缩率越高
+    x264_crf: int  # libx264 的 -crf，越大文件越小、画质越低
+    mpeg4_qscale: int  # mpeg4（AVI）的 -q:v，2~31，越大文件越小
+    threads: int  # 每个 ffmpeg 进程的编码线程数，0 为由编码器按核心数决定
+    webp_quality: int  # Pillow WebP 的 quality
+    webp_method: int  # Pillow WebP 的 method，0~6，越大越慢、文件越小；动画 WebP 使用 6 时慢数十倍，收益很小
+    png_compress_level: int  # PNG 的 zlib 压缩级别，0~9
+    png_filter: str  # PNG fast 引擎的逐行滤波器，"adaptive" 为每行自动选择，固定一种（如 "up"）时滤波快得多、文件稍大
+    gif_optimize: bool  # Pillow GIF 的 optimize，去掉未使用的调色板颜色
+
+    def video_args(self, encoder: str) -> List[str]:
+        """
+        :return: 视频编码器的速度和质量参数；不认识的编码器返回空列表
+        """
+        # 参数带流类型说明符，build_output_args 会把它替换为输出流编号，只作用于这一个流
+        if encoder == "libx264":
+            args = ["-preset:v", self.x264_preset, "-crf:v", str(self.x264_crf)]
+        elif encoder == "mpeg4":
+            args = ["-q:v", str(self.mpeg4_qscale)]
+        else:
+            return []
+        if self.threads:
+            args += ["-threads:v", str(self.threads)]
+        return args
+
+    def pillow_options(self, target_format: str) -> Dict:
+        """
+        :return: 保存 target_format 时使用的参数；PNG 的参数传给 core.png_encoder.save_png，其余直接传给 Pillow
+        """
+        target_format = target_format.lower()
+        if target_format == "webp":
+            return {"quality": self.webp_quality, "method": self.webp_method}
+        if target_format == "png":
+            return {"compress_level": self.png_compress_level, "png_filter": self.png_filter}
+        if target_format == "gif":
+            return {"optimize": self.gif_optimize}
+        return {}
+
+
+PRESETS = {
+    preset.name: preset for preset in (
+        EncoderPreset("fast", "速度优先", "superfast", 20, 4, 0, 75, 0, 1, "up", False),
+        # 与之前固定使用的参数相同
+        EncoderPreset("balanced", "均衡", "veryfast", 18, 2, 0, 80, 4, 6, "adaptive", False),
+        EncoderPreset("small", "体积优先", "slow", 24, 5, 0, 75, 5, 9, "adaptive", True),
+    )
+}
+# 输出与旧版本固定参数相同的预设，任务记录和内容索引中它的输出不区分预设
+BASELINE_PRESET = "balanced"
+
+
+def get_preset(name: Optional[str] = None) -> EncoderPreset:
+    """
+    :param name: 预设名称，为 None 时使用配置中的 ENCODER_PRESET
+    :raises ValueError: 预设不存在
+    """
+    name = (name or config.ENCODER_PRESET).lower()
+    preset = PRESETS.get(name)
+    if preset is None:
+        raise ValueError(f"未知的编码预设: {name}，可选: {', '.join(PRESETS)}")
+    return preset
@@ -0,0 +1,46 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class BatchProgress:
+    """
+    汇总一批文件的进度：已完成的文件计为 1，正在转换的文件按其完成比例计入，
+    据此估算整批的完成比例和剩余时间。可在多个线程间共享。
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.completed = 0
+        self._running: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+
+    def update(self, input_file: str, fraction: float):
+        """
+        更新正在转换的文件的完成比例。
+        """
+        with self._lock:
+            self._running[input_file] = fraction
+
+    def finish(self, input_file: str):
+        """
+        标记一个文件结束（无论成功与否）。
+        """
+        with self._lock:
+            self._running.pop(input_file, None)
+            self.completed += 1
+
+    def snapshot(self) -> Tuple[float, Optional[float]]:
+        """
+        :return: (整批完成比例 0~1, 预计剩余秒数)，尚无法估算时剩余秒数为 None
+        """
+        with self._lock:
+            if self.total <= 0:
+                return 1.0, 0.0
+            done = self.completed + sum(self._running.values())
+        fraction = min(done / self.total, 1.0)
+        if fraction <= 0:
+            return 0.0, None
+        elapsed = time.monotonic() - self._start_time
+        return fraction, elapsed * (1 - fraction) / fraction
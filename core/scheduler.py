@@ -0,0 +1,236 @@
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from config import config
+from core.frame_pipeline import estimate_peak_memory, read_geometry
+from core.video_planner import plan_streams
+from utils.parallel import imap_unordered
+
+try:
+    import psutil
+except ImportError:  # psutil 是可选依赖，未安装时退回固定并发
+    psutil = None
+
+
+class JobCost(NamedTuple):
+    """
+    单个任务的预估开销。
+    weight: 运行时占用的并发额度，单线程的图片编码为 1，只复制流的视频接近 I/O 任务，占用更少，
+        转码时 ffmpeg 会使用全部核心，占用更多
+    seconds: 预估耗时（秒），只用于任务之间比较大小，决定先后顺序
+    memory: 预估峰值内存（字节）
+    """
+    weight: float
+    seconds: float
+    memory: int = 0
+
+
+# 各类任务的处理速度估计（字节/秒），用于没有时长信息时估算耗时
+IMAGE_BYTES_PER_SECOND = 5 * 1024 * 1024
+REMUX_BYTES_PER_SECOND = 200 * 1024 * 1024
+TRANSCODE_BYTES_PER_SECOND = 20 * 1024 * 1024
+# 1080p 视频转码速度约为实时，其他分辨率按像素数换算
+TRANSCODE_REFERENCE_PIXELS = 1920 * 1080
+
+REMUX_WEIGHT = 0.5
+
+
+def estimate_cost(input_file: str, converter_type: str, target_formats: Iterable[str], details: Optional[dict] = None) -> JobCost:
+    """
+    根据任务类型、文件大小以及 MediaAnalyzer 给出的时长、分辨率和流编码估算任务开销。
+    :param details: MediaAnalyzer.get_media_details 的结果，没有时只按文件大小估算
+    """
+    try:
+        size = os.path.getsize(input_file)
+    except OSError:
+        size = 0
+
+    if converter_type != "video":
+        # 只读取文件头，得到尺寸和帧数，用于估算峰值内存
+        geometry = read_geometry(input_file)
+        memory = estimate_peak_memory(geometry, len(tuple(target_formats)), config.IMAGE_JOB_MEMORY_BUDGET) if geometry else 0
+        return JobCost(1.0, size / IMAGE_BYTES_PER_SECOND, memory)
+
+    streams = details.get("streams") if details else None
+    transcode = any(
+        plan.action == "transcode"
+        for target_format in target_formats
+        for plan in (plan_streams(streams, target_format) or ())
+    )
+    if not transcode:
+        return JobCost(REMUX_WEIGHT, size / REMUX_BYTES_PER_SECOND)
+
+    duration = details.get("duration_seconds")
+    if duration:
+        try:
+            width, height = (int(value) for value in details.get("resolution", "").split("x"))
+            pixels = width * height
+        except ValueError:
+            pixels = TRANSCODE_REFERENCE_PIXELS
+        seconds = duration * pixels / TRANSCODE_REFERENCE_PIXELS
+    else:
+        seconds = size / TRANSCODE_BYTES_PER_SECOND
+    # 转码的 ffmpeg 本身是多线程的，让它占用一半核心的额度，避免与其他任务争抢 CPU
+    return JobCost(max(1.0, (os.cpu_count() or 4) / 2), seconds)
+
+
+class AdaptiveScheduler:
+    """
+    按预估开销调度任务：同时运行的任务总权重不超过当前额度，预估峰值内存之和不超过内存上限，
+    额度根据观测到的 CPU 占用、I/O 等待和内存占用动态增减。
+    任务按预估耗时从大到小开始，减少批次末尾只剩一个大文件在运行的情况。
+    """
+    # 调整额度的采样间隔（秒）
+    SAMPLE_INTERVAL = 1.0
+    # CPU 占用低于此值且额度已用满时增加额度，高于 CPU_HIGH 时减少额度
+    CPU_LOW = 75.0
+    CPU_HIGH = 95.0
+    # I/O 等待或内存占用超过阈值时按比例快速减少额度
+    IOWAIT_HIGH = 25.0
+    MEMORY_HIGH = 90.0
+    BACKOFF_FACTOR = 0.75
+
+    def __init__(self, converter_type: str, target_formats: Iterable[str], max_workers: Optional[int] = None,
+                 adaptive: Optional[bool] = None, lookahead: Optional[int] = None, memory_limit: Optional[int] = None):
+        """
+        :param max_workers: 指定时固定同时运行的任务数，不按权重计算，也不动态调整（内存上限仍然生效）
+        :param adaptive: 是否根据系统负载调整额度，默认使用配置；没有安装 psutil 时总是关闭
+        :param lookahead: 为按大小排序而预读的输入数量
+        :param memory_limit: 同时运行任务的预估内存上限（字节），默认为可用内存的 SCHEDULER_MEMORY_FRACTION
+        """
+        self.converter_type = converter_type
+        self.target_formats = tuple(target_formats)
+        self.fixed = max_workers is not None
+        if self.fixed:
+            self.capacity = self.min_capacity = self.max_capacity = float(max_workers)
+        else:
+            self.capacity = float(config.CONCURRENCY_LIMIT)
+            self.min_capacity = 1.0
+            self.max_capacity = float(config.SCHEDULER_MAX_CONCURRENCY)
+        if adaptive is None:
+            adaptive = config.SCHEDULER_ADAPTIVE
+        self.adaptive = adaptive and not self.fixed and psutil is not None
+        self.lookahead = lookahead or config.SCHEDULER_LOOKAHEAD
+        self.memory_limit = memory_limit or self.default_memory_limit()
+        self.running = 0.0
+        self.running_memory = 0
+        self._last_sample = None
+        if self.adaptive:
+            # 第一次调用只建立基准，之后的调用返回两次调用之间的占用
+            psutil.cpu_percent(interval=None)
+            psutil.cpu_times_percent(interval=None)
+            self._last_sample = time.monotonic()
+
+    @staticmethod
+    def default_memory_limit() -> Optional[int]:
+        """
+        可用内存乘以 SCHEDULER_MEMORY_FRACTION；没有 psutil 时使用物理内存总量，无法获取时不限制。
+        """
+        if psutil is not None:
+            available = psutil.virtual_memory().available
+        else:
+            try:
+                available = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+            except (AttributeError, ValueError, OSError):
+                return None
+        return int(available * config.SCHEDULER_MEMORY_FRACTION)
+
+    @property
+    def max_jobs(self) -> int:
+        """
+        同时运行的任务数上限，用于确定执行器的工作线程/进程数。
+        """
+        if self.fixed:
+            return int(self.max_capacity)
+        if self.converter_type == "video":
+            return max(1, math.ceil(self.max_capacity / REMUX_WEIGHT))
+        return max(1, math.ceil(self.max_capacity))
+
+    def weight(self, cost: JobCost) -> float:
+        return 1.0 if self.fixed else cost.weight
+
+    def _iter_costs(self, input_files: Iterable[str]) -> Iterator[Tuple[str, JobCost]]:
+        """
+        在线程池中估算开销，按完成顺序产出 (输入文件, 开销)，读取文件头和探测不在调用方的线程中进行。
+        """
+        if self.converter_type != "video":
+            def probe(input_file):
+                return input_file, estimate_cost(input_file, self.converter_type, self.target_formats)
+            return imap_unordered(probe, input_files, config.CONCURRENCY_LIMIT)
+        # 延迟导入，只有视频任务需要媒体分析。分析结果会被缓存，转换器之后直接使用
+        from backend.media_analyzer import MediaAnalyzer
+        return (
+            (details["full_path"], estimate_cost(details["full_path"], self.converter_type, self.target_formats, details))
+            for details in MediaAnalyzer.iter_media_details(input_files)
+        )
+
+    def order(self, input_files: Iterable[str]) -> Iterator[Tuple[str, JobCost]]:
+        """
+        预读输入，按预估耗时从大到小产出 (输入文件, 开销)。
+        预读窗口从 1 开始，每产出一个任务翻倍，直到 lookahead：第一个任务只需等待一次探测就能开始，
+        之后的排序范围逐渐扩大。输入不超过当时的窗口时即为完全排序。
+        """
+        counter = itertools.count()
+        heap = []
+        window = 1
+        costs = self._iter_costs(input_files)
+        try:
+            for input_file, cost in costs:
+                heapq.heappush(heap, (-cost.seconds, next(counter), input_file, cost))
+                if len(heap) >= window:
+                    _, _, largest, largest_cost = heapq.heappop(heap)
+                    window = min(self.lookahead, window * 2)
+                    yield largest, largest_cost
+        finally:
+            # 提前关闭时取消尚未开始的探测
+            costs.close()
+        while heap:
+            _, _, largest, largest_cost = heapq.heappop(heap)
+            yield largest, largest_cost
+
+    def can_admit(self, cost: JobCost) -> bool:
+        """
+        当前额度和内存上限是否还能容纳该任务。没有任务在运行时总是允许，保证超过额度的大任务也能执行。
+        """
+        if self.running <= 0:
+            return True
+        if self.memory_limit is not None and self.running_memory + cost.memory > self.memory_limit:
+            return False
+        return self.running + self.weight(cost) <= self.capacity + 1e-9
+
+    def start(self, cost: JobCost):
+        self.running += self.weight(cost)
+        self.running_memory += cost.memory
+
+    def finish(self, cost: JobCost):
+        self.running = max(0.0, self.running - self.weight(cost))
+        self.running_memory = max(0, self.running_memory - cost.memory)
+
+    def sample(self):
+        """
+        采样系统负载并调整额度，距上次采样不足 SAMPLE_INTERVAL 时不做任何事。
+        """
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        if now - self._last_sample < self.SAMPLE_INTERVAL:
+            return
+        self._last_sample = now
+
+        cpu = psutil.cpu_percent(interval=None)
+        iowait = getattr(psutil.cpu_times_percent(interval=None), "iowait", 0.0)
+        memory = psutil.virtual_memory().percent
+        previous = self.capacity
+        if memory > self.MEMORY_HIGH or iowait > self.IOWAIT_HIGH:
+            self.capacity = max(self.min_capacity, self.capacity * self.BACKOFF_FACTOR)
+        elif cpu > self.CPU_HIGH:
+            self.capacity = max(self.min_capacity, self.capacity - 1)
+        elif cpu < self.CPU_LOW and self.running >= self.capacity - 1:
+            self.capacity = min(self.max_capacity, self.capacity + 1)
+        if self.capacity != previous:
+            logging.debug(f"调整并发额度 {previous:.2f} -> {self.capacity:.2f} (CPU {cpu:.0f}%, I/O 等待 {iowait:.0f}%, 内存 {memory:.0f}%)")
@@ -0,0 +1,176 @@
+import logging
+import os
+import shutil
+import tempfile
+from typing import Iterable, Optional
+
+from config import config
+
+# 文件头特征：(偏移, 字节串, 容器格式)
+MAGIC_SIGNATURES = (
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (8, b"WEBP", "webp"),
+    (0, b"BM", "bmp"),
+    (4, b"ftyp", "mp4"),
+    (4, b"moov", "mp4"),
+    (4, b"mdat", "mp4"),
+    (4, b"wide", "mp4"),
+    (4, b"free", "mp4"),
+    (0, b"\x1a\x45\xdf\xa3", "matroska"),
+    (8, b"AVI ", "avi"),
+    (0, b"FLV", "flv"),
+    (0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11", "asf"),
+    (0, b"OggS", "ogg"),
+    (0, b"\x00\x00\x01\xba", "mpeg"),
+)
+# MPEG-TS 没有固定的文件头，每个 188 字节的包以同步字节 0x47 开始，检查前两个包
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+# 读取的文件头长度，足够覆盖所有特征
+MAGIC_BYTES = TS_PACKET_SIZE + 1
+
+# 各类转换器能处理的输入容器
+IMAGE_CONTAINERS = frozenset(("png", "jpeg", "gif", "webp", "bmp"))
+VIDEO_CONTAINERS = frozenset(("mp4", "matroska", "avi", "flv", "asf", "ogg", "mpeg", "mpegts"))
+
+# 输出大小相对输入大小的粗略上限倍数，用于预估磁盘空间；有损压缩的输入转为无损格式时会明显变大
+OUTPUT_SIZE_FACTORS = {
+    "png": 4.0,
+    "gif": 3.0,
+    "webp": 2.0,
+    "mp4": 1.5,
+    "avi": 3.0,
+}
+DEFAULT_OUTPUT_SIZE_FACTOR = 3.0
+
+
+def sniff_format(file_path: str) -> Optional[str]:
+    """
+    根据文件头识别容器格式，无法识别时返回 None。文件无法读取时抛出 OSError。
+    """
+    with open(file_path, "rb") as f:
+        header = f.read(MAGIC_BYTES)
+    if header.startswith(b"RIFF") and header[8:12] not in (b"WEBP", b"AVI "):
+        return None
+    for offset, signature, container in MAGIC_SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            return container
+    if len(header) > TS_PACKET_SIZE and header[0] == TS_SYNC_BYTE and header[TS_PACKET_SIZE] == TS_SYNC_BYTE:
+        return "mpegts"
+    return None
+
+
+def estimate_output_bytes(input_size: int, target_format: str) -> int:
+    return int(input_size * OUTPUT_SIZE_FACTORS.get(target_format.lower(), DEFAULT_OUTPUT_SIZE_FACTOR))
+
+
+def check_input(file_path: str, containers: Iterable[str]) -> Optional[str]:
+    """
+    检查输入文件可读、非空，且文件头属于 containers 之一。
+    :return: 失败原因，通过时为 None
+    """
+    try:
+        if not os.path.isfile(file_path):
+            return "输入文件不存在"
+        if os.path.getsize(file_path) == 0:
+            return "输入文件为空"
+        container = sniff_format(file_path)
+    except OSError as e:
+        return f"无法读取输入文件: {e}"
+    if container is None:
+        return "无法识别的文件格式"
+    if container not in containers:
+        return f"不支持的输入格式: {container}"
+    return None
+
+
+def check_output_folder(output_folder: str) -> Optional[str]:
+    """
+    检查输出文件夹存在（不存在时创建）且可写。
+    :return: 失败原因，通过时为 None
+    """
+    try:
+        os.makedirs(output_folder, exist_ok=True)
+        with tempfile.TemporaryFile(dir=output_folder):
+            pass
+    except OSError as e:
+        return f"输出文件夹不可写: {e}"
+    return None
+
+
+class Preflight:
+    """
+    转换前的检查，在调度之前对整批输入做一次只读取文件头的快速检查，注定失败的任务不占用执行器。
+    批次级的检查（目标格式、编码器、输出文件夹）由 check_batch 完成一次；
+    每个输入由 check 检查可读性和文件头。磁盘空间在任务确定要转换时由 reserve 按输出检查，
+    正在转换的输出预留预估的大小，结束时由 release 释放，已写入的输出由磁盘的实际剩余空间反映。
+    """
+
+    def __init__(self, converter_class, target_formats: Iterable[str], output_folder: str,
+                 reserve_bytes: Optional[int] = None):
+        """
+        :param converter_class: 转换器类，提供 batch_validation 和 input_validation
+        :param reserve_bytes: 转换后输出磁盘至少保留的空闲字节数，默认使用配置中的 PREFLIGHT_RESERVE_BYTES
+        """
+        self.converter_class = converter_class
+        self.target_formats = tuple(target_formats)
+        self.output_folder = output_folder
+        self.reserve_bytes = config.PREFLIGHT_RESERVE_BYTES if reserve_bytes is None else reserve_bytes
+        self.check_space = False
+        self._reserved = {}  # (输入文件, 目标格式) -> 正在转换的输出预留的字节数
+
+    @property
+    def reserved_bytes(self) -> int:
+        return sum(self._reserved.values())
+
+    def check_batch(self) -> Optional[str]:
+        """
+        检查整批共同的条件，任一失败时整批都无法转换。
+        :return: 失败原因，通过时为 None
+        """
+        error = self.converter_class.batch_validation(self.target_formats) or check_output_folder(self.output_folder)
+        if error is not None:
+            return error
+        try:
+            shutil.disk_usage(self.output_folder)
+            self.check_space = True
+        except OSError as e:
+            # 无法获取剩余空间时不检查磁盘空间
+            logging.debug(f"无法获取剩余磁盘空间 {self.output_folder}: {e}")
+        return None
+
+    def check(self, input_file: str) -> Optional[str]:
+        """
+        检查单个输入能否转换，不检查磁盘空间。
+        :return: 失败原因，通过时为 None
+        """
+        return self.converter_class.input_validation(input_file, self.target_formats)
+
+    def reserve(self, input_file: str, target_format: str) -> Optional[str]:
+        """
+        检查当前剩余空间减去正在转换的输出预留的空间后能否容纳这个输出，能容纳时为它预留预估的大小。
+        只对确定要转换的输出调用，跳过或复用的输出不占用空间。
+        :return: 失败原因，通过时为 None
+        """
+        if not self.check_space:
+            return None
+        try:
+            input_size = os.path.getsize(input_file)
+            free_bytes = shutil.disk_usage(self.output_folder).free
+        except OSError as e:
+            return f"无法检查磁盘空间: {e}"
+        estimated = estimate_output_bytes(input_size, target_format)
+        available = free_bytes - self.reserve_bytes - self.reserved_bytes
+        if estimated > available:
+            return f"输出磁盘空间不足（预计需要 {estimated} 字节，可用 {max(0, available)} 字节）"
+        self._reserved[(input_file, target_format)] = estimated
+        return None
+
+    def release(self, input_file: str, target_format: str):
+        """
+        输出转换结束（成功、失败或取消）后释放 reserve 预留的空间。
+        """
+        self._reserved.pop((input_file, target_format), None)
@@ -0,0 +1,134 @@
+from typing import Dict, List, NamedTuple, Optional
+
+from core.presets import EncoderPreset, get_preset
+
+# 各容器可以直接复制（不重新编码）的编码格式
+CONTAINER_CODECS = {
+    "mp4": {
+        "video": {"h264", "hevc", "mpeg4", "av1", "vp9", "mpeg2video", "mpeg1video"},
+        "audio": {"aac", "mp3", "alac", "opus", "flac", "ac3", "eac3"},
+        "subtitle": {"mov_text"},
+    },
+    "avi": {
+        "video": {"mpeg4", "msmpeg4v3", "msmpeg4v2", "mjpeg", "h264", "mpeg2video", "mpeg1video", "rawvideo"},
+        "audio": {"mp3", "mp2", "ac3", "pcm_s16le", "pcm_u8"},
+        "subtitle": set(),
+    },
+}
+
+# 需要转码时各容器使用的编码器和参数，视频编码器的速度和质量参数由编码预设（EncoderPreset.video_args）给出
+TRANSCODE_ARGS = {
+    "mp4": {
+        "video": ["libx264", "-pix_fmt", "yuv420p"],
+        "audio": ["aac", "-b:a", "192k"],
+        "subtitle": ["mov_text"],
+    },
+    "avi": {
+        "video": ["mpeg4"],
+        "audio": ["libmp3lame", "-q:a", "2"],
+        "subtitle": None,
+    },
+}
+
+# 复制到特定容器时需要的码流过滤器
+COPY_BITSTREAM_FILTERS = {
+    ("avi", "h264"): "h264_mp4toannexb",
+}
+
+# 可以转换为 mov_text 的文本字幕，图形字幕无法转换，直接丢弃
+TEXT_SUBTITLE_CODECS = {"subrip", "ass", "ssa", "webvtt", "mov_text", "text"}
+
+# 作为封面图片出现的视频流编码，存在其他视频流时丢弃
+COVER_ART_CODECS = {"png", "mjpeg", "bmp", "gif"}
+
+
+class StreamPlan(NamedTuple):
+    """
+    单个输入流的处理方式。action 取值: "copy"、"transcode"、"drop"。
+    """
+    index: int
+    codec_type: str
+    codec_name: Optional[str]
+    action: str
+
+
+def plan_streams(streams: Optional[List[Dict]], target_format: str) -> Optional[List[StreamPlan]]:
+    """
+    根据输入各个流的编码决定每个流是直接复制还是转码。
+    :param streams: MediaAnalyzer 返回的流列表
+    :param target_format: 目标容器，如 "mp4"
+    :return: 每个流的处理方式；流信息未知或目标容器不在规则表中时返回 None
+    """
+    target_format = target_format.lower()
+    if not streams or target_format not in CONTAINER_CODECS:
+        return None
+
+    supported = CONTAINER_CODECS[target_format]
+    has_main_video = any(
+        stream.get("codec_type") == "video" and stream.get("codec_name") not in COVER_ART_CODECS for stream in streams
+    )
+    plans = []
+    for stream in streams:
+        codec_type = stream.get("codec_type")
+        codec_name = stream.get("codec_name")
+        if codec_type == "video" and has_main_video and codec_name in COVER_ART_CODECS:
+            action = "drop"
+        elif codec_type in ("video", "audio"):
+            action = "copy" if codec_name in supported[codec_type] else "transcode"
+        elif codec_type == "subtitle":
+            if codec_name in supported["subtitle"]:
+                action = "copy"
+            elif codec_name in TEXT_SUBTITLE_CODECS and TRANSCODE_ARGS[target_format]["subtitle"]:
+                action = "transcode"
+            else:
+                action = "drop"
+        else:
+            # 数据流、附件等在目标容器中通常无法保存
+            action = "drop"
+        plans.append(StreamPlan(stream.get("index"), codec_type, codec_name, action))
+    return plans
+
+
+def build_output_args(plans: Optional[List[StreamPlan]], target_format: str, input_index: int = 0,
+                      preset: Optional[EncoderPreset] = None) -> List[str]:
+    """
+    把流处理方案转换为 ffmpeg 输出参数（-map 和按输出流编号的 -c 参数）。
+    没有方案时退回到全部流直接复制（由 ffmpeg 自动选择流，只适用于单个输入的命令）。
+    :param input_index: 流所在输入在命令中的编号，一条命令有多个 -i 时使用
+    :param preset: 转码时使用的编码预设，默认使用配置中的 ENCODER_PRESET
+    """
+    if plans is None:
+        return ['-c:v', 'copy', '-c:a', 'copy']
+
+    target_format = target_format.lower()
+    args = []
+    output_index = 0
+    for plan in plans:
+        if plan.action == "drop":
+            continue
+        args += ['-map', f'{input_index}:{plan.index}']
+        if plan.action == "copy":
+            args += [f'-c:{output_index}', 'copy']
+            bsf = COPY_BITSTREAM_FILTERS.get((target_format, plan.codec_name))
+            if bsf:
+                args += [f'-bsf:{output_index}', bsf]
+        else:
+            encoder, *options = TRANSCODE_ARGS[target_format][plan.codec_type]
+            options = [*(preset or get_preset()).video_args(encoder), *options]
+            args += [f'-c:{output_index}', encoder]
+            # 编码参数中的流类型说明符（如 -b:a）替换为输出流编号
+            for option in options:
+                if option.startswith('-') and ':' in option:
+                    option = f"{option.split(':')[0]}:{output_index}"
+                args.append(option)
+        output_index += 1
+    return args
+
+
+def describe_plan(plans: Optional[List[StreamPlan]]) -> str:
+    """
+    生成方案的简短描述，用于日志。
+    """
+    if plans is None:
+        return "copy (未知流信息)"
+    return ", ".join(f"#{plan.index} {plan.codec_name or '?'}:{plan.action}" for plan in plans)
@@ -0,0 +1,53 @@
+from PySide6.QtCore import QThread, Signal
+
+from core.app import App
+from core.progress import BatchProgress
+
+
+class ConversionWorker(QThread):
+    """
+    在后台线程中运行 App 转换任务，通过信号把每个文件的结果和整批进度实时推送到界面。
+    """
+    # 参数: 已完成数量, 总数量, 结果消息
+    file_finished = Signal(int, int, str)
+    # 参数: 整批完成比例 0~1, 预计剩余秒数（未知时为 -1）
+    batch_progress = Signal(float, float)
+    # 参数: 已完成数量, 总数量, 是否被取消
+    conversion_finished = Signal(int, int, bool)
+
+    def __init__(self, app: App, input_files, parent=None):
+        super().__init__(parent)
+        self.app = app
+        self.input_files = list(input_files)
+        # 每个输入文件对每个目标格式各产出一个结果
+        self.total = len(self.input_files) * len(app.formats)
+        self.progress = BatchProgress(self.total)
+        # 视频转换过程中由工作线程回调，报告单个文件的进度
+        self.app.progress_callback = self._on_file_progress
+
+    def _on_file_progress(self, input_file, fraction, eta):
+        self.progress.update(input_file, fraction)
+        self._emit_batch_progress()
+
+    def _emit_batch_progress(self):
+        fraction, eta = self.progress.snapshot()
+        self.batch_progress.emit(fraction, -1.0 if eta is None else eta)
+
+    def run(self):
+        count = self.total
+        step = 0
+        try:
+            for result in self.app.iter_convert(self.input_files):
+                step += 1
+                self.progress.finish(result.input_file)
+                self.file_finished.emit(step, count, result.message)
+                self._emit_batch_progress()
+        finally:
+            self.app.shutdown(wait=False)
+            self.conversion_finished.emit(step, count, self.app.cancelled)
+
+    def cancel(self):
+        """
+        请求取消转换，已开始的文件会执行完毕。
+        """
+        self.app.cancel()
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, Signal
+from PySide6.QtGui import QPixmap
+
+from config import config
+
+
+class FileRecord:
+    """
+    文件列表中的一行，使用 __slots__ 减少大量文件时的内存占用。
+    """
+    __slots__ = ("name", "type", "size", "resolution", "duration", "full_path")
+
+    def __init__(self, details: Dict):
+        self.full_path = details["full_path"]
+        self.update(details)
+
+    def update(self, details: Dict):
+        self.name = details["name"]
+        self.type = details["type"]
+        self.size = details["size"]
+        self.resolution = details["resolution"]
+        self.duration = details["duration"]
+
+
+class FileTableModel(QAbstractTableModel):
+    """
+    文件列表的数据模型。视图只请求可见行的数据，路径到行号的哈希索引使查重和更新为 O(1)。
+    缩略图同样只在视图请求可见行的图标时才通过 thumbnail_requested 请求生成，
+    已加载的缩略图只保留最近使用的 THUMBNAIL_MEMORY_ENTRIES 个。
+    """
+    # 参数: 需要生成缩略图的文件完整路径
+    thumbnail_requested = Signal(str)
+    HEADERS = ["名称", "类型", "大小", "分辨率", "时长"]
+    COLUMNS = ("name", "type", "size", "resolution", "duration")
+    ALIGNMENTS = (
+        Qt.AlignLeft | Qt.AlignVCenter,
+        Qt.AlignCenter,
+        Qt.AlignRight | Qt.AlignVCenter,
+        Qt.AlignCenter,
+        Qt.AlignCenter,
+    )
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._records: List[FileRecord] = []
+        self._rows: Dict[str, int] = {}  # 完整路径 -> 行号
+        # 完整路径 -> 缩略图，None 表示无法生成
+        self._thumbnails: "OrderedDict[str, Optional[QPixmap]]" = OrderedDict()
+        self._thumbnail_pending = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self._records[index.row()]
+        if role == Qt.DisplayRole:
+            return getattr(record, self.COLUMNS[index.column()])
+        if role == Qt.TextAlignmentRole:
+            return self.ALIGNMENTS[index.column()]
+        if role == Qt.DecorationRole and index.column() == 0:
+            return self._thumbnail(record.full_path)
+        if role == Qt.UserRole:
+            return record.full_path
+        if role == Qt.ToolTipRole and index.column() == 0:
+            return record.full_path
+        return None
+
+    def _thumbnail(self, full_path: str) -> Optional[QPixmap]:
+        if full_path in self._thumbnails:
+            self._thumbnails.move_to_end(full_path)
+            return self._thumbnails[full_path]
+        if full_path not in self._thumbnail_pending:
+            self._thumbnail_pending.add(full_path)
+            self.thumbnail_requested.emit(full_path)
+        return None
+
+    def set_thumbnail(self, full_path: str, data: bytes):
+        """
+        保存生成好的缩略图并刷新对应的行。
+        :param data: PNG 数据，为空表示无法生成，之后不再请求
+        """
+        self._thumbnail_pending.discard(full_path)
+        row = self._rows.get(full_path)
+        if row is None:
+            return
+        pixmap = None
+        if data:
+            pixmap = QPixmap()
+            if not pixmap.loadFromData(data):
+                pixmap = None
+        self._thumbnails[full_path] = pixmap
+        self._thumbnails.move_to_end(full_path)
+        while len(self._thumbnails) > config.THUMBNAIL_MEMORY_ENTRIES:
+            self._thumbnails.popitem(last=False)
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def cancel_thumbnail(self, full_path: str):
+        """
+        缩略图请求被丢弃时调用，该行再次可见时会重新请求。
+        """
+        self._thumbnail_pending.discard(full_path)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def contains(self, full_path: str) -> bool:
+        return full_path in self._rows
+
+    def paths(self) -> List[str]:
+        """
+        按显示顺序返回所有文件的完整路径。
+        """
+        return [record.full_path for record in self._records]
+
+    def add_files(self, details_list: Iterable[Dict]) -> List[str]:
+        """
+        批量追加文件，已在列表中的路径会被跳过。
+        :return: 实际添加的文件路径
+        """
+        new_records = []
+        seen = set()
+        for details in details_list:
+            full_path = details["full_path"]
+            if full_path in self._rows or full_path in seen:
+                continue
+            seen.add(full_path)
+            new_records.append(FileRecord(details))
+        if not new_records:
+            return []
+
+        first = len(self._records)
+        self.beginInsertRows(QModelIndex(), first, first + len(new_records) - 1)
+        for offset, record in enumerate(new_records):
+            self._records.append(record)
+            self._rows[record.full_path] = first + offset
+        self.endInsertRows()
+        return [record.full_path for record in new_records]
+
+    def update_details(self, details: Dict) -> bool:
+        """
+        用分析结果更新对应文件的行。
+        :return: 文件仍在列表中时返回 True
+        """
+        row = self._rows.get(details["full_path"])
+        if row is None:
+            return False
+        self._records[row].update(details)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+        return True
+
+    def remove_rows(self, rows: Iterable[int]):
+        """
+        删除指定的行，连续的行合并为一次删除。
+        """
+        rows = sorted(set(rows), reverse=True)
+        if not rows:
+            return
+
+        # 把行号合并为连续区间，从后往前删除以保持前面的行号不变
+        ranges = []
+        start = end = rows[0]
+        for row in rows[1:]:
+            if row == start - 1:
+                start = row
+            else:
+                ranges.append((start, end))
+                start = end = row
+        ranges.append((start, end))
+
+        for start, end in ranges:
+            self.beginRemoveRows(QModelIndex(), start, end)
+            for record in self._records[start:end + 1]:
+                del self._rows[record.full_path]
+                self._thumbnails.pop(record.full_path, None)
+            del self._records[start:end + 1]
+            self.endRemoveRows()
+
+        # 只需重建第一个被删除行之后的索引
+        for row in range(rows[-1], len(self._records)):
+            self._rows[self._records[row].full_path] = row
+
+    def clear(self):
+        self.beginResetModel()
+        self._records = []
+        self._rows = {}
+        self._thumbnails.clear()
+        self._thumbnail_pending.clear()
+        self.endResetModel()
@@ -1,18 +1,24 @@
 import os
-import queue
 import subprocess
 import sys
-from time import sleep
 
+from PySide6.QtCore import QSize
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
-    QFileDialog, QTableWidget, QTableWidgetItem, QComboBox, QMessageBox, QProgressBar,
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+    QFileDialog, QTableView, QComboBox, QMessageBox, QProgressBar,
     QTextEdit, QSizePolicy, QAbstractItemView, QCheckBox, QButtonGroup, QHeaderView
 )
-from PySide6.QtCore import Qt
-from backend.media_analyzer import MediaAnalyzer
+from config import config
 from core.app import App
+from core.job_journal import JobJournal
+from core.metrics import default_metrics
+from core.presets import PRESETS
+from gui.conversion_worker import ConversionWorker
+from gui.file_table_model import FileTableModel
+from gui.probe_worker import ProbeWorker
+from gui.thumbnail_loader import ThumbnailLoader
+from utils.format_utils import format_duration
 
 
 class SnapConvertApp(QWidget):
@@ -26,6 +32,9 @@ class SnapConvertApp(QWidget):
         # image_path = get_resource_path("assets/your_image.png")
         icon_path = self._get_resource_path("assets/EzyConv.ico")
         self.setWindowIcon(QIcon(icon_path))
+        self.output_folder_path = None
+        self.conversion_worker = None
+        self.probe_workers = []
         self.setup_ui()
         self._check_ffprobe()
 
@@ -80,13 +89,22 @@ class SnapConvertApp(QWidget):
         self.file_button = QPushButton("选择图片文件")
         self.file_button.clicked.connect(self.select_files)
         file_button_layout.addWidget(self.file_button)
+        self.folder_button = QPushButton("添加文件夹")
+        self.folder_button.clicked.connect(self.select_input_folder)
+        file_button_layout.addWidget(self.folder_button)
         layout.addLayout(file_button_layout)
 
         # 文件详情表格
         layout.addWidget(QLabel("已选择文件:"))
-        self.file_table = QTableWidget()
-        self.file_table.setColumnCount(5)
-        self.file_table.setHorizontalHeaderLabels(["名称", "类型", "大小", "分辨率", "时长"])
+        self.file_model = FileTableModel(self)
+        self.file_table = QTableView()
+        self.file_table.setModel(self.file_model)
+        # 缩略图在后台生成，模型只为视图正在显示的行请求
+        self.thumbnail_loader = ThumbnailLoader(parent=self)
+        self.file_model.thumbnail_requested.connect(self.thumbnail_loader.request)
+        self.thumbnail_loader.thumbnail_ready.connect(self.file_model.set_thumbnail)
+        self.thumbnail_loader.thumbnail_dropped.connect(self.file_model.cancel_thumbnail)
+        self.file_table.setIconSize(QSize(32, 32))
         self.file_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.file_table.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.file_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
@@ -95,6 +113,9 @@ class SnapConvertApp(QWidget):
         header.setSectionResizeMode(0, QHeaderView.Stretch)
         header.setSectionResizeMode(4, QHeaderView.ResizeToContents)
         self.file_table.verticalHeader().setVisible(False)
+        # 固定行高，视图无需逐行计算高度
+        self.file_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.file_table.verticalHeader().setDefaultSectionSize(36)
         layout.addWidget(self.file_table)
 
         # 删除按钮
@@ -118,18 +139,38 @@ class SnapConvertApp(QWidget):
         self.type_combo = QComboBox()
         self.type_combo.setEnabled(False)
         type_layout.addWidget(self.type_combo)
+        type_layout.addWidget(QLabel("编码预设:"))
+        self.preset_combo = QComboBox()
+        for preset in PRESETS.values():
+            self.preset_combo.addItem(preset.label, preset.name)
+        self.preset_combo.setCurrentIndex(self.preset_combo.findData(config.ENCODER_PRESET))
+        self.preset_combo.setToolTip("需要重新编码时在速度和输出大小之间取舍，只复制流的视频不受影响")
+        type_layout.addWidget(self.preset_combo)
+        self.skip_done_checkbox = QCheckBox("跳过已转换的文件")
+        self.skip_done_checkbox.setToolTip("输入文件未修改且输出文件仍然存在时跳过，用于续传中断的批量转换")
+        type_layout.addWidget(self.skip_done_checkbox)
         layout.addLayout(type_layout)
 
         # 转换按钮
+        convert_layout = QHBoxLayout()
         self.convert_button = QPushButton("确认转换")
         self.convert_button.clicked.connect(self.confirm_conversion)
-        layout.addWidget(self.convert_button)
+        convert_layout.addWidget(self.convert_button)
+        self.cancel_button = QPushButton("取消转换")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_conversion)
+        convert_layout.addWidget(self.cancel_button)
+        layout.addLayout(convert_layout)
 
         # 进度条
         self.progress_bar = QProgressBar()
         self.progress_bar.setMaximum(100)
         self.progress_bar.setValue(0)
-        layout.addWidget(self.progress_bar)
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.progress_bar)
+        self.eta_label = QLabel("")
+        progress_layout.addWidget(self.eta_label)
+        layout.addLayout(progress_layout)
 
         # 详情切换
         self.toggle_detail_btn = QPushButton("收起详情")
@@ -161,7 +202,8 @@ class SnapConvertApp(QWidget):
             self.selected_file_type = None
             self.file_button.setText("选择文件")
         self.update_convert_type()
-        self.file_table.setRowCount(0)
+        self.cancel_probes()
+        self.file_model.clear()
 
     def update_convert_type(self):
         """
@@ -169,10 +211,10 @@ class SnapConvertApp(QWidget):
         """
         self.type_combo.clear()
         if self.selected_file_type == "image":
-            self.type_combo.addItems(["PNG", "GIF", "WEBP"])
+            self.type_combo.addItems(list(config.IMAGE_TARGET_FORMATS))
             self.type_combo.setEnabled(True)
         elif self.selected_file_type == "video":
-            self.type_combo.addItems(["MP4", "AVI"])
+            self.type_combo.addItems(list(config.VIDEO_TARGET_FORMATS))
             self.type_combo.setEnabled(True)
         else:
             self.type_combo.setEnabled(False)
@@ -201,9 +243,9 @@ class SnapConvertApp(QWidget):
         """
         file_filter = "所有文件 (*)"
         if self.selected_file_type == "image":
-            file_filter = "图片文件 (*.jpg *.jpeg *.png *.gif *.webp *.bmp)"
+            file_filter = f"图片文件 ({' '.join('*' + ext for ext in config.IMAGE_EXTENSIONS)})"
         elif self.selected_file_type == "video":
-            file_filter = "视频文件 (*.mp4 *.avi *.mov *.mkv *.flv)"
+            file_filter = f"视频文件 ({' '.join('*' + ext for ext in config.VIDEO_EXTENSIONS)})"
 
         files, _ = QFileDialog.getOpenFileNames(
             self,
@@ -213,71 +255,94 @@ class SnapConvertApp(QWidget):
         )
 
         if files:
-            current_files = set()
-            for row in range(self.file_table.rowCount()):
-                item = self.file_table.item(row, 0)
-                if item:
-                    full_path = item.data(Qt.UserRole)
-                    if full_path:
-                        current_files.add(full_path)
-
-            new_files_added = 0
-            QApplication.setOverrideCursor(Qt.WaitCursor)
-            try:
-                for file_path in files:
-                    if file_path not in current_files:
-                        details = MediaAnalyzer.get_media_details(file_path)
-
-                        if details.get("error"):
-                            QMessageBox.warning(self, "文件信息获取失败", f"无法获取文件 '{details['name']}' 的详细信息。\n原因: {details['error']}")
-
-                        row_position = self.file_table.rowCount()
-                        self.file_table.insertRow(row_position)
-
-                        item_name = QTableWidgetItem(details["name"])
-                        item_name.setData(Qt.UserRole, details["full_path"])
-
-                        item_type = QTableWidgetItem(details["type"])
-                        item_size = QTableWidgetItem(details["size"])
-                        item_res = QTableWidgetItem(details["resolution"])
-                        item_dur = QTableWidgetItem(details["duration"])
-
-                        item_type.setTextAlignment(Qt.AlignCenter)
-                        item_size.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-                        item_res.setTextAlignment(Qt.AlignCenter)
-                        item_dur.setTextAlignment(Qt.AlignCenter)
-
-                        self.file_table.setItem(row_position, 0, item_name)
-                        self.file_table.setItem(row_position, 1, item_type)
-                        self.file_table.setItem(row_position, 2, item_size)
-                        self.file_table.setItem(row_position, 3, item_res)
-                        self.file_table.setItem(row_position, 4, item_dur)
-
-                        new_files_added += 1
-                        QApplication.processEvents()
-
-            finally:
-                QApplication.restoreOverrideCursor()
-
-            if new_files_added == 0 and len(files) > 0:
+            # 先插入占位行，分析结果在后台完成后再逐行填充
+            new_files = self.file_model.add_files(self.placeholder_details(file_path) for file_path in files)
+
+            if not new_files:
                 QMessageBox.information(self, "提示", "所有选中的文件已在列表中。")
+                return
+
+            self.start_probe(ProbeWorker(file_paths=new_files, parent=self))
+
+    def select_input_folder(self):
+        """
+        选择一个文件夹，递归扫描其中当前类型的文件并添加到表格中。
+        扫描在后台进行，找到的文件分批加入表格。
+        """
+        folder_path = QFileDialog.getExistingDirectory(self, "添加文件夹", "", QFileDialog.ShowDirsOnly)
+        if not folder_path:
+            return
+        if self.selected_file_type == "image":
+            extensions = config.IMAGE_EXTENSIONS
+        elif self.selected_file_type == "video":
+            extensions = config.VIDEO_EXTENSIONS
+        else:
+            extensions = config.IMAGE_EXTENSIONS + config.VIDEO_EXTENSIONS
+
+        worker = ProbeWorker(folders=[folder_path], extensions=extensions, parent=self)
+        worker.files_found.connect(
+            lambda paths: self.file_model.add_files(self.placeholder_details(file_path) for file_path in paths)
+        )
+        self.start_probe(worker)
+
+    @staticmethod
+    def placeholder_details(file_path):
+        """
+        生成分析完成前显示的占位信息。
+        """
+        return {
+            "name": os.path.basename(file_path),
+            "type": os.path.splitext(file_path)[1].upper().replace('.', ''),
+            "size": "分析中...",
+            "resolution": "分析中...",
+            "duration": "分析中...",
+            "full_path": file_path,
+        }
+
+    def start_probe(self, worker):
+        """
+        启动后台分析线程，结果逐行填充到表格。
+        """
+        worker.details_ready.connect(self.file_model.update_details)
+        worker.probe_finished.connect(lambda errors, w=worker: self.on_probe_finished(w, errors))
+        # probe_finished 在 run() 内部发出，线程真正结束后才能释放
+        worker.finished.connect(worker.deleteLater)
+        self.probe_workers.append(worker)
+        worker.start()
+
+    def on_probe_finished(self, worker, errors):
+        """
+        一批文件分析结束后，汇总显示所有错误。
+        """
+        if worker in self.probe_workers:
+            self.probe_workers.remove(worker)
+        if errors:
+            shown = "\n".join(errors[:20])
+            more = f"\n... 以及其他 {len(errors) - 20} 个文件" if len(errors) > 20 else ""
+            QMessageBox.warning(self, "文件信息获取失败", f"{len(errors)} 个文件无法获取详细信息：\n\n{shown}{more}")
+
+    def cancel_probes(self):
+        """
+        停止所有后台分析任务。
+        """
+        for worker in self.probe_workers:
+            worker.cancel()
 
     def delete_selected_files(self):
         """
         删除表格中选中的文件行。
         """
-        selected_rows = sorted([index.row() for index in self.file_table.selectionModel().selectedRows()], reverse=True)
+        selected_rows = [index.row() for index in self.file_table.selectionModel().selectedRows()]
         if not selected_rows:
             QMessageBox.information(self, "提示", "请先选择要删除的文件行。")
             return
-        for row_index in selected_rows:
-            self.file_table.removeRow(row_index)
+        self.file_model.remove_rows(selected_rows)
 
     def confirm_conversion(self):
         """
         确认转换操作，弹出对话框让用户确认是否继续。
         """
-        if self.file_table.rowCount() == 0:
+        if self.file_model.rowCount() == 0:
             QMessageBox.warning(self, "未选择文件", "请先选择要转换的文件。")
             return
 
@@ -286,7 +351,7 @@ class SnapConvertApp(QWidget):
             return
 
         reply = QMessageBox.question(
-            self, "确认转换", f"确定要将 {self.file_table.rowCount()} 个文件转换为 {self.type_combo.currentText()} 格式吗？",
+            self, "确认转换", f"确定要将 {self.file_model.rowCount()} 个文件转换为 {self.type_combo.currentText()} 格式吗？",
             QMessageBox.Yes | QMessageBox.No
         )
         if reply == QMessageBox.Yes:
@@ -295,47 +360,95 @@ class SnapConvertApp(QWidget):
 
     def start_conversion(self):
         """
-        开始转换过程，初始化进度条并模拟转换逻辑。
+        开始转换过程，初始化进度条并在后台线程中执行转换。
         """
         self.progress_bar.setValue(0)
+        self.eta_label.setText("")
         self.detail_text.clear()
         self.append_detail("开始转换...")
 
-        self.files_to_convert = []
-
-        for row in range(self.file_table.rowCount()):
-            item = self.file_table.item(row, 0)
-            if item:
-                full_path = item.data(Qt.UserRole)
-                if full_path:
-                    self.files_to_convert.append(full_path)
+        self.files_to_convert = self.file_model.paths()
 
         self.append_detail(f"目标格式: {self.type_combo.currentText()}")
+        self.append_detail(f"编码预设: {self.preset_combo.currentText()}")
         self.append_detail(f"文件数量: {len(self.files_to_convert)}")
 
+        skip_done = self.skip_done_checkbox.isChecked()
+        app = App(self.output_folder_path, self.type_combo.currentText(), self.selected_file_type,
+                  journal=JobJournal() if skip_done else None, skip_newer=skip_done, metrics=default_metrics(),
+                  preset=self.preset_combo.currentData())
+        self.conversion_worker = ConversionWorker(app, self.files_to_convert, self)
+        self.conversion_worker.file_finished.connect(self.update_progress)
+        self.conversion_worker.batch_progress.connect(self.update_batch_progress)
+        self.conversion_worker.conversion_finished.connect(self.on_conversion_finished)
+        # conversion_finished 在 run() 内部发出，线程真正结束后才能释放
+        self.conversion_worker.finished.connect(self.conversion_worker.deleteLater)
+        self.set_converting(True)
+        self.conversion_worker.start()
+
+    def cancel_conversion(self):
+        """
+        取消正在进行的转换。
+        """
+        if self.conversion_worker is not None and self.conversion_worker.isRunning():
+            self.conversion_worker.cancel()
+            self.cancel_button.setEnabled(False)
+            self.append_detail("正在取消...")
 
-        progress_queue = queue.Queue()
-        App(self.output_folder_path, self.type_combo.currentText(),self.selected_file_type,progress_queue).convert(self.files_to_convert)
-
-        step = 0
-        count = len(self.files_to_convert)
-        while not progress_queue.empty():
-            task_msg = progress_queue.get()
-            step += 1
-            self.update_progress(step,count,task_msg)
-            sleep(0.5)
-
+    def set_converting(self, converting: bool):
+        """
+        根据转换状态切换界面按钮的可用性。
+        """
+        self.convert_button.setEnabled(not converting)
+        self.cancel_button.setEnabled(converting)
+        self.file_button.setEnabled(not converting)
+        self.folder_button.setEnabled(not converting)
+        self.image_checkbox.setEnabled(not converting)
+        self.video_checkbox.setEnabled(not converting)
+
+    def update_progress(self, step: int, count: int, msg: str):
+        """
+        一个文件转换结束时追加结果详情。
+        """
+        self.append_detail(f"{msg}")
 
-    def update_progress(self,step:int,count:int,msg:str):
+    def update_batch_progress(self, fraction: float, eta: float):
+        """
+        更新整批进度条和预计剩余时间，视频文件转换过程中也会持续更新。
+        """
+        self.progress_bar.setValue(int(fraction * 100))  # 使用 int() 截取小数部分
+        self.eta_label.setText(f"剩余 {format_duration(eta)}" if eta >= 0 and fraction < 1 else "")
 
-        progress = int((step / count) * 100)  # 使用 int() 截取小数部分
-        self.progress_bar.setValue(progress)
-        self.append_detail(f"{msg}")
-        if step >= count:
+    def on_conversion_finished(self, step: int, count: int, cancelled: bool):
+        """
+        后台转换结束后恢复界面状态并提示结果。
+        """
+        # 任务记录和指标输出是为这次转换创建的，转换结束后关闭，不在多次转换之间累积打开的数据库连接和文件
+        app = self.conversion_worker.app
+        if app.journal is not None:
+            app.journal.close()
+        if app.metrics is not None:
+            app.metrics.close()
+        self.set_converting(False)
+        self.conversion_worker = None
+        if cancelled:
+            self.append_detail(f"转换已取消，已处理 {step}/{count} 个文件。")
+            QMessageBox.information(self, "已取消", "转换已取消！")
+        else:
             QMessageBox.information(self, "完成", "转换完成！")
-        QApplication.processEvents()
-
 
+    def closeEvent(self, event):
+        """
+        关闭窗口时取消后台转换并等待线程退出。
+        """
+        if self.conversion_worker is not None and self.conversion_worker.isRunning():
+            self.conversion_worker.cancel()
+            self.conversion_worker.wait()
+        self.cancel_probes()
+        for worker in list(self.probe_workers):
+            worker.wait()
+        self.thumbnail_loader.shutdown()
+        super().closeEvent(event)
 
     def toggle_details(self, checked):
         """
@@ -0,0 +1,60 @@
+import threading
+
+from PySide6.QtCore import QThread, Signal
+
+from backend.media_analyzer import MediaAnalyzer
+from utils.file_scanner import scan_files
+
+
+class ProbeWorker(QThread):
+    """
+    在后台线程中并行分析媒体文件，每分析完一个文件就通过信号推送结果。
+    给出文件夹时会先递归扫描，扫描到的文件分批推送，扫描和分析同时进行。
+    """
+    # 参数: 扫描到的一批文件路径（只在给出文件夹时发出，先于这些文件的分析结果）
+    files_found = Signal(list)
+    # 参数: get_media_details 返回的详情字典
+    details_ready = Signal(dict)
+    # 参数: 失败文件的错误信息列表
+    probe_finished = Signal(list)
+
+    # 扫描结果每批推送的文件数
+    SCAN_CHUNK_SIZE = 256
+
+    def __init__(self, file_paths=(), folders=(), extensions=(), parent=None):
+        super().__init__(parent)
+        self.file_paths = list(file_paths)
+        self.folders = list(folders)
+        self.extensions = tuple(extensions)
+        self._cancel_event = threading.Event()
+
+    def _iter_paths(self):
+        yield from self.file_paths
+        chunk = []
+        for file_path in scan_files(self.folders, self.extensions):
+            if self._cancel_event.is_set():
+                return
+            chunk.append(file_path)
+            if len(chunk) >= self.SCAN_CHUNK_SIZE:
+                self.files_found.emit(chunk)
+                yield from chunk
+                chunk = []
+        if chunk:
+            self.files_found.emit(chunk)
+            yield from chunk
+
+    def run(self):
+        errors = []
+        try:
+            for details in MediaAnalyzer.iter_media_details(self._iter_paths(), cancel_event=self._cancel_event):
+                if details.get("error"):
+                    errors.append(f"{details['name']}: {details['error']}")
+                self.details_ready.emit(details)
+        finally:
+            self.probe_finished.emit(errors)
+
+    def cancel(self):
+        """
+        停止扫描和分析，尚未开始的文件不再分析。
+        """
+        self._cancel_event.set()
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QObject, Signal
+
+from backend.thumbnailer import Thumbnailer
+from config import config
+
+
+class ThumbnailLoader(QObject):
+    """
+    在后台线程池中生成缩略图。最近请求的文件最先处理，快速滚动时排队过久的请求被丢弃，
+    这些行再次可见时视图会重新请求。
+    """
+    # 参数: 文件完整路径, PNG 数据（无法生成时为空）
+    thumbnail_ready = Signal(str, bytes)
+    # 参数: 排队过久而被丢弃的请求的文件路径，调用方据此允许之后重新请求
+    thumbnail_dropped = Signal(str)
+
+    # 排队等待的请求数上限，约为几屏的行数
+    MAX_PENDING = 128
+
+    def __init__(self, thumbnailer=None, max_workers=None, parent=None):
+        super().__init__(parent)
+        self.thumbnailer = thumbnailer or Thumbnailer()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or config.THUMBNAIL_WORKERS,
+                                            thread_name_prefix="thumbnail")
+        self._queue: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def request(self, file_path: str):
+        """
+        请求一个文件的缩略图，结果通过 thumbnail_ready 信号返回。
+        """
+        dropped = []
+        with self._lock:
+            if self._closed:
+                return
+            self._queue[file_path] = None
+            self._queue.move_to_end(file_path)
+            while len(self._queue) > self.MAX_PENDING:
+                dropped.append(self._queue.popitem(last=False)[0])
+        # 每个请求提交一次，工作线程每次取出最新的请求；被丢弃请求对应的提交取到的是别的请求或空队列
+        self._executor.submit(self._work)
+        for path in dropped:
+            self.thumbnail_dropped.emit(path)
+
+    def _work(self):
+        with self._lock:
+            if self._closed or not self._queue:
+                return
+            file_path, _ = self._queue.popitem(last=True)
+        data = self.thumbnailer.get(file_path)
+        if not self._closed:
+            self.thumbnail_ready.emit(file_path, data or b"")
+
+    def shutdown(self):
+        """
+        丢弃排队的请求并等待正在生成的缩略图完成。
+        """
+        with self._lock:
+            self._closed = True
+            self._queue.clear()
+        self._executor.shutdown(wait=True)
@@ -1,9 +1,12 @@
 import sys
 import logging
+import multiprocessing
 from PySide6.QtWidgets import QApplication
 from gui.main_window import SnapConvertApp
 
 if __name__ == "__main__":
+    # 打包后的程序需要该调用才能正确启动图片转换使用的工作进程
+    multiprocessing.freeze_support()
     # 配置日志记录
     logging.basicConfig(level=logging.CRITICAL, format='%(asctime)s - %(levelname)s - %(message)s')
     app = QApplication(sys.argv)
@@ -0,0 +1,460 @@
+"""
+可复现的性能基准：在本地合成测试媒体，测量转换器、媒体分析和 App 各调度模式的吞吐量、
+单文件耗时分位数、峰值内存和 CPU 利用率，结果写成 JSON，可以在不同提交之间比较。
+
+用法示例:
+    python tests/benchmark.py -o before.json
+    python tests/benchmark.py -o after.json --cases "image.*" --scale medium
+    python tests/benchmark.py --compare before.json after.json
+
+测试媒体:
+    视频由 ffmpeg 的 lavfi 源（testsrc2 画面 + sine 音频）生成，图片和动画 WebP/GIF 由 Pillow 绘制，
+    相同参数生成的内容完全一致。指定 --workdir 时媒体会被保留并在下次运行时复用。
+
+每个用例在独立的子进程中运行，峰值内存（resource.getrusage）互不影响；
+媒体元数据缓存被关闭，每次运行都从冷状态开始。
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，峰值内存改为由 psutil 采样
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 测试媒体规模
+SCALES = {
+    "small": {"still": 8, "animated": 4, "frames": 24, "image_size": (320, 240),
+              "video": 2, "video_seconds": 3, "video_size": "640x360"},
+    "medium": {"still": 32, "animated": 12, "frames": 60, "image_size": (640, 480),
+               "video": 6, "video_seconds": 10, "video_size": "1280x720"},
+    "large": {"still": 128, "animated": 32, "frames": 120, "image_size": (1280, 720),
+              "video": 12, "video_seconds": 30, "video_size": "1920x1080"},
+}
+
+# 比较结果时，变化超过阈值视为退化
+DEFAULT_THRESHOLD = 0.10
+# 越大越好的指标，其余指标越小越好
+HIGHER_IS_BETTER = ("files_per_second", "megabytes_per_second")
+COMPARED_METRICS = ("files_per_second", "p50_seconds", "p95_seconds", "peak_rss_bytes")
+
+
+def run_ffmpeg(args):
+    subprocess.run(["ffmpeg", "-y", "-v", "error", *args], check=True, stdin=subprocess.DEVNULL)
+
+
+def synthesize(workdir, scale):
+    """
+    生成测试媒体，已存在的文件不会重新生成。
+    :return: {"still": [...], "animated": [...], "video_mp4": [...], "video_mkv": [...]}
+    """
+    from PIL import Image, ImageDraw
+
+    spec = SCALES[scale]
+    media_dir = os.path.join(workdir, f"media-{scale}")
+    os.makedirs(media_dir, exist_ok=True)
+    width, height = spec["image_size"]
+    media = {"still": [], "animated": [], "video_mp4": [], "video_mkv": []}
+
+    for i in range(spec["still"]):
+        ext = "png" if i % 2 == 0 else "jpg"
+        path = os.path.join(media_dir, f"still_{i}.{ext}")
+        if not os.path.exists(path):
+            # 渐变背景加几何图形，既有平滑区域也有锐利边缘
+            im = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+            draw = ImageDraw.Draw(im)
+            for k in range(12):
+                x, y = (i * 37 + k * 53) % width, (i * 29 + k * 41) % height
+                draw.ellipse((x, y, x + width // 6, y + height // 6), fill=((k * 40) % 256, (i * 60) % 256, 128))
+            im.save(path)
+        media["still"].append(path)
+
+    for i in range(spec["animated"]):
+        for ext in ("webp", "gif"):
+            path = os.path.join(media_dir, f"anim_{i}.{ext}")
+            if not os.path.exists(path):
+                frames = []
+                for f in range(spec["frames"]):
+                    im = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+                    draw = ImageDraw.Draw(im)
+                    # 静止背景加一个移动的图形，接近常见的表情包和贴纸动画
+                    draw.rectangle((0, height * 2 // 3, width, height), fill=(40, 120, 200, 255))
+                    x = (f * width // spec["frames"] + i * 17) % width
+                    draw.ellipse((x, height // 4, x + width // 5, height // 4 + height // 5), fill=(230, 80 + i * 10 % 150, 60, 255))
+                    frames.append(im)
+                frames[0].save(path, save_all=True, append_images=frames[1:], duration=40, loop=0)
+            media["animated"].append(path)
+
+    for i in range(spec["video"]):
+        for ext in ("mp4", "mkv"):
+            path = os.path.join(media_dir, f"clip_{i}.{ext}")
+            if not os.path.exists(path):
+                seconds = spec["video_seconds"]
+                run_ffmpeg([
+                    "-f", "lavfi", "-i", f"testsrc2=size={spec['video_size']}:rate=25:duration={seconds}",
+                    "-f", "lavfi", "-i", f"sine=frequency={220 * (i + 1)}:duration={seconds}",
+                    "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+                    "-c:a", "aac", "-shortest", path,
+                ])
+            media[f"video_{ext}"].append(path)
+    return media
+
+
+def percentile(values, fraction):
+    """
+    线性插值的分位数，values 为空时返回 None。
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class ResourceMonitor:
+    """
+    测量一段代码的墙钟时间、CPU 时间（包括已结束的子进程，如 ffmpeg 和工作进程）和峰值内存。
+    """
+
+    def __init__(self):
+        self.peak_rss = 0
+        self._sampling = False
+
+    def _sample(self):
+        process = psutil.Process()
+        while self._sampling:
+            try:
+                rss = process.memory_info().rss
+                rss += sum(child.memory_info().rss for child in process.children(recursive=True))
+            except psutil.Error:
+                rss = 0
+            self.peak_rss = max(self.peak_rss, rss)
+            time.sleep(0.05)
+
+    def __enter__(self):
+        self._times = os.times()
+        self._start = time.perf_counter()
+        if psutil is not None:
+            self._sampling = True
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall_seconds = time.perf_counter() - self._start
+        times = os.times()
+        self.cpu_seconds = sum(getattr(times, field) - getattr(self._times, field)
+                               for field in ("user", "system", "children_user", "children_system"))
+        if self._sampling:
+            self._sampling = False
+            self._thread.join()
+        if resource is not None:
+            # ru_maxrss 在 Linux 上以 KB 为单位，macOS 上以字节为单位
+            unit = 1 if sys.platform == "darwin" else 1024
+            own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+            children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+            # 子进程并发运行时采样得到的总和更准确，否则取单个进程的峰值
+            self.peak_rss = max(self.peak_rss, own, children)
+        return False
+
+
+def convert_each(media, target_formats, converter_type, output_dir):
+    """
+    逐个文件直接调用转换器（不经过 App 和执行器），返回每个文件的耗时。
+    :param target_formats: 目标格式列表，多个格式时第一个之外的格式作为 extra_outputs 一次生成
+    """
+    from core.converter_factory import ConverterFactory
+
+    latencies = []
+    failures = 0
+    for index, input_file in enumerate(media):
+        base = os.path.splitext(os.path.basename(input_file))[0]
+        outputs = [(os.path.join(output_dir, f"{base}_{index}.{fmt}"), fmt) for fmt in target_formats]
+        (output_file, target_format), *extra_outputs = outputs
+        options = {"extra_outputs": extra_outputs} if extra_outputs else {}
+        start = time.perf_counter()
+        converter = ConverterFactory.create_converter(input_file=input_file, output_file=output_file,
+                                                      target_format=target_format, converter_type=converter_type, **options)
+        if not converter.convert():
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, failures
+
+
+def analyze_each(media):
+    from backend.media_analyzer import MediaAnalyzer
+
+    latencies = []
+    failures = 0
+    for input_file in media:
+        start = time.perf_counter()
+        if MediaAnalyzer.probe_media_details(input_file).get("error"):
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, failures
+
+
+def run_app(media, target_format, converter_type, output_dir, max_workers):
+    """
+    通过 App 批量转换。单个文件的耗时无法从外部得到，返回的是每个结果相对批次开始的完成时间。
+    """
+    from core.app import App
+
+    app = App(output_dir, target_format, converter_type, max_workers=max_workers)
+    completions = []
+    failures = 0
+    start = time.perf_counter()
+    try:
+        for result in app.iter_convert(media):
+            completions.append(time.perf_counter() - start)
+            if result.status != "success":
+                failures += 1
+    finally:
+        app.shutdown()
+    return completions, failures
+
+
+def build_cases(media):
+    """
+    :return: 用例名称 -> (输入文件列表, 运行函数(输出目录) -> (耗时列表, 失败数), 耗时的含义)
+    """
+    images = media["still"] + media["animated"]
+    videos = media["video_mp4"] + media["video_mkv"]
+    cpu_count = os.cpu_count() or 1
+    cases = {}
+    for fmt in ("png", "webp", "gif"):
+        cases[f"image.{fmt}"] = (images, lambda out, fmt=fmt: convert_each(images, [fmt], "image", out), "latency")
+    cases["image.multi"] = (images, lambda out: convert_each(images, ["png", "webp", "gif"], "image", out), "latency")
+    cases["video.remux"] = (media["video_mkv"], lambda out: convert_each(media["video_mkv"], ["mp4"], "video", out), "latency")
+    cases["video.transcode"] = (media["video_mp4"], lambda out: convert_each(media["video_mp4"], ["avi"], "video", out), "latency")
+    cases["analyzer.image"] = (images, lambda out: analyze_each(images), "latency")
+    cases["analyzer.video"] = (videos, lambda out: analyze_each(videos), "latency")
+    for mode, max_workers in (("adaptive", None), ("serial", 1), ("fixed", cpu_count)):
+        cases[f"app.image.{mode}"] = (images, lambda out, n=max_workers: run_app(images, "GIF", "image", out, n), "completion")
+        cases[f"app.video.{mode}"] = (videos, lambda out, n=max_workers: run_app(videos, "MP4", "video", out, n), "completion")
+    return cases
+
+
+def run_case(name, workdir, scale, ffmpeg_backend=None):
+    """
+    在当前进程中运行一个用例，返回结果字典。由 --run-case 在子进程中调用。
+    :param ffmpeg_backend: 覆盖配置中的 FFMPEG_BACKEND，用于比较 PyAV 与子进程
+    """
+    from config import config
+
+    config.MEDIA_CACHE_ENABLED = False
+    if ffmpeg_backend:
+        config.FFMPEG_BACKEND = ffmpeg_backend
+    media = synthesize(workdir, scale)
+    inputs, runner, timing = build_cases(media)[name]
+    output_dir = tempfile.mkdtemp(prefix=f"{name}-", dir=workdir)
+    try:
+        with ResourceMonitor() as monitor:
+            timings, failures = runner(output_dir)
+        output_bytes = sum(os.path.getsize(path) for path in glob.glob(os.path.join(output_dir, "*")))
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    input_bytes = sum(os.path.getsize(path) for path in inputs)
+    wall = monitor.wall_seconds
+    return {
+        "files": len(inputs),
+        "failures": failures,
+        "wall_seconds": round(wall, 4),
+        "files_per_second": round(len(inputs) / wall, 4) if wall else None,
+        "megabytes_per_second": round(input_bytes / wall / 1e6, 4) if wall else None,
+        # latency 为单个文件的耗时；completion 为每个结果相对批次开始的完成时间
+        "timing": timing,
+        "p50_seconds": round(percentile(timings, 0.5), 4) if timings else None,
+        "p95_seconds": round(percentile(timings, 0.95), 4) if timings else None,
+        "peak_rss_bytes": monitor.peak_rss or None,
+        "cpu_seconds": round(monitor.cpu_seconds, 4),
+        # 1.0 表示所有核心在整个运行期间满载
+        "cpu_utilization": round(monitor.cpu_seconds / wall / (os.cpu_count() or 1), 4) if wall else None,
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+    }
+
+
+def environment_info(scale, ffmpeg_backend=None):
+    from config import config
+
+    info = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": scale,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg_backend": ffmpeg_backend or config.FFMPEG_BACKEND,
+    }
+    try:
+        info["commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                        text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info["commit"] = None
+    try:
+        from PIL import __version__ as pillow_version
+        info["pillow"] = pillow_version
+    except ImportError:
+        info["pillow"] = None
+    try:
+        import av
+        info["pyav"] = av.__version__
+    except ImportError:
+        info["pyav"] = None
+    try:
+        output = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout
+        info["ffmpeg"] = output.splitlines()[0] if output else None
+    except OSError:
+        info["ffmpeg"] = None
+    return info
+
+
+def run_all(patterns, workdir, scale, repeat, ffmpeg_backend=None):
+    """
+    在子进程中依次运行匹配的用例；repeat 大于 1 时每个用例取墙钟时间居中的一次结果。
+    """
+    media = synthesize(workdir, scale)
+    names = [name for name in build_cases(media) if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+    results = {"environment": environment_info(scale, ffmpeg_backend), "cases": {}}
+    backend_args = ["--ffmpeg-backend", ffmpeg_backend] if ffmpeg_backend else []
+    for name in names:
+        runs = []
+        for _ in range(repeat):
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-case", name, "--workdir", workdir, "--scale", scale, *backend_args],
+                capture_output=True, text=True, encoding="utf-8", errors="replace",
+            )
+            if completed.returncode != 0:
+                print(f"{name}: 运行失败\n{completed.stderr.strip()}", file=sys.stderr)
+                break
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        if not runs:
+            continue
+        runs.sort(key=lambda run: run["wall_seconds"])
+        result = runs[len(runs) // 2]
+        result["runs"] = len(runs)
+        results["cases"][name] = result
+        print(f"{name:<22} {result['files_per_second']:>9.2f} 文件/秒  p50 {format_seconds(result['p50_seconds'])}  "
+              f"p95 {format_seconds(result['p95_seconds'])}  峰值内存 {format_megabytes(result['peak_rss_bytes'])}  "
+              f"CPU {result['cpu_utilization']:.0%}" + (f"  失败 {result['failures']}" if result["failures"] else ""),
+              file=sys.stderr)
+    return results
+
+
+def format_seconds(value):
+    return "   N/A" if value is None else f"{value:6.3f}s"
+
+
+def format_megabytes(value):
+    return "N/A" if value is None else f"{value / 1024 / 1024:.0f}MB"
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    比较两次结果，打印每个指标的变化。
+    :return: 退化的 (用例, 指标, 变化比例) 列表
+    """
+    regressions = []
+    for name, result in current["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            print(f"{name}: 基准中没有此用例")
+            continue
+        changes = []
+        for metric in COMPARED_METRICS:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            flag = ""
+            if worse > threshold:
+                flag = " !"
+                regressions.append((name, metric, change))
+            changes.append(f"{metric} {change:+.1%}{flag}")
+        print(f"{name:<22} " + "  ".join(changes))
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="EzyConv 性能基准")
+    parser.add_argument("-o", "--output", help="结果 JSON 文件，默认输出到标准输出")
+    parser.add_argument("--cases", nargs="+", default=["*"], help="运行的用例，支持通配符，如 image.* app.video.*")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="测试媒体的数量和尺寸")
+    parser.add_argument("--repeat", type=int, default=1, help="每个用例运行的次数，取居中的一次")
+    parser.add_argument("--workdir", help="测试媒体和临时输出的目录，指定时媒体会被保留以便复用")
+    parser.add_argument("--baseline", help="运行结束后与此结果文件比较")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="只比较两个已有的结果文件")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="视为退化的变化比例")
+    parser.add_argument("--ffmpeg-backend", choices=("auto", "pyav", "subprocess"),
+                        help="视频探测和复制流使用的后端，默认使用配置中的 FFMPEG_BACKEND")
+    parser.add_argument("--list", action="store_true", help="列出所有用例")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            current = json.load(f)
+        return 1 if compare(baseline, current, args.threshold) else 0
+
+    if args.list:
+        media = {key: [] for key in ("still", "animated", "video_mp4", "video_mkv")}
+        print("\n".join(build_cases(media)))
+        return 0
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args.workdir, args.scale, args.ffmpeg_backend)))
+        return 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ezyconv-bench-")
+    try:
+        results = run_all(args.cases, os.path.abspath(workdir), args.scale, max(1, args.repeat), args.ffmpeg_backend)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        return 1 if compare(baseline, results, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
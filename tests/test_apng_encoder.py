@@ -0,0 +1,83 @@
+import pytest
+from PIL import Image, ImageChops, ImageSequence
+
+from core.frame_pipeline import decode_frames, save_decoded, save_streaming, write_frames
+from core.png_encoder import resolve_engine
+
+FRAME_COUNT = 12
+WIDTH, HEIGHT = 48, 36
+# fast 引擎需要 NumPy，未安装时只测试 pillow 引擎
+PNG_ENGINES = ["pillow"] + (["fast"] if resolve_engine("fast") == "fast" else [])
+
+
+def make_frames(mode="RGBA"):
+    """
+    生成动画帧：渐变背景上移动的矩形，第 4、5 帧相同（差异矩形为空），RGBA 时后一半的帧出现半透明和透明区域。
+    """
+    frames = []
+    for index in range(FRAME_COUNT):
+        frame = Image.new(mode, (WIDTH, HEIGHT))
+        frame.putdata([(x * 5 % 256, y * 7 % 256, (x + y) % 256, 255)[:len(mode)]
+                       for y in range(HEIGHT) for x in range(WIDTH)])
+        position = 4 if index == 5 else index
+        frame.paste((200, 40, 90, 255)[:len(mode)], (position * 3, 6, position * 3 + 10, 20))
+        if mode == "RGBA" and index >= FRAME_COUNT // 2:
+            frame.paste((10, 220, 30, 128), (2, 24, 20 + index, 30))
+            frame.paste((0, 0, 0, 0), (30, 24, 40, 34))
+        frames.append(frame)
+    return frames
+
+
+def assert_same_frames(output_file, frames, durations):
+    with Image.open(output_file) as im:
+        assert im.format == "PNG"
+        assert getattr(im, "n_frames", 1) == len(frames)
+        for index, (actual, expected) in enumerate(zip(ImageSequence.Iterator(im), frames)):
+            actual = actual.convert(expected.mode)
+            assert ImageChops.difference(actual, expected).getbbox(alpha_only=False) is None, f"帧 {index} 不同"
+            assert actual.info.get("duration") == durations[index]
+
+
+@pytest.fixture(params=PNG_ENGINES)
+def png_engine(request):
+    return request.param
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "RGB"])
+def test_streaming_round_trip(png_engine, mode, tmp_path):
+    frames = make_frames(mode)
+    durations = [40 + 10 * (index % 3) for index in range(FRAME_COUNT)]
+    source = tmp_path / "source.webp"
+    frames[0].save(source, "WEBP", save_all=True, append_images=frames[1:], duration=durations, loop=0, lossless=True)
+    with Image.open(source) as im:
+        # WebP 编码时会合并相同的帧，与源文件解码得到的帧比较
+        expected, durations = decode_frames(im)
+    output_file = tmp_path / "streaming.png"
+    with Image.open(source) as im:
+        save_streaming(im, str(output_file), "png", png_engine=png_engine)
+    assert_same_frames(output_file, [frame.convert(mode) for frame in expected], durations)
+    with Image.open(output_file) as im:
+        assert im.info.get("loop") == 0
+
+
+def test_decoded_round_trip(png_engine, tmp_path):
+    frames = make_frames()
+    source = tmp_path / "source.gif"
+    frames[0].save(source, "GIF", save_all=True, append_images=frames[1:], duration=50, loop=0)
+    with Image.open(source) as im:
+        decoded, durations = decode_frames(im)
+    output_file = tmp_path / "decoded.png"
+    save_decoded(decoded, durations, str(output_file), "png", loop=None, png_engine=png_engine)
+    # GIF 先量化过颜色，与解码得到的帧比较
+    assert_same_frames(output_file, [frame.convert("RGBA") for frame in decoded], durations)
+    with Image.open(output_file) as im:
+        # loop=None 表示只播放一次，写入 acTL 的 num_plays 为 1
+        assert im.info.get("loop") == 1
+
+
+def test_identical_frames_and_frame_count(png_engine, tmp_path):
+    frames = make_frames()[:8]
+    output_file = tmp_path / "count.png"
+    # 第 4、5 帧相同，仍然各写一帧；预计帧数大于实际帧数时，close() 按实际帧数改写 acTL
+    write_frames(((frame, 40) for frame in frames), str(output_file), "png", FRAME_COUNT, png_engine=png_engine)
+    assert_same_frames(output_file, frames, [40] * len(frames))
@@ -0,0 +1,285 @@
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from core import app as app_module
+from core.app import App, _convert_batch, run_converter_outputs
+from core.converter import Converter
+from core.converter_factory import ConverterFactory
+from core.metrics import AggregateSink, Metrics
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    """
+    图片转换在线程池中执行，不启动工作进程；记录创建过的执行器。
+    """
+    created = []
+
+    def create(max_workers=None, mp_context=None):
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        created.append(executor)
+        return executor
+
+    monkeypatch.setattr(app_module, "ProcessPoolExecutor", create)
+    return created
+
+
+@pytest.fixture
+def images(tmp_path):
+    folder = tmp_path / "in"
+    folder.mkdir()
+    paths = []
+    for index, color in enumerate(("red", "green", "blue")):
+        path = folder / f"{index}.png"
+        Image.new("RGB", (8, 8), color).save(path)
+        paths.append(str(path))
+    return paths
+
+
+class BrokenPool:
+    """
+    工作进程异常退出后的进程池：之后的每次提交都失败。
+    """
+
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args, **kwargs):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def make_app(tmp_path, **kwargs):
+    output_folder = tmp_path / "out"
+    output_folder.mkdir(exist_ok=True)
+    return App(str(output_folder), "GIF", "image", max_workers=2, **kwargs)
+
+
+def test_broken_pool_is_replaced(tmp_path, thread_pool, images):
+    app = make_app(tmp_path)
+    broken = BrokenPool()
+    app._executors["process"] = broken
+    try:
+        results = list(app.iter_convert(images))
+    finally:
+        app.shutdown()
+    # 失效的执行器被丢弃，换成新的执行器后所有输入都正常转换
+    assert [result.status for result in results] == ["success"] * len(images)
+    assert broken.shut_down
+    assert len(thread_pool) == 1
+
+
+def test_unrecoverable_pool_fails_jobs(tmp_path, monkeypatch, images):
+    monkeypatch.setattr(app_module, "ProcessPoolExecutor", lambda max_workers=None, mp_context=None: BrokenPool())
+    app = make_app(tmp_path)
+    try:
+        results = list(app.iter_convert(images))
+    finally:
+        app.shutdown()
+    # 新的执行器也无法提交时，每个输入都得到失败结果，生成器不会中途抛出异常
+    assert sorted(result.input_file for result in results) == sorted(images)
+    assert all(result.status == "failed" for result in results)
+    assert "terminated abruptly" in results[0].error
+
+
+def test_multi_output_metrics_are_counted_once(tmp_path, thread_pool, images):
+    sink = AggregateSink()
+    output_folder = tmp_path / "out"
+    output_folder.mkdir()
+    app = App(str(output_folder), "GIF,PNG", "image", max_workers=2, metrics=Metrics([sink]))
+    try:
+        results = list(app.iter_convert(images[:1]))
+    finally:
+        app.shutdown()
+    assert [result.status for result in results] == ["success", "success"]
+    gif, png = results
+    # 两个输出共用一次读取和解码，每个输出的计时各承担一半，合计等于任务的耗时
+    assert gif.metrics["outputs_in_job"] == png.metrics["outputs_in_job"] == 2
+    assert gif.metrics["spans"]["total"] == png.metrics["spans"]["total"]
+    # 输入字节数按输出数分摊后取整，两个格式合计最多少 1 字节
+    summary = sink.summary()
+    bytes_in = summary["png->gif"]["bytes_in"] + summary["png->png"]["bytes_in"]
+    assert os.path.getsize(images[0]) - 1 <= bytes_in <= os.path.getsize(images[0])
+
+
+class StubConverter(Converter):
+    """
+    先写出所有输出，再按输入文件名决定结果：名字中含 "crash" 的抛出异常，其余成功。
+    """
+    SUPPORTS_MULTI_OUTPUT = True
+
+    def __init__(self, input_file, output_file, target_format, extra_outputs=(), **options):
+        super().__init__(input_file, output_file, target_format)
+        self.outputs.extend(extra_outputs)
+
+    def convert(self):
+        for output_file, _ in self.outputs:
+            with open(output_file, "wb") as f:
+                f.write(b"partial")
+        if "crash" in os.path.basename(self.input_file):
+            raise MemoryError("decoder ran out of memory")
+        return True
+
+
+@pytest.fixture
+def stub_converter(monkeypatch):
+    get_converter_class = ConverterFactory.get_converter_class
+    monkeypatch.setattr(ConverterFactory, "get_converter_class",
+                        lambda converter_type: StubConverter if converter_type == "stub" else get_converter_class(converter_type))
+
+
+def test_converter_exception_discards_temp_files(tmp_path, stub_converter):
+    outputs = [(str(tmp_path / "crash.gif"), "gif"), (str(tmp_path / "crash.png"), "png")]
+    results, trace = run_converter_outputs(str(tmp_path / "crash.webp"), outputs, "stub")
+    # 异常按转换失败处理，所有输出都失败，写了一半的临时文件被删除
+    assert [success for success, _ in results] == [False, False]
+    assert all("decoder ran out of memory" in error for _, error in results)
+    assert os.listdir(tmp_path) == []
+
+
+class BatchStubConverter(Converter):
+    """
+    批次中有名字含 "bad" 的输入时整个批次失败（结果未确定），与 ffmpeg 只返回一个退出码相同；单独转换时只有该输入失败。
+    """
+    SUPPORTS_BATCH = True
+
+    def __init__(self, input_file):
+        super().__init__(input_file, input_file + ".out", "mp4")
+        self.converted = 0
+
+    @property
+    def bad(self):
+        return "bad" in self.input_file
+
+    def convert(self):
+        self.converted += 1
+        return not self.bad
+
+    @classmethod
+    def convert_batch(cls, converters):
+        if any(converter.bad for converter in converters):
+            return [None] * len(converters)
+        for converter in converters:
+            converter.converted += 1
+        return [True] * len(converters)
+
+
+def test_batch_without_failures_is_not_retried():
+    converters = [BatchStubConverter(f"good{index}") for index in range(4)]
+    assert _convert_batch(BatchStubConverter, converters) == [True] * 4
+    assert [converter.converted for converter in converters] == [1] * 4
+    assert not any("batch_retried" in converter.trace.attributes for converter in converters)
+
+
+@pytest.mark.parametrize("bad_index", [0, 2, 4])
+def test_failed_batch_is_bisected(bad_index):
+    names = [f"good{index}" for index in range(5)]
+    names[bad_index] = "bad"
+    converters = [BatchStubConverter(name) for name in names]
+    results = _convert_batch(BatchStubConverter, converters)
+    # 只有出错的输入失败，其余输入在拆分后的批次中成功，每个输入只真正转换一次
+    assert results == [name != "bad" for name in names]
+    assert [converter.converted for converter in converters] == [1] * 5
+    # 第一次批量转换没有确定任何结果，所有转换器都经过了重试
+    assert all(converter.trace.attributes.get("batch_retried") for converter in converters)
+
+
+@pytest.fixture
+def copies(tmp_path, images):
+    """
+    内容完全相同的三个输入。
+    """
+    folder = tmp_path / "copies"
+    folder.mkdir()
+    paths = [str(folder / name) for name in ("a.png", "b.png", "c.png")]
+    for path in paths:
+        shutil.copyfile(images[0], path)
+    return paths
+
+
+@pytest.fixture
+def converted(monkeypatch):
+    """
+    记录真正提交转换的输入文件。
+    """
+    calls = []
+    run_converter_outputs = app_module.run_converter_outputs
+
+    def spy(input_file, outputs, converter_type, **options):
+        calls.append(input_file)
+        return run_converter_outputs(input_file, outputs, converter_type, **options)
+
+    monkeypatch.setattr(app_module, "run_converter_outputs", spy)
+    return calls
+
+
+def test_duplicates_reuse_representative_output(tmp_path, thread_pool, copies, converted):
+    app = make_app(tmp_path, dedup=True)
+    try:
+        results = list(app.iter_convert(copies))
+    finally:
+        app.shutdown()
+    # 只有代表文件被转换，其余两个在等待代表文件的结果后复用它的输出
+    assert len(converted) == 1
+    assert sorted(result.input_file for result in results) == sorted(copies)
+    assert all(result.status == "success" for result in results)
+    representative = next(result for result in results if result.input_file == converted[0])
+    for result in results:
+        with open(result.output_file, "rb") as f, open(representative.output_file, "rb") as expected:
+            assert f.read() == expected.read()
+    assert sum("内容重复" in result.message for result in results) == 2
+
+
+def test_duplicates_fail_with_representative(tmp_path, monkeypatch, thread_pool, copies):
+    calls = []
+
+    def fail(input_file, outputs, converter_type, **options):
+        calls.append(input_file)
+        return [(False, "decoder error")] * len(outputs), {"spans": {}, "started_at": time.time()}
+
+    monkeypatch.setattr(app_module, "run_converter_outputs", fail)
+    app = make_app(tmp_path, dedup=True)
+    try:
+        results = list(app.iter_convert(copies))
+    finally:
+        app.shutdown()
+    assert len(calls) == 1
+    assert all(result.status == "failed" for result in results)
+    by_input = {result.input_file: result for result in results}
+    assert by_input.pop(calls[0]).error == "decoder error"
+    assert sorted(by_input) == sorted(path for path in copies if path != calls[0])
+    assert all("内容相同的文件未能转换成功" in result.message for result in by_input.values())
+
+
+def test_cancel_while_duplicates_wait(tmp_path, thread_pool, copies, converted):
+    app = make_app(tmp_path, dedup=True)
+    # 唯一的工作线程被占用，代表文件的任务在取消时还在排队
+    release = threading.Event()
+    app.get_executor("image", 1).submit(release.wait)
+
+    def cancel():
+        app.cancel()
+        release.set()
+
+    timer = threading.Timer(0.2, cancel)
+    timer.start()
+    try:
+        results = list(app.iter_convert(copies))
+    finally:
+        timer.cancel()
+        release.set()
+        app.shutdown()
+    # 代表文件的任务被取消时，等待它的重复文件也作为取消产出结果，不会被遗漏或当作失败
+    assert converted == []
+    assert sorted(result.input_file for result in results) == sorted(copies)
+    assert all(result.status == "cancelled" for result in results)
+    assert not os.listdir(tmp_path / "out")
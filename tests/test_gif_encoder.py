@@ -0,0 +1,88 @@
+import pytest
+from PIL import Image, ImageSequence
+
+from core.frame_pipeline import decode_frames, save_decoded, save_streaming
+from core.gif_encoder import sample_indices
+
+np = pytest.importorskip("numpy")
+
+# 每个通道都取自这些值，颜色之间相距很远，量化到全局调色板后应当没有误差
+LEVELS = (0, 64, 128, 192, 252)
+FRAME_COUNT = 30
+WIDTH, HEIGHT = 40, 32  # 不小于 16 像素，Pillow 默认会对这样的图片隔行编码
+
+
+def make_frames():
+    """
+    生成 RGBA 动画帧：移动的不透明矩形，颜色每 3 帧换一次，序号 18 及之后的帧的颜色不出现在前 16 帧中；
+    后一半的帧会出现新的透明区域。均匀抽样 16 帧时相邻抽样帧最多相隔 2 帧，每种颜色都会被抽到。
+    """
+    colors = [(r, g, b) for r in LEVELS for g in LEVELS for b in LEVELS]
+    frames = []
+    for index in range(FRAME_COUNT):
+        pixels = np.zeros((HEIGHT, WIDTH, 4), np.uint8)
+        pixels[:, :, :3] = colors[index % 5]
+        pixels[:, :, 3] = 255
+        x = index % (WIDTH - 12)
+        pixels[4:20, x:x + 12, :3] = colors[20 + index // 3]
+        pixels[4:20, x:x + 12, 3] = 255
+        if index >= FRAME_COUNT // 2:
+            pixels[22:30, index - 10:index, 3] = 0  # 透明的洞，需要清除上一帧的内容
+        frames.append(Image.fromarray(pixels, "RGBA"))
+    return frames
+
+
+def assert_same_frames(output_file, frames):
+    with Image.open(output_file) as im:
+        decoded = [np.asarray(frame.convert("RGBA")) for frame in ImageSequence.Iterator(im)]
+    assert len(decoded) == len(frames)
+    for index, (actual, frame) in enumerate(zip(decoded, frames)):
+        expected = np.asarray(frame)
+        opaque = expected[:, :, 3] == 255
+        assert np.array_equal(actual[:, :, 3] == 255, opaque), f"帧 {index} 的透明区域不同"
+        assert np.array_equal(actual[opaque][:, :3], expected[opaque][:, :3]), f"帧 {index} 的颜色不同"
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    frames = make_frames()
+    path = tmp_path / "source.png"
+    frames[0].save(path, "PNG", save_all=True, append_images=frames[1:], duration=40, loop=0)
+    return path, frames
+
+
+def test_fast_engine_streaming_round_trip(source_file, tmp_path):
+    path, frames = source_file
+    output_file = tmp_path / "streaming.gif"
+    with Image.open(path) as im:
+        save_streaming(im, str(output_file), "gif", gif_engine="fast")
+    assert_same_frames(output_file, frames)
+
+
+def test_fast_engine_decoded_round_trip(source_file, tmp_path):
+    path, frames = source_file
+    output_file = tmp_path / "decoded.gif"
+    with Image.open(path) as im:
+        decoded, durations = decode_frames(im)
+    save_decoded(decoded, durations, str(output_file), "gif", loop=0, gif_engine="fast")
+    assert_same_frames(output_file, frames)
+
+
+def test_fast_engine_keeps_durations_and_loop(source_file, tmp_path):
+    path, _ = source_file
+    output_file = tmp_path / "timing.gif"
+    with Image.open(path) as im:
+        save_streaming(im, str(output_file), "gif", gif_engine="fast")
+    with Image.open(output_file) as im:
+        assert im.info.get("loop") == 0
+        assert {frame.info["duration"] for frame in ImageSequence.Iterator(im)} == {40}
+
+
+@pytest.mark.parametrize("frame_count, count", [(1, 16), (10, 16), (16, 16), (30, 16), (100, 16), (1000, 16), (5, 1)])
+def test_sample_indices_cover_whole_animation(frame_count, count):
+    indices = sample_indices(frame_count, count)
+    assert indices == sorted(set(indices))
+    assert len(indices) == min(frame_count, count)
+    assert indices[0] == 0
+    if count > 1:
+        assert indices[-1] == frame_count - 1
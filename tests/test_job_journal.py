@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from core.job_journal import JobJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.sqlite3"))
+    yield journal
+    journal.close()
+
+
+@pytest.fixture
+def finished_job(tmp_path, journal):
+    """
+    一个已完成并记录的转换：(输入文件, 输出文件夹, 输出文件)。
+    """
+    input_file = tmp_path / "in" / "a.webp"
+    input_file.parent.mkdir()
+    input_file.write_bytes(b"input")
+    output_folder = tmp_path / "out"
+    output_folder.mkdir()
+    output_file = output_folder / "a.png"
+    output_file.write_bytes(b"output")
+    journal.record(str(input_file), "PNG", str(output_folder), str(output_file))
+    return input_file, output_folder, output_file
+
+
+def touch(path, delta_ns=1_000_000_000):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + delta_ns))
+
+
+def test_unchanged_job_is_skipped(journal, finished_job):
+    input_file, output_folder, output_file = finished_job
+    assert journal.lookup(str(input_file), "PNG", str(output_folder)) == os.path.abspath(output_file)
+    # 目标格式不区分大小写，输入路径按绝对路径比较
+    relative_input = os.path.relpath(input_file)
+    assert journal.lookup(relative_input, "png", str(output_folder)) == os.path.abspath(output_file)
+
+
+def test_other_format_or_folder_is_not_skipped(journal, finished_job, tmp_path):
+    input_file, output_folder, _ = finished_job
+    assert journal.lookup(str(input_file), "GIF", str(output_folder)) is None
+    assert journal.lookup(str(input_file), "PNG", str(tmp_path / "elsewhere")) is None
+
+
+def test_modified_input_invalidates(journal, finished_job):
+    input_file, output_folder, _ = finished_job
+    touch(input_file)
+    assert journal.lookup(str(input_file), "PNG", str(output_folder)) is None
+
+
+def test_resized_input_invalidates(journal, finished_job):
+    input_file, output_folder, _ = finished_job
+    stat = os.stat(input_file)
+    input_file.write_bytes(b"longer input")
+    os.utime(input_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert journal.lookup(str(input_file), "PNG", str(output_folder)) is None
+
+
+def test_deleted_or_changed_output_invalidates(journal, finished_job):
+    input_file, output_folder, output_file = finished_job
+    touch(output_file)
+    assert journal.lookup(str(input_file), "PNG", str(output_folder)) is None
+    output_file.unlink()
+    assert journal.lookup(str(input_file), "PNG", str(output_folder)) is None
+
+
+def test_missing_input_is_not_skipped(journal, finished_job):
+    input_file, output_folder, _ = finished_job
+    input_file.unlink()
+    assert journal.lookup(str(input_file), "PNG", str(output_folder)) is None
+
+
+def test_recorded_output_survives_invalidation(journal, finished_job):
+    input_file, output_folder, output_file = finished_job
+    touch(input_file)
+    # 输入被修改后重新转换时覆盖原来的输出路径
+    assert journal.recorded_output(str(input_file), "PNG", str(output_folder)) == os.path.abspath(output_file)
+
+
+def test_record_again_revalidates(journal, finished_job):
+    input_file, output_folder, output_file = finished_job
+    touch(input_file)
+    output_file.write_bytes(b"new output")
+    journal.record(str(input_file), "PNG", str(output_folder), str(output_file))
+    assert journal.lookup(str(input_file), "PNG", str(output_folder)) == os.path.abspath(output_file)
+
+
+def test_record_missing_output_is_ignored(journal, tmp_path):
+    input_file = tmp_path / "b.webp"
+    input_file.write_bytes(b"input")
+    journal.record(str(input_file), "PNG", str(tmp_path), str(tmp_path / "missing.png"))
+    assert journal.recorded_output(str(input_file), "PNG", str(tmp_path)) is None
+
+
+def test_records_persist_and_clear(journal, finished_job):
+    input_file, output_folder, output_file = finished_job
+    journal.close()
+    reopened = JobJournal(journal.db_path)
+    try:
+        assert reopened.lookup(str(input_file), "PNG", str(output_folder)) == os.path.abspath(output_file)
+        reopened.clear()
+        assert reopened.lookup(str(input_file), "PNG", str(output_folder)) is None
+        assert reopened.recorded_output(str(input_file), "PNG", str(output_folder)) is None
+    finally:
+        reopened.close()
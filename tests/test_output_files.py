@@ -0,0 +1,101 @@
+import os
+import threading
+
+from core.output_files import OutputAllocator, commit_output, discard_output, temp_output_path
+
+
+def test_reserve_unique_skips_existing_files(tmp_path):
+    (tmp_path / "x.png").write_bytes(b"old")
+    (tmp_path / "x_1.png").write_bytes(b"old")
+    allocator = OutputAllocator()
+    assert allocator.reserve_unique(str(tmp_path / "x.png")) == (tmp_path / "x_2.png").as_posix()
+
+
+def test_reserve_unique_within_batch(tmp_path):
+    # 同一批次中同名的输入（a/x.png 与 b/x.png）得到不同的输出，文件尚未写出也不会重名
+    allocator = OutputAllocator()
+    paths = [allocator.reserve_unique(str(tmp_path / "x.png")) for _ in range(3)]
+    assert paths == [(tmp_path / name).as_posix() for name in ("x.png", "x_1.png", "x_2.png")]
+    assert not any(os.path.exists(path) for path in paths)
+
+
+def test_reserve_unique_does_not_reuse_names_taken_by_numbering(tmp_path):
+    allocator = OutputAllocator()
+    # x_1.png 作为别的输入的自然文件名被分配后，x.png 的编号跳过它
+    assert allocator.reserve_unique(str(tmp_path / "x_1.png")) == (tmp_path / "x_1.png").as_posix()
+    allocator.reserve_unique(str(tmp_path / "x.png"))
+    assert allocator.reserve_unique(str(tmp_path / "x.png")) == (tmp_path / "x_2.png").as_posix()
+
+
+def test_reserve_unique_lists_folder_once(tmp_path):
+    allocator = OutputAllocator()
+    allocator.reserve_unique(str(tmp_path / "x.png"))
+    # 之后在文件夹中出现的文件不在保护范围内，分配只依据第一次列出的内容和本批次的分配
+    (tmp_path / "y.png").write_bytes(b"new")
+    assert allocator.reserve_unique(str(tmp_path / "y.png")) == (tmp_path / "y.png").as_posix()
+
+
+def test_reserve_unique_is_thread_safe(tmp_path):
+    allocator = OutputAllocator()
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(50):
+            path = allocator.reserve_unique(str(tmp_path / "x.png"))
+            with lock:
+                results.append(path)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == len(results) == 200
+
+
+def test_reserve_existing_path_once_per_batch(tmp_path):
+    output = tmp_path / "x.png"
+    output.write_bytes(b"old")
+    allocator = OutputAllocator()
+    # 覆盖已有的旧输出只允许一个任务分配
+    assert allocator.reserve(str(output)) is True
+    assert allocator.reserve(str(output)) is False
+    # 已分配的路径不会再被 reserve_unique 分配
+    assert allocator.reserve_unique(str(output)) == (tmp_path / "x_1.png").as_posix()
+
+
+def test_reserve_after_reserve_unique(tmp_path):
+    allocator = OutputAllocator()
+    path = allocator.reserve_unique(str(tmp_path / "x.png"))
+    assert allocator.reserve(path) is False
+
+
+def test_temp_output_path_keeps_folder_and_extension(tmp_path):
+    output_file = str(tmp_path / "clip.mp4")
+    temp_file = temp_output_path(output_file)
+    assert os.path.dirname(temp_file) == str(tmp_path)
+    assert temp_file.endswith(".part.mp4")
+    assert os.path.basename(temp_file).startswith(".clip.")
+    assert temp_output_path(output_file) != temp_file
+
+
+def test_commit_output_replaces_existing_file(tmp_path):
+    output_file = tmp_path / "x.png"
+    output_file.write_bytes(b"old")
+    temp_file = temp_output_path(str(output_file))
+    with open(temp_file, "wb") as f:
+        f.write(b"new")
+    commit_output(temp_file, str(output_file))
+    assert output_file.read_bytes() == b"new"
+    assert not os.path.exists(temp_file)
+
+
+def test_discard_output(tmp_path):
+    temp_file = temp_output_path(str(tmp_path / "x.png"))
+    with open(temp_file, "wb") as f:
+        f.write(b"partial")
+    discard_output(temp_file)
+    assert not os.path.exists(temp_file)
+    # 临时文件不存在时（转换器还没有创建它）不报错
+    discard_output(temp_file)
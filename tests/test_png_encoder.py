@@ -0,0 +1,135 @@
+import io
+import zlib
+
+import pytest
+from PIL import Image
+
+from config import config
+from core import png_encoder
+from core.png_encoder import PNG_FILTERS, iter_chunks, save_png
+
+np = pytest.importorskip("numpy")
+
+
+def make_image(mode, width=67, height=45, seed=0):
+    """
+    生成带噪声的渐变图片，各个滤波器的结果都不相同；宽度为奇数，检查行的字节数不是像素字节数的整数倍对齐时的处理。
+    """
+    rng = np.random.default_rng(seed)
+    channels = len(mode)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([(x * (3 + channel) + y * (5 + channel)) % 256 for channel in range(channels)], axis=-1)
+    pixels = ((pixels + rng.integers(0, 8, pixels.shape)) % 256).astype(np.uint8)
+    im = Image.fromarray(pixels[:, :, 0] if channels == 1 else pixels)
+    assert im.mode == mode
+    return im
+
+
+def encode(im, **options):
+    buffer = io.BytesIO()
+    save_png(im, buffer, "fast", **options)
+    return buffer.getvalue()
+
+
+def assert_round_trip(data, im):
+    with Image.open(io.BytesIO(data)) as decoded:
+        decoded.load()
+        assert decoded.mode == im.mode
+        assert decoded.size == im.size
+        assert decoded.tobytes() == im.tobytes()
+
+
+@pytest.fixture
+def parallel(monkeypatch):
+    """
+    强制按条带并行压缩：4 个线程，每个条带 1 KiB，不设最小图片大小。
+    """
+    monkeypatch.setattr(config, "PNG_PARALLEL_THREADS", 4)
+    monkeypatch.setattr(config, "PNG_PARALLEL_STRIP_BYTES", 1024)
+    monkeypatch.setattr(config, "PNG_PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(png_encoder, "_executor", None)
+
+
+@pytest.mark.parametrize("mode", ["L", "LA", "RGB", "RGBA"])
+@pytest.mark.parametrize("png_filter", PNG_FILTERS)
+def test_round_trip(mode, png_filter):
+    im = make_image(mode)
+    assert_round_trip(encode(im, png_filter=png_filter), im)
+
+
+@pytest.mark.parametrize("png_filter", ["average", "paeth"])
+def test_flat_regions_round_trip(png_filter):
+    # 大块相同颜色的区域中左、上、左上三个像素经常相等，检查预测器在相等时的选择
+    pixels = np.zeros((40, 40, 3), np.uint8)
+    pixels[:, 10:25] = (255, 128, 1)
+    pixels[15:30, :, 1] = 200
+    pixels[::7, ::5] = (3, 3, 250)
+    im = Image.fromarray(pixels)
+    assert_round_trip(encode(im, png_filter=png_filter), im)
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA"])
+@pytest.mark.parametrize("png_filter", ["paeth", "adaptive"])
+def test_parallel_strips_round_trip(parallel, mode, png_filter):
+    im = make_image(mode, width=101, height=83)
+    data = encode(im, png_filter=png_filter)
+    # 每个条带写成一个 IDAT 块
+    assert sum(chunk_type == b"IDAT" for chunk_type, _ in iter_chunks(data)) > 1
+    assert_round_trip(data, im)
+
+
+def test_parallel_output_decompresses_to_same_rows(parallel, monkeypatch):
+    im = make_image("RGB", width=101, height=83)
+    parallel_data = encode(im, png_filter="up")
+    monkeypatch.setattr(config, "PNG_PARALLEL_THREADS", 1)
+    serial_data = encode(im, png_filter="up")
+
+    def filtered_rows(data):
+        return zlib.decompress(b"".join(chunk for chunk_type, chunk in iter_chunks(data) if chunk_type == b"IDAT"))
+
+    # 分条带压缩只改变压缩数据，滤波后的行以及拼接后的 Adler-32（由 zlib.decompress 检查）都相同
+    assert filtered_rows(parallel_data) == filtered_rows(serial_data)
+
+
+@pytest.mark.parametrize("compress_level", [0, 1, 9])
+def test_compress_levels(compress_level):
+    im = make_image("RGBA")
+    assert_round_trip(encode(im, compress_level=compress_level), im)
+
+
+def test_single_row_and_column():
+    for size in ((1, 30), (30, 1), (1, 1)):
+        im = make_image("RGBA", *size)
+        assert_round_trip(encode(im), im)
+
+
+def test_ancillary_chunks_are_kept():
+    im = make_image("RGB")
+    im.info["transparency"] = tuple(im.getpixel((0, 0)))
+    im.info["icc_profile"] = b"\x00" * 128
+    data = encode(im)
+    chunk_types = [chunk_type for chunk_type, _ in iter_chunks(data)]
+    assert chunk_types[0] == b"IHDR" and chunk_types[-1] == b"IEND"
+    assert b"tRNS" in chunk_types and b"iCCP" in chunk_types
+    # 辅助块在 IDAT 之前
+    assert chunk_types.index(b"tRNS") < chunk_types.index(b"IDAT")
+    with Image.open(io.BytesIO(data)) as decoded:
+        assert decoded.info["transparency"] == im.info["transparency"]
+        assert decoded.info["icc_profile"] == im.info["icc_profile"]
+    assert_round_trip(data, im)
+
+
+def test_unsupported_modes_fall_back_to_pillow():
+    for im in (make_image("RGB").convert("P"), make_image("L").convert("I;16"), make_image("RGB").convert("1")):
+        assert_round_trip(encode(im), im)
+
+
+def test_unknown_filter_is_rejected():
+    with pytest.raises(ValueError):
+        encode(make_image("RGB"), png_filter="median")
+
+
+def test_adler32_combine():
+    first, second = b"hello, " * 100, b"world" * 77
+    combined = png_encoder._adler32_combine(zlib.adler32(first), zlib.adler32(second), len(second))
+    assert combined == zlib.adler32(first + second)
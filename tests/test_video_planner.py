@@ -0,0 +1,102 @@
+import pytest
+
+from config import config
+from core.presets import get_preset
+from core.video_planner import StreamPlan, build_output_args, plan_streams
+
+
+def stream(index, codec_type, codec_name):
+    return {"index": index, "codec_type": codec_type, "codec_name": codec_name}
+
+
+H264_AAC = [stream(0, "video", "h264"), stream(1, "audio", "aac")]
+
+
+def actions(plans):
+    return [plan.action for plan in plans]
+
+
+def test_unknown_streams_have_no_plan():
+    assert plan_streams(None, "mp4") is None
+    assert plan_streams([], "mp4") is None
+    assert plan_streams(H264_AAC, "mkv") is None
+
+
+def test_compatible_streams_are_copied():
+    plans = plan_streams(H264_AAC, "MP4")
+    assert actions(plans) == ["copy", "copy"]
+    assert build_output_args(plans, "mp4") == ["-map", "0:0", "-c:0", "copy", "-map", "0:1", "-c:1", "copy"]
+
+
+def test_copy_adds_bitstream_filter():
+    plans = plan_streams(H264_AAC, "avi")
+    assert actions(plans) == ["copy", "transcode"]
+    args = build_output_args(plans, "avi", preset=get_preset("balanced"))
+    assert args[:6] == ["-map", "0:0", "-c:0", "copy", "-bsf:0", "h264_mp4toannexb"]
+    assert args[6:] == ["-map", "0:1", "-c:1", "libmp3lame", "-q:1", "2"]
+
+
+def test_transcode_uses_preset_and_output_stream_specifiers():
+    plans = plan_streams([stream(0, "audio", "vorbis"), stream(1, "video", "vp8")], "mp4")
+    assert actions(plans) == ["transcode", "transcode"]
+    preset = get_preset("small")
+    args = build_output_args(plans, "mp4", preset=preset)
+    # 编码参数中的流类型说明符替换为输出流编号：音频在前时视频是第 1 个输出流
+    assert args == [
+        "-map", "0:0", "-c:0", "aac", "-b:0", "192k",
+        "-map", "0:1", "-c:1", "libx264",
+        "-preset:1", preset.x264_preset, "-crf:1", str(preset.x264_crf), "-pix_fmt", "yuv420p",
+    ]
+
+
+def test_preset_threads_apply_to_video_stream():
+    preset = get_preset("balanced")._replace(threads=3)
+    args = build_output_args(plan_streams([stream(0, "video", "vp8")], "avi"), "avi", preset=preset)
+    assert args == ["-map", "0:0", "-c:0", "mpeg4", "-q:0", str(preset.mpeg4_qscale), "-threads:0", "3"]
+
+
+def test_dropped_streams_do_not_take_output_numbers():
+    streams = [
+        stream(0, "video", "h264"),
+        stream(1, "video", "mjpeg"),  # 封面图片，存在其他视频流时丢弃
+        stream(2, "data", "bin_data"),
+        stream(3, "subtitle", "hdmv_pgs_subtitle"),  # 图形字幕无法转换为 mov_text
+        stream(4, "subtitle", "subrip"),
+        stream(5, "audio", "aac"),
+    ]
+    plans = plan_streams(streams, "mp4")
+    assert actions(plans) == ["copy", "drop", "drop", "drop", "transcode", "copy"]
+    args = build_output_args(plans, "mp4")
+    assert args == [
+        "-map", "0:0", "-c:0", "copy",
+        "-map", "0:4", "-c:1", "mov_text",
+        "-map", "0:5", "-c:2", "copy",
+    ]
+
+
+def test_cover_art_is_kept_without_other_video():
+    plans = plan_streams([stream(0, "video", "mjpeg"), stream(1, "audio", "mp3")], "avi")
+    assert actions(plans) == ["copy", "copy"]
+
+
+def test_text_subtitles_are_dropped_when_container_has_no_subtitles():
+    plans = plan_streams([stream(0, "video", "mpeg4"), stream(1, "subtitle", "subrip")], "avi")
+    assert actions(plans) == ["copy", "drop"]
+    assert build_output_args(plans, "avi") == ["-map", "0:0", "-c:0", "copy"]
+
+
+@pytest.mark.parametrize("input_index", [0, 3])
+def test_input_index_is_used_in_maps(input_index):
+    args = build_output_args(plan_streams(H264_AAC, "mp4"), "mp4", input_index=input_index)
+    assert [args[i + 1] for i, arg in enumerate(args) if arg == "-map"] == [f"{input_index}:0", f"{input_index}:1"]
+
+
+def test_without_plan_everything_is_copied():
+    assert build_output_args(None, "mp4") == ["-c:v", "copy", "-c:a", "copy"]
+
+
+def test_default_preset_comes_from_config(monkeypatch):
+    monkeypatch.setattr(config, "ENCODER_PRESET", "fast")
+    plans = [StreamPlan(0, "video", "vp8", "transcode")]
+    fast = get_preset("fast")
+    assert build_output_args(plans, "mp4")[4:8] == ["-preset:0", fast.x264_preset, "-crf:0", str(fast.x264_crf)]
@@ -0,0 +1,45 @@
+import logging
+import os
+from typing import Iterable, Iterator
+
+
+def scan_files(paths: Iterable[str], extensions: Iterable[str], recursive: bool = True) -> Iterator[str]:
+    """
+    基于 os.scandir 遍历文件和目录，按扩展名过滤后逐个产出文件路径。
+    以生成器方式工作，调用方可以在扫描尚未结束时就开始处理已找到的文件，
+    内存占用随等待扫描的目录数量增长（每一层尚未进入的子目录都留在栈中），与文件总数无关。
+
+    参数:
+        paths: 文件或目录路径。直接给出的文件不做扩展名过滤。
+        extensions: 需要收集的扩展名（小写，带点），如 (".png", ".gif")。
+        recursive: 是否递归进入子目录。
+
+    返回:
+        文件路径的生成器。
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        stack = [path]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    subdirectories = []
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if recursive:
+                                    subdirectories.append(entry.path)
+                            elif entry.name.lower().endswith(extensions) and entry.is_file():
+                                yield entry.path
+                        except OSError:
+                            continue
+            except OSError as e:
+                logging.error(f"无法读取目录 {directory}: {e}")
+                continue
+            # 逆序压栈，使子目录按遍历顺序依次处理
+            stack.extend(reversed(subdirectories))
@@ -49,3 +49,22 @@ def format_duration(seconds_str):
             return f"{minutes:02d}:{secs:02d}"
     except (ValueError, TypeError, AttributeError):
         return "N/A"
+
+
+def parse_seconds(seconds_str):
+    """
+    将秒（可能为字符串形式）解析为浮点数。
+
+    参数:
+        seconds_str: str 或 float，表示时长的秒数。
+
+    返回:
+        float 或 None: 无法解析或为负数时返回 None。
+    """
+    try:
+        seconds = float(seconds_str)
+    except (ValueError, TypeError):
+        return None
+    if seconds < 0 or seconds != seconds:
+        return None
+    return seconds
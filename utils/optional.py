@@ -0,0 +1,23 @@
+import functools
+import importlib
+from types import ModuleType
+from typing import Optional
+
+
+@functools.lru_cache(maxsize=None)
+def optional_import(name: str) -> Optional[ModuleType]:
+    """
+    导入可选依赖，未安装时返回 None。结果会被缓存，只有第一次调用时真正导入。
+    NumPy、PyAV 等较大的可选依赖在第一次需要时才通过它导入，
+    只用到其中一部分功能（例如只转换视频）时不承担其他依赖的导入时间。
+
+    参数:
+        name: 模块名，如 "numpy"。
+
+    返回:
+        模块对象，未安装时为 None。
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
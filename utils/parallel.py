@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def imap_unordered(function: Callable[[T], R], items: Iterable[T], max_workers: int,
+                   cancel_event: Optional[threading.Event] = None) -> Iterator[R]:
+    """
+    使用有界线程池对每一项调用 function，按完成顺序逐个产出结果。
+    在途任务数不超过 max_workers 的两倍，items 可以是边扫描边产出的生成器；
+    生成器关闭时取消尚未开始的任务。
+
+    参数:
+        function: 对每一项调用的函数，适合等待子进程或读取文件等会释放 GIL 的工作。
+        items: 需要处理的项。
+        max_workers: 线程数。
+        cancel_event: 设置后不再启动新的任务。
+
+    返回:
+        生成器，每次产出一个 function 的返回值。
+    """
+    item_iter = iter(items)
+    exhausted = False
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                while not exhausted and len(pending) < max_workers * 2:
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    item = next(item_iter, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    pending.add(executor.submit(function, item))
+                if not pending or (cancel_event is not None and cancel_event.is_set()):
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()